@@ -0,0 +1,401 @@
+# agent.py - Tool-calling LangGraph agent with a cheap-model router and parallel tool execution
+
+import asyncio
+import inspect
+import json
+import logging
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, END
+from typing_extensions import TypedDict
+
+from instrumentation import timed
+from metrics import Counter, Histogram
+from tokens import count_message_tokens, count_tokens
+
+logger = logging.getLogger(__name__)
+
+AGENT_LLM_CALLS = Counter("crm_agent_llm_calls", "Agent LLM calls by model", ("model",))
+AGENT_TOOL_CALLS = Counter("crm_agent_tool_calls", "Agent tool executions by tool and outcome", ("tool", "outcome"))
+AGENT_ESCALATIONS = Counter("crm_agent_escalations", "Turns handed from the router model to the main model", ("reason",))
+AGENT_PROMPT_TOKENS = Histogram(
+    "crm_agent_prompt_tokens", "Prompt tokens per agent LLM call (tool schemas included)", ("model",),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+AGENT_NODE_SECONDS = Histogram(
+    "crm_agent_node_seconds", "Wall time of one graph node run (llm, tools)", ("node", "outcome"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+AGENT_TOOL_SECONDS = Histogram(
+    "crm_agent_tool_seconds", "Wall time of one tool function call", ("tool", "outcome"),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0),
+)
+AGENT_TURN_SECONDS = Histogram(
+    "crm_agent_turn_seconds", "Wall time of one chat turn",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0),
+)
+
+# Pseudo-tool offered only to the router model
+ESCALATE = "escalate"
+ESCALATE_SCHEMA = {
+    "type": "function",
+    "function": {
+        "name": ESCALATE,
+        "description": "Hand the request to a stronger model. Use for analysis, multi-step reasoning "
+                       "or anything you cannot answer or map to a tool confidently.",
+        "parameters": {"type": "object", "properties": {}},
+    },
+}
+
+# Event queue of the astream() call this turn runs under, if any; nodes inherit it through the task context
+_events: ContextVar[Optional[asyncio.Queue]] = ContextVar("agent_events", default=None)
+
+async def emit(event: str, data: Dict[str, Any]):
+    """Publishes a streaming event; blocks while the consumer's buffer is full (backpressure)"""
+    queue = _events.get()
+    if queue is not None:
+        await queue.put((event, data))
+
+_JSON_TYPES = {int: "integer", float: "number", bool: "boolean", str: "string"}
+_ARG_LINE = re.compile(r"^\s*(\w+):\s*(.+)$")
+
+@dataclass
+class Tool:
+    name: str
+    fn: Callable[..., Awaitable[str]]
+    schema: Dict[str, Any]
+    # Result is shown to the user as-is, without another LLM pass to phrase it
+    direct: bool = True
+    params: Dict[str, inspect.Parameter] = field(default_factory=dict)
+
+def tool_from_function(name: str, fn: Callable[..., Awaitable[str]], direct: bool = True) -> Tool:
+    """Builds a Tool whose JSON schema comes from fn's signature and its docstring's Args: section.
+
+    The tool's function is wrapped to record its latency in crm_agent_tool_seconds.
+    """
+    doc = inspect.getdoc(fn) or ""
+    description = doc.split("\n\n")[0].strip()
+    arg_docs = {}
+    if "Args:" in doc:
+        for line in doc.split("Args:", 1)[1].splitlines():
+            match = _ARG_LINE.match(line)
+            if match:
+                arg_docs[match.group(1)] = match.group(2).strip()
+
+    params = dict(inspect.signature(fn).parameters)
+    properties, required = {}, []
+    for pname, param in params.items():
+        properties[pname] = {"type": _JSON_TYPES.get(param.annotation, "string")}
+        if pname in arg_docs:
+            properties[pname]["description"] = arg_docs[pname]
+        if param.default is inspect.Parameter.empty:
+            required.append(pname)
+    schema = {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        },
+    }
+    return Tool(name, timed(AGENT_TOOL_SECONDS, tool=name)(fn), schema, direct, params)
+
+@dataclass
+class ToolCall:
+    id: str
+    name: str
+    arguments: Dict[str, Any]
+    # Set when the model's call can't be executed as given
+    problem: Optional[str] = None
+
+class _Node(RunnableLambda):
+    """RunnableLambda with a constant repr.
+
+    LangChain serializes every runnable for its callbacks on each step, and the
+    default repr reads the function's source with inspect - tens of ms a turn.
+    """
+
+    def __repr__(self) -> str:
+        return f"Node({self.name})"
+
+class AgentState(TypedDict):
+    messages: List[Dict[str, Any]]
+    # Tools executed during this turn: name, arguments, result, ok
+    tool_calls: List[Dict[str, Any]]
+    next_action: str
+    escalated: bool
+    llm_calls: int
+    prompt_tokens: int
+    steps: int
+
+def new_state(messages: List[Dict[str, Any]]) -> AgentState:
+    return {"messages": messages, "tool_calls": [], "next_action": "respond",
+            "escalated": False, "llm_calls": 0, "prompt_tokens": 0, "steps": 0}
+
+class Agent:
+    """Chat agent: LLM node -> parallel tool node -> (LLM node | END).
+
+    Each turn starts on the cheap router model. It escalates to the main
+    model when it errors, emits an unusable tool call or calls the
+    `escalate` pseudo-tool; once a tool fails, the rest of the turn also
+    runs on the main model. Tools marked direct answer the user themselves,
+    so a routine "log this visit" turn costs one small-model call.
+    """
+
+    def __init__(self, llm, tools: List[Tool], system_prompt: str, model: str,
+                 router_model: Optional[str] = None, max_steps: int = 4, temperature: float = 0.3,
+                 max_tokens: int = 500):
+        self.llm = llm
+        self.tools = {tool.name: tool for tool in tools}
+        self.system_prompt = system_prompt
+        self.model = model
+        self.router_model = router_model if router_model and router_model != model else None
+        self.max_steps = max_steps
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self._schemas = [tool.schema for tool in tools]
+        self.graph = self._build()
+
+    def _build(self):
+        workflow = StateGraph(AgentState)
+        workflow.add_node("llm", _Node(self.call_llm, name="llm"))
+        workflow.add_node("tools", _Node(self.run_tools, name="tools"))
+        workflow.set_entry_point("llm")
+        workflow.add_conditional_edges("llm", self.route, {"tools": "tools", "respond": END})
+        workflow.add_conditional_edges("tools", self.route, {"llm": "llm", "respond": END})
+        return workflow.compile()
+
+    async def ainvoke(self, messages: List[Dict[str, Any]]) -> AgentState:
+        start = time.perf_counter()
+        try:
+            return await self.graph.ainvoke(new_state(messages))
+        finally:
+            AGENT_TURN_SECONDS.observe(time.perf_counter() - start)
+
+    async def astream(self, messages: List[Dict[str, Any]], buffer: int = 64) -> AsyncIterator[Tuple[str, Any]]:
+        """Runs one turn, yielding (event, data) as it happens and finally ("end", state).
+
+        Events: llm (a model call starts), token (reply text delta), escalate
+        (discard the text streamed since the last llm event), tool_start and
+        tool_end. At most `buffer` events are queued; beyond that the turn
+        waits for the consumer. Closing the iterator cancels the turn,
+        including in-flight LLM and tool calls.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        token = _events.set(queue)
+        try:
+            turn = asyncio.create_task(self.ainvoke(messages))
+        finally:
+            _events.reset(token)
+        get = None
+        try:
+            while True:
+                get = asyncio.ensure_future(queue.get())
+                await asyncio.wait({get, turn}, return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    while not queue.empty():
+                        yield queue.get_nowait()
+                    yield "end", turn.result()
+                    return
+                yield get.result()
+        finally:
+            if get is not None:
+                get.cancel()
+            if not turn.done():
+                turn.cancel()
+                try:
+                    await turn
+                except asyncio.CancelledError:
+                    pass
+
+    @staticmethod
+    def route(state: AgentState) -> str:
+        return state["next_action"]
+
+    # ==================== LLM NODE ====================
+
+    async def _complete(self, model: str, messages: List[Dict[str, Any]], schemas: List[Dict[str, Any]]):
+        """Returns (assistant message, prompt tokens)"""
+        AGENT_LLM_CALLS.labels(model=model).inc()
+        params = dict(tools=schemas, tool_choice="auto", temperature=self.temperature, max_tokens=self.max_tokens)
+        prompt_tokens = count_message_tokens(messages) + count_tokens(json.dumps(schemas))
+        if _events.get() is None:
+            response = await self.llm.chat(model=model, messages=messages, **params)
+            # Prefer the provider's own count when it reports one
+            prompt_tokens = getattr(getattr(response, "usage", None), "prompt_tokens", None) or prompt_tokens
+            AGENT_PROMPT_TOKENS.labels(model=model).observe(prompt_tokens)
+            return response.choices[0].message, prompt_tokens
+        AGENT_PROMPT_TOKENS.labels(model=model).observe(prompt_tokens)
+
+        # Streaming turn: forward content deltas as they arrive and assemble tool calls by index
+        await emit("llm", {"model": model})
+        content, calls = [], {}
+        async for chunk in self.llm.stream(model=model, messages=messages, **params):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                await emit("token", {"text": delta.content})
+            for part in getattr(delta, "tool_calls", None) or []:
+                call = calls.setdefault(part.index, {"id": None, "name": "", "arguments": ""})
+                call["id"] = part.id or call["id"]
+                if part.function is not None:
+                    call["name"] += part.function.name or ""
+                    call["arguments"] += part.function.arguments or ""
+        return SimpleNamespace(content="".join(content), tool_calls=[
+            SimpleNamespace(id=call["id"], function=SimpleNamespace(name=call["name"], arguments=call["arguments"]))
+            for _, call in sorted(calls.items())
+        ]), prompt_tokens
+
+    @timed(AGENT_NODE_SECONDS, node="llm")
+    async def call_llm(self, state: AgentState) -> Dict[str, Any]:
+        messages = [{"role": "system", "content": self.system_prompt}] + state["messages"]
+        llm_calls = state["llm_calls"]
+        prompt_tokens = state["prompt_tokens"]
+        escalated = state["escalated"] or self.router_model is None
+
+        if not escalated:
+            llm_calls += 1
+            try:
+                message, used = await self._complete(self.router_model, messages, self._schemas + [ESCALATE_SCHEMA])
+                prompt_tokens += used
+                calls = self.parse_tool_calls(message)
+                reason = next((("invalid_call" if c.problem else "requested") for c in calls
+                               if c.problem or c.name == ESCALATE), None)
+            except Exception as exc:
+                logger.info("Router model failed, escalating: %s", exc)
+                reason = "error"
+            if reason is None:
+                return self._after_llm(state, message, calls, llm_calls, prompt_tokens, escalated=False)
+            AGENT_ESCALATIONS.labels(reason=reason).inc()
+            # Streaming clients drop whatever the router already sent for this step
+            await emit("escalate", {"reason": reason})
+
+        llm_calls += 1
+        message, used = await self._complete(self.model, messages, self._schemas)
+        return self._after_llm(state, message, self.parse_tool_calls(message), llm_calls, prompt_tokens + used,
+                               escalated=True)
+
+    def _after_llm(self, state: AgentState, message, calls: List[ToolCall], llm_calls: int, prompt_tokens: int,
+                   escalated: bool):
+        assistant = {"role": "assistant", "content": message.content or ""}
+        if calls:
+            assistant["tool_calls"] = [
+                {"id": c.id, "type": "function", "function": {"name": c.name, "arguments": json.dumps(c.arguments)}}
+                for c in calls
+            ]
+        return {
+            "messages": state["messages"] + [assistant],
+            "next_action": "tools" if calls else "respond",
+            "escalated": escalated,
+            "llm_calls": llm_calls,
+            "prompt_tokens": prompt_tokens,
+            "steps": state["steps"] + 1,
+        }
+
+    def parse_tool_calls(self, message) -> List[ToolCall]:
+        """Normalizes the provider's structured tool calls, coercing arguments to the declared types"""
+        calls = []
+        for i, raw in enumerate(getattr(message, "tool_calls", None) or []):
+            name = raw.function.name
+            call = ToolCall(getattr(raw, "id", None) or f"call_{i}", name, {})
+            try:
+                arguments = json.loads(raw.function.arguments or "{}")
+                if not isinstance(arguments, dict):
+                    raise ValueError("arguments must be a JSON object")
+            except ValueError as exc:
+                call.problem = f"malformed arguments: {exc}"
+                calls.append(call)
+                continue
+            call.arguments = arguments
+            if name == ESCALATE:
+                calls.append(call)
+                continue
+            tool = self.tools.get(name)
+            if tool is None:
+                call.problem = f"unknown tool '{name}'"
+            else:
+                call.problem = self._coerce(tool, call)
+            calls.append(call)
+        return calls
+
+    @staticmethod
+    def _coerce(tool: Tool, call: ToolCall) -> Optional[str]:
+        arguments = {}
+        for pname, param in tool.params.items():
+            if pname not in call.arguments:
+                if param.default is inspect.Parameter.empty:
+                    return f"missing argument '{pname}'"
+                continue
+            value = call.arguments[pname]
+            if param.annotation in (int, float) and not isinstance(value, bool):
+                try:
+                    value = param.annotation(value)
+                except (TypeError, ValueError):
+                    return f"'{pname}' must be a {_JSON_TYPES[param.annotation]}"
+            elif param.annotation is str and value is not None and not isinstance(value, str):
+                value = str(value)
+            arguments[pname] = value
+        call.arguments = arguments
+        return None
+
+    # ==================== TOOL NODE ====================
+
+    async def _run_one(self, call: ToolCall) -> Tuple[ToolCall, str, bool]:
+        if call.problem:
+            AGENT_TOOL_CALLS.labels(tool=call.name, outcome="invalid").inc()
+            result, ok = f"Error: could not call {call.name}: {call.problem}", False
+        else:
+            await emit("tool_start", {"id": call.id, "name": call.name, "arguments": call.arguments})
+            try:
+                result = str(await self.tools[call.name].fn(**call.arguments))
+                ok = not result.startswith("Error")
+                AGENT_TOOL_CALLS.labels(tool=call.name, outcome="ok" if ok else "error").inc()
+            except Exception as exc:
+                logger.exception("Tool %s failed", call.name)
+                AGENT_TOOL_CALLS.labels(tool=call.name, outcome="exception").inc()
+                result, ok = f"Error: {call.name} failed: {exc}", False
+        await emit("tool_end", {"id": call.id, "name": call.name, "ok": ok, "result": result})
+        return call, result, ok
+
+    @timed(AGENT_NODE_SECONDS, node="tools")
+    async def run_tools(self, state: AgentState) -> Dict[str, Any]:
+        """Executes every tool call of the last assistant message concurrently"""
+        assistant = state["messages"][-1]
+        calls = [
+            ToolCall(raw["id"], raw["function"]["name"], json.loads(raw["function"]["arguments"]))
+            for raw in assistant.get("tool_calls", [])
+        ]
+        # Arguments were coerced when parsed; re-check so problems survive the round trip through the state
+        for call in calls:
+            tool = self.tools.get(call.name)
+            call.problem = f"unknown tool '{call.name}'" if tool is None else self._coerce(tool, call)
+        outcomes = await asyncio.gather(*(self._run_one(call) for call in calls))
+
+        messages = state["messages"] + [
+            {"role": "tool", "tool_call_id": call.id, "name": call.name, "content": result}
+            for call, result, _ in outcomes
+        ]
+        executed = state["tool_calls"] + [
+            {"name": call.name, "arguments": call.arguments, "result": result, "ok": ok}
+            for call, result, ok in outcomes
+        ]
+        all_ok = all(ok for _, _, ok in outcomes)
+        direct = all_ok and all(self.tools[call.name].direct for call, _, _ in outcomes)
+        if direct or state["steps"] >= self.max_steps:
+            results = "\n\n".join(result for _, result, _ in outcomes)
+            reply = "\n\n".join(filter(None, [assistant.get("content"), results]))
+            await emit("token", {"text": reply[len(assistant.get("content") or ""):]})
+            messages.append({"role": "assistant", "content": reply})
+            return {"messages": messages, "tool_calls": executed, "next_action": "respond"}
+        # A failed tool hands the follow-up (clarifying question or retry) to the main model
+        return {"messages": messages, "tool_calls": executed, "next_action": "llm",
+                "escalated": state["escalated"] or not all_ok}
@@ -0,0 +1,366 @@
+# analytics.py - Per-HCP engagement aggregates, maintained incrementally on every interaction write
+
+import asyncio
+import heapq
+import logging
+import re
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Callable, Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+
+from metrics import Gauge
+from models import HCP, Interaction
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_INTERACTIONS = Gauge("crm_analytics_interactions", "Interactions counted in the engagement aggregates")
+ANALYTICS_STALE = Gauge("crm_analytics_stale_hcps", "HCPs waiting for their aggregates to be recomputed")
+
+WINDOWS = (7, 30, 90)
+DAY = 86400.0
+NEVER = float("-inf")
+# Contact times are kept for the longest window only; older contacts live on in the counts
+RECENT_DAYS = max(WINDOWS)
+# HCPs per IN (...) list when recomputing
+REFRESH_CHUNK = 500
+
+_PRODUCT_SEPARATORS = re.compile(r"\s*(?:[,;/|\n]|\band\b|&)\s*", re.IGNORECASE)
+
+@lru_cache(maxsize=4096)
+def parse_products(products: Optional[str]) -> Tuple[str, ...]:
+    """Distinct product names from a free-text products_discussed value ("CardioMax, NeuroCalm and X")"""
+    if not products:
+        return ()
+    names = (" ".join(part.split()) for part in _PRODUCT_SEPARATORS.split(products))
+    return tuple(dict.fromkeys(name for name in names if name))
+
+def _timestamp(value: Optional[datetime]) -> float:
+    """Epoch seconds; naive datetimes are UTC, as written by the models' datetime.utcnow defaults"""
+    if value is None:
+        return time.time()
+    return (value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value).timestamp()
+
+class HCPEngagement:
+    """Aggregates for one HCP: counts over its whole history, plus the contact times of the last
+    RECENT_DAYS kept sorted so windows are a bisect"""
+
+    __slots__ = ("hcp_id", "total", "by_type", "products", "last_contact", "recent")
+
+    def __init__(self, hcp_id: int):
+        self.hcp_id = hcp_id
+        self.total = 0
+        self.by_type: Counter = Counter()
+        self.products: Counter = Counter()
+        # Newest contact time, -inf when never contacted
+        self.last_contact = NEVER
+        self.recent: List[float] = []
+
+    def add(self, interaction_type: str, created_at: float, products: Tuple[str, ...]):
+        self.total += 1
+        self.by_type[interaction_type] += 1
+        for product in products:
+            self.products[product] += 1
+        self.last_contact = max(self.last_contact, created_at)
+        horizon = time.time() - RECENT_DAYS * DAY
+        if created_at < horizon:
+            return
+        if not self.recent or created_at >= self.recent[-1]:
+            self.recent.append(created_at)
+        else:
+            insort(self.recent, created_at)
+        if self.recent[0] < horizon:
+            del self.recent[:bisect_left(self.recent, horizon)]
+
+    def combine(self, other: "HCPEngagement", sign: int = 1):
+        """Adds (sign=1) or takes away (sign=-1) another aggregate's counts and recent contacts;
+        last_contact is left to the caller"""
+        self.total += sign * other.total
+        for counter, others in ((self.by_type, other.by_type), (self.products, other.products)):
+            for key, count in others.items():
+                counter[key] += sign * count
+                if counter[key] <= 0:
+                    del counter[key]
+        for created_at in other.recent:
+            if sign > 0:
+                insort(self.recent, created_at)
+                continue
+            index = bisect_left(self.recent, created_at)
+            if index < len(self.recent) and self.recent[index] == created_at:
+                del self.recent[index]
+
+    def window(self, days: int, now: float) -> int:
+        return len(self.recent) - bisect_left(self.recent, now - days * DAY)
+
+    def to_dict(self, now: Optional[float] = None, top_products: int = 10) -> Dict[str, Any]:
+        now = now or time.time()
+        last = self.last_contact if self.last_contact != NEVER else None
+        return {
+            "hcp_id": self.hcp_id,
+            "total": self.total,
+            "by_type": dict(self.by_type),
+            "last_contact": datetime.utcfromtimestamp(last) if last is not None else None,
+            "days_since_last_contact": int((now - last) // DAY) if last is not None else None,
+            "windows": {f"{days}d": self.window(days, now) for days in WINDOWS},
+            "products": dict(self.products.most_common(top_products)),
+        }
+
+    def describe(self, now: Optional[float] = None) -> str:
+        """Compact plain-text form for prompts"""
+        stats = self.to_dict(now, top_products=5)
+        lines = [f"Interactions: {stats['total']} total, "
+                 + ", ".join(f"{count} in {window}" for window, count in stats["windows"].items())]
+        if stats["days_since_last_contact"] is not None:
+            lines.append(f"Last contact: {stats['days_since_last_contact']} days ago")
+        if stats["by_type"]:
+            lines.append("By type: " + ", ".join(f"{t} {n}" for t, n in Counter(stats["by_type"]).most_common()))
+        if stats["products"]:
+            lines.append("Products: " + ", ".join(f"{p} {n}" for p, n in stats["products"].items()))
+        return "\n".join(lines)
+
+class EngagementAnalytics:
+    """Materialized engagement aggregates for every HCP, held in process memory.
+
+    Built at startup by GROUP BY queries, so memory holds per-HCP counts and
+    the last RECENT_DAYS of contact times, never the interaction rows. New
+    interactions are counted in place by add(). An edit or delete can't be
+    retracted from counts alone: mark_stale() queues the HCP, and a
+    background task recomputes it from the table moments later. HCPs are
+    also kept sorted by last contact, so the usual under-engaged question
+    ("no contact in N days") reads a prefix instead of scanning every HCP.
+    """
+
+    def __init__(self, session: Optional[Callable[[], Any]] = None):
+        # Async context manager yielding a session, for background recomputes
+        self.session = session
+        self._hcps: Dict[int, HCPEngagement] = {}
+        # The same aggregates across all HCPs
+        self._all = HCPEngagement(0)
+        # (last contact, hcp_id), ascending
+        self._by_last_contact: List[Tuple[float, int]] = []
+        # HCPs waiting for a recompute, and those whose recompute is running
+        self._stale: Set[int] = set()
+        self._refreshing: Set[int] = set()
+        self._loading = False
+        # Loads and recomputes are applied one at a time, so an older read never lands over a newer one
+        self._lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._all.total
+
+    def add_hcp(self, hcp_id: int, _bulk: bool = False):
+        if hcp_id in self._hcps:
+            return
+        self._hcps[hcp_id] = HCPEngagement(hcp_id)
+        if not _bulk:
+            insort(self._by_last_contact, (NEVER, hcp_id))
+
+    def _engagement(self, hcp_id: int) -> HCPEngagement:
+        if hcp_id not in self._hcps:
+            self.add_hcp(hcp_id)
+        return self._hcps[hcp_id]
+
+    def _moved(self, hcp_id: int, before: float, after: float):
+        """Re-sorts an HCP whose last contact changed from `before`"""
+        if after != before:
+            del self._by_last_contact[bisect_left(self._by_last_contact, (before, hcp_id))]
+            insort(self._by_last_contact, (after, hcp_id))
+
+    def add(self, hcp_id: Optional[int], interaction_type: Optional[str], created_at: Optional[datetime],
+            products_discussed: Optional[str]):
+        """Counts a newly inserted interaction; edits and deletes go through mark_stale()"""
+        if hcp_id is None:
+            return
+        # A recompute in flight may or may not see this row; recompute again rather than count it twice
+        if self._loading or hcp_id in self._stale or hcp_id in self._refreshing:
+            self.mark_stale(hcp_id)
+            return
+        row = (interaction_type or "other", _timestamp(created_at), parse_products(products_discussed))
+        engagement = self._engagement(hcp_id)
+        before = engagement.last_contact
+        engagement.add(*row)
+        self._all.add(*row)
+        self._moved(hcp_id, before, engagement.last_contact)
+        ANALYTICS_INTERACTIONS.set(self._all.total)
+
+    def record(self, interaction: Interaction):
+        """add() from an ORM row after insert"""
+        self.add(interaction.hcp_id, interaction.interaction_type, interaction.created_at,
+                 interaction.products_discussed)
+
+    def mark_stale(self, hcp_id: Optional[int]):
+        """Queues an HCP whose interactions were edited or deleted for a recompute from the table"""
+        if hcp_id is None:
+            return
+        self._stale.add(hcp_id)
+        ANALYTICS_STALE.set(len(self._stale) + len(self._refreshing))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ---------- building ----------
+
+    @staticmethod
+    def _fill(hcps: Dict[int, HCPEngagement], counts: Iterable[Tuple[int, Optional[str], int, datetime]],
+              products: Iterable[Tuple[int, str, int]], recent: Iterable[Tuple[int, datetime]]):
+        """Adds aggregate rows (see _aggregate) into per-HCP aggregates, creating missing HCPs"""
+        def engagement(hcp_id: int) -> HCPEngagement:
+            if hcp_id not in hcps:
+                hcps[hcp_id] = HCPEngagement(hcp_id)
+            return hcps[hcp_id]
+        for hcp_id, interaction_type, count, newest in counts:
+            target = engagement(hcp_id)
+            target.total += count
+            target.by_type[interaction_type or "other"] += count
+            if newest is not None:
+                target.last_contact = max(target.last_contact, _timestamp(newest))
+        for hcp_id, products_discussed, count in products:
+            target = engagement(hcp_id)
+            for product in parse_products(products_discussed):
+                target.products[product] += count
+        # Oldest first, so every contact list is built by appending
+        for hcp_id, created_at in recent:
+            engagement(hcp_id).recent.append(_timestamp(created_at))
+
+    def _sum(self) -> HCPEngagement:
+        total = HCPEngagement(0)
+        for engagement in self._hcps.values():
+            total.total += engagement.total
+            total.by_type.update(engagement.by_type)
+            total.products.update(engagement.products)
+        total.recent = sorted(chain.from_iterable(e.recent for e in self._hcps.values()))
+        total.last_contact = self._by_last_contact[-1][0] if self._by_last_contact else NEVER
+        return total
+
+    def build(self, hcp_ids: Iterable[int], counts: Iterable[Tuple[int, Optional[str], int, datetime]],
+              products: Iterable[Tuple[int, str, int]], recent: Iterable[Tuple[int, datetime]]):
+        """Builds from aggregate rows: (hcp_id, interaction_type, count, newest created_at),
+        (hcp_id, products_discussed, count) and the recent (hcp_id, created_at), oldest first"""
+        for hcp_id in hcp_ids:
+            self.add_hcp(hcp_id, _bulk=True)
+        self._fill(self._hcps, counts, products, recent)
+        self._by_last_contact = sorted((e.last_contact, e.hcp_id) for e in self._hcps.values())
+        self._all = self._sum()
+        ANALYTICS_INTERACTIONS.set(self._all.total)
+
+    @staticmethod
+    async def _aggregate(db, hcp_ids: Optional[Collection[int]] = None) -> Tuple[List, List, List]:
+        """The aggregate rows build() takes, for every HCP or just `hcp_ids`"""
+        def scoped(stmt):
+            if hcp_ids is None:
+                return stmt.where(Interaction.hcp_id.is_not(None))
+            return stmt.where(Interaction.hcp_id.in_(hcp_ids))
+        counts = (await db.execute(scoped(select(
+            Interaction.hcp_id, Interaction.interaction_type, func.count(), func.max(Interaction.created_at),
+        )).group_by(Interaction.hcp_id, Interaction.interaction_type))).tuples().all()
+        products = (await db.execute(scoped(select(
+            Interaction.hcp_id, Interaction.products_discussed, func.count(),
+        ).where(Interaction.products_discussed.is_not(None))).group_by(
+            Interaction.hcp_id, Interaction.products_discussed))).tuples().all()
+        horizon = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+        recent = (await db.execute(scoped(select(Interaction.hcp_id, Interaction.created_at).where(
+            Interaction.created_at >= horizon)).order_by(Interaction.created_at))).tuples().all()
+        return counts, products, recent
+
+    async def load(self, db):
+        """Cold-builds the aggregates from the hcps table and GROUP BY queries over interactions"""
+        async with self._lock:
+            self._loading = True
+            try:
+                analytics = EngagementAnalytics()
+                hcp_ids = (await db.execute(select(HCP.id))).scalars().all()
+                analytics.build(hcp_ids, *await self._aggregate(db))
+                self._hcps, self._all = analytics._hcps, analytics._all
+                self._by_last_contact = analytics._by_last_contact
+            finally:
+                self._loading = False
+
+    async def refresh(self, db, hcp_ids: Collection[int]):
+        """Recomputes some HCPs' aggregates from the table"""
+        async with self._lock:
+            fresh = {hcp_id: HCPEngagement(hcp_id) for hcp_id in hcp_ids}
+            ordered = sorted(hcp_ids)
+            for i in range(0, len(ordered), REFRESH_CHUNK):
+                self._fill(fresh, *await self._aggregate(db, ordered[i:i + REFRESH_CHUNK]))
+            # A few HCPs are swapped out of the totals; after a big batch (an archived month) re-summing is cheaper
+            small = len(fresh) <= 64
+            for hcp_id, engagement in fresh.items():
+                old = self._hcps.get(hcp_id)
+                if small and old is not None:
+                    self._all.combine(old, -1)
+                if small:
+                    self._all.combine(engagement)
+                self._hcps[hcp_id] = engagement
+                if old is None:
+                    insort(self._by_last_contact, (engagement.last_contact, hcp_id))
+                else:
+                    self._moved(hcp_id, old.last_contact, engagement.last_contact)
+            if small:
+                self._all.last_contact = self._by_last_contact[-1][0] if self._by_last_contact else NEVER
+            else:
+                self._all = self._sum()
+            ANALYTICS_INTERACTIONS.set(self._all.total)
+
+    # ---------- background recomputes ----------
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        if self._stale:
+            self._wakeup.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._stale:
+                self._refreshing, self._stale = self._stale, set()
+                try:
+                    async with self.session() as db:
+                        await self.refresh(db, self._refreshing)
+                except Exception:
+                    logger.exception("Recomputing engagement for %d HCPs failed", len(self._refreshing))
+                    self._stale |= self._refreshing
+                    await asyncio.sleep(1.0)
+                finally:
+                    self._refreshing = set()
+                    ANALYTICS_STALE.set(len(self._stale))
+
+    # ---------- queries ----------
+
+    def hcp(self, hcp_id: int) -> Optional[HCPEngagement]:
+        return self._hcps.get(hcp_id)
+
+    def under_engaged(self, days: int = 30, below: int = 1, limit: int = 50) -> List[Dict[str, Any]]:
+        """HCPs with fewer than `below` interactions in the last `days` days, longest-silent first"""
+        now = time.time()
+        cutoff = now - days * DAY
+        if below == 1:
+            # Exactly the HCPs whose last contact is before the cutoff, already in order
+            end = bisect_left(self._by_last_contact, (cutoff, -1), hi=min(limit, len(self._by_last_contact)))
+            quiet = [self._hcps[hcp_id] for _, hcp_id in self._by_last_contact[:end]]
+        else:
+            quiet = heapq.nsmallest(limit, (e for e in self._hcps.values() if e.window(days, now) < below),
+                                    key=lambda e: e.last_contact)
+        return [e.to_dict(now, top_products=3) for e in quiet]
+
+    def overview(self, top_products: int = 10) -> Dict[str, Any]:
+        overview = self._all.to_dict(top_products=top_products)
+        del overview["hcp_id"], overview["days_since_last_contact"]
+        overview["hcps"] = len(self._hcps)
+        return overview
@@ -0,0 +1,266 @@
+# archive.py - Cold interaction history: one zstd-compressed Parquet file per archived month
+"""
+Months past the hot window (partitions.py) are moved out of the database
+into ARCHIVE_DIR/interactions/YYYY-MM.parquet, each sorted newest first by
+(created_at, id). Reads are on demand: the interactions listing with
+?include_archived=true and exports (export.py). Writes and reads both go a
+row group at a time, so memory never grows with a month's size.
+
+pyarrow is imported on first use, so importing this module stays cheap.
+"""
+
+import itertools
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Rows per Parquet row group: the unit every read and write holds in memory
+ROW_GROUP_ROWS = 65_536
+
+# Archived columns, in file order
+COLUMNS = (
+    "id", "hcp_id", "interaction_type", "notes", "products_discussed",
+    "follow_up_required", "followup_date", "created_at", "updated_at",
+)
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def arrow_schema():
+    import pyarrow as pa
+    timestamp = pa.timestamp("us")
+    return pa.schema([
+        ("id", pa.int64()), ("hcp_id", pa.int64()), ("interaction_type", pa.string()), ("notes", pa.string()),
+        ("products_discussed", pa.string()), ("follow_up_required", pa.bool_()), ("followup_date", timestamp),
+        ("created_at", timestamp), ("updated_at", timestamp),
+    ])
+
+class InteractionArchive:
+    """Parquet files of archived interactions, one per calendar month of created_at"""
+
+    def __init__(self, directory: str):
+        self.directory = os.path.join(directory, "interactions")
+
+    @classmethod
+    def from_env(cls) -> "InteractionArchive":
+        return cls(os.getenv("ARCHIVE_DIR", "archive"))
+
+    def path(self, month: datetime) -> str:
+        return os.path.join(self.directory, f"{month:%Y-%m}.parquet")
+
+    def months(self) -> List[datetime]:
+        """Archived months, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        months = []
+        for name in os.listdir(self.directory):
+            try:
+                months.append(datetime.strptime(name, "%Y-%m.parquet"))
+            except ValueError:
+                continue
+        return sorted(months)
+
+    def write(self, month: datetime, batches: Iterable[Sequence[Tuple]]) -> int:
+        """Adds rows (COLUMNS order, newest first by (created_at, id)) to a month's file; returns how many were
+        given.
+
+        Rows already archived under the same id are replaced, so re-archiving
+        a month (late rows, a retried run) never duplicates. The new rows and
+        the existing file are merged as two sorted streams into a temporary
+        file a row group at a time, which is then swapped in whole, so memory
+        stays at a few row groups and readers see the old or the new version.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = arrow_schema()
+        given = 0
+
+        def new_tables():
+            nonlocal given
+            for batch in batches:
+                if batch:
+                    given += len(batch)
+                    yield pa.Table.from_batches([pa.RecordBatch.from_arrays(
+                        [pa.array(column, type=field.type) for column, field in zip(zip(*batch), schema)],
+                        schema=schema)])
+        tables = new_tables()
+        first = next(tables, None)
+        if first is None:
+            return 0
+        path = self.path(month)
+        existing = (pa.Table.from_batches([batch]) for batch in pq.ParquetFile(path).iter_batches(
+            batch_size=ROW_GROUP_ROWS, columns=list(COLUMNS))) if os.path.exists(path) else iter(())
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with pq.ParquetWriter(path + ".tmp", schema, compression="zstd") as writer:
+                _write_row_groups(writer, _merge(itertools.chain([first], tables), existing))
+        except BaseException:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+            raise
+        os.replace(path + ".tmp", path)
+        return given
+
+    def _groups(self, columns: Sequence[str] = COLUMNS, before: Optional[Tuple[datetime, int]] = None,
+                hcp_id: Optional[int] = None, interaction_type: Optional[str] = None,
+                follow_up_required: Optional[bool] = None, created_from: Optional[datetime] = None,
+                created_to: Optional[datetime] = None) -> Iterator[Any]:
+        """Matching rows a row group at a time as Arrow tables, newest first (files are sorted that way).
+
+        Row groups whose created_at (or hcp_id) statistics rule them out are
+        never read, and a month stops at the first row group older than
+        `created_from`.
+        """
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        conditions = []
+        if hcp_id is not None:
+            conditions.append(lambda table: pc.equal(table["hcp_id"], hcp_id))
+        if interaction_type is not None:
+            conditions.append(lambda table: pc.equal(table["interaction_type"], interaction_type))
+        if follow_up_required is not None:
+            conditions.append(lambda table: pc.equal(table["follow_up_required"], follow_up_required))
+        if created_from is not None:
+            conditions.append(lambda table: pc.greater_equal(table["created_at"], created_from))
+        if created_to is not None:
+            conditions.append(lambda table: pc.less(table["created_at"], created_to))
+        if before is not None:
+            conditions.append(lambda table: pc.invert(_at_or_ahead(table, before)))
+        filtered = {"hcp_id": hcp_id, "interaction_type": interaction_type,
+                    "follow_up_required": follow_up_required, "created_at": True}
+        read = [c for c in COLUMNS if c in columns or filtered.get(c) is not None]
+
+        for month in reversed(self.months()):
+            if ((created_from is not None and add_months(month, 1) <= created_from)
+                    or (created_to is not None and month >= created_to)
+                    or (before is not None and month > before[0])):
+                continue
+            file = pq.ParquetFile(self.path(month))
+            for group in range(file.num_row_groups):
+                created_at = _statistics(file, group, "created_at")
+                if created_at is not None:
+                    newest, oldest = created_at.max, created_at.min
+                    if created_from is not None and newest < created_from:
+                        break
+                    if ((created_to is not None and oldest >= created_to)
+                            or (before is not None and oldest > before[0])):
+                        continue
+                hcp_ids = _statistics(file, group, "hcp_id")
+                if hcp_id is not None and hcp_ids is not None and not hcp_ids.min <= hcp_id <= hcp_ids.max:
+                    continue
+                table = file.read_row_group(group, columns=read)
+                if conditions:
+                    mask = conditions[0](table)
+                    for condition in conditions[1:]:
+                        mask = pc.and_(mask, condition(table))
+                    table = table.filter(mask)
+                if table.num_rows:
+                    yield table.select(list(columns))
+
+    def batches(self, batch_size: int, hcp_id: Optional[int] = None, interaction_type: Optional[str] = None,
+                follow_up_required: Optional[bool] = None, created_from: Optional[datetime] = None,
+                created_to: Optional[datetime] = None) -> Iterator[Any]:
+        """Matching rows as Arrow record batches of all COLUMNS, newest first"""
+        for table in self._groups(COLUMNS, None, hcp_id, interaction_type, follow_up_required, created_from,
+                                  created_to):
+            yield from table.to_batches(max_chunksize=batch_size)
+
+    def scan(self, **filters) -> Iterator[List[Dict[str, Any]]]:
+        """Matching rows a row group at a time, newest first; takes read()'s filters"""
+        for table in self._groups(**filters):
+            yield table.to_pylist()
+
+    def read(self, limit: int, **filters) -> List[Dict[str, Any]]:
+        """Up to `limit` archived rows newest first by (created_at, id), filtered like the listing.
+
+        `before` is a keyset position, as in the listing's cursor; the other
+        filters are its query parameters. Reading stops at the row group that
+        fills the page.
+        """
+        rows: List[Dict[str, Any]] = []
+        for table in self._groups(**filters):
+            rows.extend(table.slice(0, limit - len(rows)).to_pylist())
+            if len(rows) >= limit:
+                break
+        return rows
+
+def _statistics(file, group: int, column: str):
+    """A row group's min/max statistics for a column, or None where the file has none"""
+    statistics = file.metadata.row_group(group).column(file.schema_arrow.get_field_index(column)).statistics
+    return statistics if statistics is not None and statistics.has_min_max else None
+
+def _at_or_ahead(table, key: Tuple[datetime, int]):
+    """Mask of the rows at or ahead of `key` = (created_at, id) in newest-first order"""
+    import pyarrow.compute as pc
+    created_at, interaction_id = key
+    return pc.or_(pc.greater(table["created_at"], created_at),
+                  pc.and_(pc.equal(table["created_at"], created_at), pc.greater_equal(table["id"], interaction_id)))
+
+def _last_key(table) -> Tuple[datetime, int]:
+    return table["created_at"][-1].as_py(), table["id"][-1].as_py()
+
+def _merge(new: Iterator[Any], old: Iterator[Any]) -> Iterator[Any]:
+    """Merges two streams of Arrow tables, each sorted newest first, into one; `new` wins on a shared id.
+
+    Each round emits, sorted, every buffered row at or ahead of the newer
+    of the two buffers' last keys: nothing either stream has left can come
+    before them. Memory stays at about one table per stream.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    sources = [new, old]
+    pending: List[Any] = [None, None]
+    while True:
+        for side in (0, 1):
+            while sources[side] is not None and (pending[side] is None or not pending[side].num_rows):
+                pending[side] = next(sources[side], None)
+                if pending[side] is None:
+                    sources[side] = None
+        live = [side for side in (0, 1) if sources[side] is not None]
+        if not live and all(table is None or not table.num_rows for table in pending):
+            return
+        window = []
+        cutoff = max(_last_key(pending[side]) for side in live) if live else None
+        for side in (0, 1):
+            table = pending[side]
+            if table is None or not table.num_rows:
+                window.append(None)
+                continue
+            if cutoff is None:
+                window.append(table)
+                pending[side] = None
+                continue
+            ahead = _at_or_ahead(table, cutoff)
+            window.append(table.filter(ahead))
+            pending[side] = table.filter(pc.invert(ahead))
+        fresh, stale = window
+        # A row in both carries the same (created_at, id), so both copies land in the same window
+        if fresh is not None and stale is not None and stale.num_rows:
+            stale = stale.filter(pc.invert(pc.is_in(stale["id"], value_set=fresh["id"])))
+        parts = [table for table in (fresh, stale) if table is not None and table.num_rows]
+        if parts:
+            yield pa.concat_tables(parts).sort_by([("created_at", "descending"), ("id", "descending")])
+
+def _write_row_groups(writer, tables: Iterable[Any]):
+    """Writes a stream of tables as row groups of exactly ROW_GROUP_ROWS (the last one may be short)"""
+    import pyarrow as pa
+
+    pending: List[Any] = []
+    rows = 0
+    for table in tables:
+        pending.append(table)
+        rows += table.num_rows
+        while rows >= ROW_GROUP_ROWS:
+            whole = pa.concat_tables(pending)
+            writer.write_table(whole.slice(0, ROW_GROUP_ROWS), row_group_size=ROW_GROUP_ROWS)
+            rest = whole.slice(ROW_GROUP_ROWS).combine_chunks()
+            pending, rows = [rest], rest.num_rows
+    if rows:
+        writer.write_table(pa.concat_tables(pending), row_group_size=ROW_GROUP_ROWS)
@@ -0,0 +1,93 @@
+"""
+Per-turn latency and LLM calls of the chat agent, offline.
+
+FakeGroq (fake_groq.py) stands in for Groq: it answers with structured tool
+calls for visit/search/insight requests and with text otherwise, sleeping a
+per-model latency. Tools are stubs that sleep --tool-ms. The legacy column is
+the old single-node graph: one llama-3.3-70b-versatile call per turn and no
+tool execution.
+
+With --token-ms the same scenarios also run through Agent.astream, comparing
+time to first token with the full turn.
+
+Usage (from backend/):
+    python benchmarks/bench_agent.py --router-ms 150 --main-ms 900 --tool-ms 120 --token-ms 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from agent import Agent, tool_from_function  # noqa: E402
+from fake_groq import FakeGroq  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+
+MAIN_MODEL = "llama-3.3-70b-versatile"
+ROUTER_MODEL = "llama-3.1-8b-instant"
+
+SCENARIOS = {
+    "small talk": "Thanks, that's all for today",
+    "log a visit": "I met Dr. Sarah Johnson today and discussed GlucoControl",
+    "log + search + insights": "I met Dr. Chen, find other oncologists and show insights for HCP 3",
+    "needs reasoning": "Analyze which of my accounts are cooling off and why",
+}
+
+def stub_tools(tool_ms: float):
+    async def log_interaction(hcp_name: str, interaction_type: str, notes: str, products: str = "") -> str:
+        """Logs an interaction with an HCP."""
+        await asyncio.sleep(tool_ms / 1000)
+        return "Interaction logged successfully (ID: 1)."
+
+    async def search_hcp(query: str) -> str:
+        """Searches for HCPs by name, specialty, or hospital."""
+        await asyncio.sleep(tool_ms / 1000)
+        return "Found HCPs:\nDr. Michael Chen - Oncology"
+
+    async def generate_insights(hcp_id: int, days: int = 30) -> str:
+        """Generates AI insights about interactions with a specific HCP."""
+        await asyncio.sleep(tool_ms / 1000)
+        return "Engagement: High"
+
+    return [tool_from_function(fn.__name__, fn) for fn in (log_interaction, search_hcp, generate_insights)]
+
+async def main(args):
+    backend = FakeGroq({MAIN_MODEL: args.main_ms / 1000, ROUTER_MODEL: args.router_ms / 1000},
+                       token_latency=args.token_ms / 1000)
+    gateway = LLMGateway(backend)
+    agent = Agent(gateway, stub_tools(args.tool_ms), "You are a CRM assistant.", MAIN_MODEL, ROUTER_MODEL)
+
+    await agent.ainvoke([{"role": "user", "content": "warm up"}])
+    print(f"{'scenario':<26} {'legacy':>16} {'agent':>18}  {'tools run':>9}")
+    for label, message in SCENARIOS.items():
+        legacy = args.main_ms / 1000
+        backend.calls = 0
+        start = time.perf_counter()
+        state = await agent.ainvoke([{"role": "user", "content": message}])
+        elapsed = time.perf_counter() - start
+        print(f"{label:<26} {legacy * 1000:>7.0f} ms, 1 call {elapsed * 1000:>7.0f} ms, {backend.calls} call"
+              f"{'s' if backend.calls != 1 else ' '}  {len(state['tool_calls']):>9}")
+
+    if not args.token_ms:
+        return
+    print(f"\nStreaming ({args.token_ms:.0f} ms/token):")
+    print(f"{'scenario':<26} {'first token':>12} {'full turn':>12}")
+    for label, message in SCENARIOS.items():
+        start = time.perf_counter()
+        first = None
+        async for event, _ in agent.astream([{"role": "user", "content": message}]):
+            if event == "token" and first is None:
+                first = time.perf_counter() - start
+        elapsed = time.perf_counter() - start
+        print(f"{label:<26} {first * 1000:>9.0f} ms {elapsed * 1000:>9.0f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--router-ms", type=float, default=150)
+    parser.add_argument("--main-ms", type=float, default=900)
+    parser.add_argument("--tool-ms", type=float, default=120)
+    parser.add_argument("--token-ms", type=float, default=20, help="Per-token delay when streaming (0 skips)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,85 @@
+"""
+Engagement analytics: cold build, incremental writes and reads at scale.
+
+Builds EngagementAnalytics from the aggregate rows its GROUP BY queries
+return, computed here from synthetic rows (no database), then times
+single-interaction adds, per-HCP reads, the under-engaged scan and the
+overview. Edits and deletes recompute an HCP from the database and aren't
+timed here. The baseline is what answering "which HCPs are under-engaged"
+costs without the aggregates: one pass over every interaction.
+
+Usage (from backend/):
+    python benchmarks/bench_analytics.py --hcps 50000 --interactions 2000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from analytics import RECENT_DAYS, EngagementAnalytics  # noqa: E402
+
+TYPES = ["visit", "call", "email", "webinar"]
+PRODUCTS = ["CardioMax", "GlucoControl", "NeuroCalm, OncoShield", "CardioMax and NeuroCalm", None]
+
+def rows(hcps, interactions, seed=3):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    for interaction_id in range(1, interactions + 1):
+        yield (interaction_id, rng.randint(1, hcps), rng.choice(TYPES),
+               now - timedelta(seconds=rng.randint(0, 365 * 86400)), rng.choice(PRODUCTS))
+
+def aggregates(data):
+    """What EngagementAnalytics._aggregate reads from the database for these rows"""
+    counts, newest, products = Counter(), {}, Counter()
+    horizon = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+    for _, hcp_id, interaction_type, created_at, products_discussed in data:
+        counts[hcp_id, interaction_type] += 1
+        newest[hcp_id, interaction_type] = max(newest.get((hcp_id, interaction_type), created_at), created_at)
+        if products_discussed is not None:
+            products[hcp_id, products_discussed] += 1
+    recent = sorted(((row[1], row[3]) for row in data if row[3] >= horizon), key=lambda row: row[1])
+    return ([key + (count, newest[key]) for key, count in counts.items()],
+            [key + (count,) for key, count in products.items()], recent)
+
+def timed(label, fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    unit, scale = ("ms", 1e3) if elapsed >= 1e-3 else ("us", 1e6)
+    print(f"  {label:<40} {elapsed * scale:>10.1f} {unit}")
+    return result
+
+def main(args):
+    data = list(rows(args.hcps, args.interactions))
+    print(f"{args.hcps:,} HCPs, {args.interactions:,} interactions:")
+
+    rows_by_query = aggregates(data)
+    print(f"  aggregate rows read at startup: {sum(len(rows) for rows in rows_by_query):,}")
+    analytics = EngagementAnalytics()
+    timed("cold build", lambda: analytics.build(range(1, args.hcps + 1), *rows_by_query))
+
+    def full_scan():
+        cutoff = datetime.utcnow() - timedelta(days=30)
+        recent = {hcp_id for _, hcp_id, _, created_at, _ in data if created_at >= cutoff}
+        return [hcp_id for hcp_id in range(1, args.hcps + 1) if hcp_id not in recent]
+    timed("baseline: under-engaged by full scan", full_scan)
+
+    rng = random.Random(9)
+    timed("add one new interaction", lambda: analytics.add(
+        rng.randint(1, args.hcps), "visit", datetime.utcnow(), "CardioMax"), repeat=10_000)
+    timed("read one HCP", lambda: analytics.hcp(rng.randint(1, args.hcps)).to_dict(), repeat=10_000)
+    timed("under-engaged (30d, top 50)", lambda: analytics.under_engaged(30, 1, 50), repeat=5)
+    timed("overview", analytics.overview, repeat=1_000)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hcps", type=int, default=50_000)
+    parser.add_argument("--interactions", type=int, default=1_000_000)
+    main(parser.parse_args())
@@ -0,0 +1,98 @@
+"""
+Archival of cold months to Parquet, and listing latency with and without the archive.
+
+Reseeds --interactions interactions over --years (datagen.py --reset) and
+an empty archive on every run, archives everything older than --hot-months
+(partitions.py), then reports:
+
+    archival     rows moved, time, and bytes in the database vs the Parquet files
+    listing      GET /api/interactions in-process, median over --requests:
+                   first page (hot rows only)
+                   first page with include_archived (the archive isn't read)
+                   a page deep in the archived months, by cursor
+                   one HCP's history with include_archived
+
+Usage (from backend/):
+    python benchmarks/bench_archive.py --interactions 1000000 --hot-months 12
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_archive.db")
+os.environ.setdefault("ARCHIVE_DIR", "archive/bench")
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import httpx  # noqa: E402
+
+from archive import add_months, month_start  # noqa: E402
+from database import engine  # noqa: E402
+
+def seed(args):
+    import datagen
+    datagen.main(argparse.Namespace(hcps=args.hcps, interactions=args.interactions, years=args.years, seed=0,
+                                    chunk_size=100_000, reset=True))
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+async def timed_get(client: httpx.AsyncClient, path: str, requests: int) -> float:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(path)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples)
+
+async def main(args):
+    shutil.rmtree(os.environ["ARCHIVE_DIR"], ignore_errors=True)
+    seed(args)
+    database = engine.url.database
+    before = os.path.getsize(database)
+
+    import main as app_module
+    maintainer = app_module.partition_maintainer
+    maintainer.hot_months = args.hot_months
+    start = time.perf_counter()
+    moved = maintainer.run_once()
+    elapsed = time.perf_counter() - start
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    after = os.path.getsize(database)
+    parquet = directory_bytes(os.environ["ARCHIVE_DIR"])
+    print(f"Archived {moved:,} of {args.interactions:,} interactions (older than {args.hot_months} months) "
+          f"in {elapsed:.1f}s ({moved / max(elapsed, 1e-9):,.0f} rows/s)")
+    print(f"  database {before / 1e6:,.1f} MB -> {after / 1e6:,.1f} MB; archive {parquet / 1e6:,.1f} MB "
+          f"in {len(app_module.archive.months())} Parquet files")
+
+    # Responses are cached per query; each request below must reach the database or the archive
+    app_module.response_cache.max_entries = 0
+    deep = add_months(month_start(datetime.utcnow()), -args.hot_months - 6)
+    cursor = app_module.encode_cursor(deep, 2 ** 31)
+    cases = {
+        "first page": "/api/interactions?limit=50",
+        "first page +archive": "/api/interactions?limit=50&include_archived=true",
+        "archived page (cursor)": f"/api/interactions?limit=50&include_archived=true&cursor={cursor}",
+        "one HCP +archive": "/api/interactions?limit=500&include_archived=true&hcp_id=1",
+    }
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_module.app), base_url="http://bench") as client:
+        print(f"Listing latency (median of {args.requests}):")
+        for label, path in cases.items():
+            print(f"  {label:<24} {await timed_get(client, path, args.requests) * 1000:>8.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hcps", type=int, default=5_000)
+    parser.add_argument("--interactions", type=int, default=500_000)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--hot-months", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
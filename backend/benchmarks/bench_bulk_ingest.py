@@ -0,0 +1,96 @@
+"""
+Benchmark for bulk interaction ingestion.
+
+Inserts the same synthetic burst three ways: one session/commit/refresh per
+row (the POST /api/interactions path), BulkIngestor with chunked multi-row
+INSERTs, and BulkIngestor with summaries from the fake LLM backend in
+fan-out mode at a simulated provider latency.
+
+Usage (from backend/):
+    python benchmarks/bench_bulk_ingest.py --rows 5000 --chunk-size 500
+    DATABASE_URL=postgresql://... python benchmarks/bench_bulk_ingest.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_bulk_ingest.db")
+
+from database import db_session, engine  # noqa: E402
+from ingest import BatchSummarizer, BulkIngestor, iter_json_array  # noqa: E402
+from llm_gateway import FakeLLMBackend, LLMGateway  # noqa: E402
+from main import validate_bulk_row  # noqa: E402
+from migrate import migrate  # noqa: E402
+from models import HCP, Interaction  # noqa: E402
+
+INTERACTION_TYPES = ["visit", "call", "email", "webinar"]
+
+def payload(rows: int, hcps: int, seed: int = 5):
+    rng = random.Random(seed)
+    return [
+        {"hcp_id": rng.randint(1, hcps), "interaction_type": rng.choice(INTERACTION_TYPES),
+         "notes": f"Visit {i}: discussed efficacy data and patient outcomes.", "products_discussed": "CardioMax"}
+        for i in range(rows)
+    ]
+
+def reset(hcps: int):
+    with engine.begin() as conn:
+        conn.execute(Interaction.__table__.delete())
+        conn.execute(HCP.__table__.delete())
+        conn.execute(HCP.__table__.insert(), [{"id": i, "name": f"HCP {i}"} for i in range(1, hcps + 1)])
+
+async def per_row(items):
+    for item in items:
+        async with db_session() as db:
+            interaction = Interaction(**item)
+            db.add(interaction)
+            await db.commit()
+            await db.refresh(interaction)
+
+async def bulk(items, ingestor, summarize=False):
+    result = await ingestor.ingest(iter_json_array(json.dumps(items)), validate_bulk_row, summarize)
+    assert result["failed"] == 0, result["results"][:3]
+
+def report(label, rows, elapsed):
+    print(f"  {label:<48} {elapsed:>8.2f} s  {rows / elapsed:>10,.0f} rows/s")
+
+async def main(args):
+    items = payload(args.rows, args.hcps)
+    gateway = LLMGateway(FakeLLMBackend(latency=args.latency_ms / 1000), default_concurrency=args.concurrency)
+    print(f"{args.rows:,} interactions on {engine.dialect.name}:")
+
+    migrate()
+    reset(args.hcps)
+    start = time.perf_counter()
+    await per_row(items)
+    report("per-row commit + refresh", args.rows, time.perf_counter() - start)
+
+    reset(args.hcps)
+    ingestor = BulkIngestor(BatchSummarizer(gateway, mode="fanout"), chunk_size=args.chunk_size)
+    start = time.perf_counter()
+    await bulk(items, ingestor)
+    report(f"bulk, chunks of {args.chunk_size}", args.rows, time.perf_counter() - start)
+
+    reset(args.hcps)
+    ingestor = BulkIngestor(BatchSummarizer(gateway, mode="fanout", concurrency=args.concurrency),
+                            chunk_size=args.chunk_size)
+    start = time.perf_counter()
+    await bulk(items, ingestor, summarize=True)
+    report(f"bulk + summaries ({args.latency_ms:.0f} ms LLM, {args.concurrency} in flight)",
+           args.rows, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000)
+    parser.add_argument("--hcps", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(main(args))
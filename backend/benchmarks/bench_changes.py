@@ -0,0 +1,61 @@
+"""
+Change feed: publish/fan-out cost and bytes per write versus a full refetch.
+
+Publishes --writes interaction upserts to a ChangeFeed with --subscribers
+open streams (no database, no HTTP), then times a ?since= replay. The
+baseline is what every client did before after each write: download the
+first page of /api/interactions again (--page rows).
+
+Usage (from backend/):
+    python benchmarks/bench_changes.py --subscribers 500 --writes 5000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from changes import ChangeFeed, encode  # noqa: E402
+
+NOTES = "Discussed efficacy data for hypertension patients and requested the latest clinical study results."
+
+def row(interaction_id: int):
+    now = datetime.utcnow()
+    return {"id": interaction_id, "hcp_id": interaction_id % 500, "interaction_type": "visit", "notes": NOTES,
+            "products_discussed": "CardioMax, HeartGuard", "follow_up_required": False, "followup_date": None,
+            "created_at": now}
+
+async def main(args):
+    feed = ChangeFeed(backlog=args.writes, queue_size=args.writes + 1)
+    subscriptions = [feed.subscribe() for _ in range(args.subscribers)]
+    start_cursor = feed.head
+
+    start = time.perf_counter()
+    for i in range(args.writes):
+        feed.publish({"op": "upsert", "id": i, "hcp_id": i % 500, "row": row(i)})
+    elapsed = time.perf_counter() - start
+    print(f"{args.writes:,} writes to {args.subscribers:,} open streams:")
+    print(f"  publish + fan-out per write          {elapsed / args.writes * 1e6:>10.1f} us")
+
+    start = time.perf_counter()
+    events = feed.since(start_cursor)
+    print(f"  replay all {len(events):,} via ?since=          {(time.perf_counter() - start) * 1e3:>10.2f} ms")
+    assert all(s.queue.qsize() == args.writes for s in subscriptions)
+
+    event_bytes = len(encode({"op": "upsert", "id": 1, "hcp_id": 1, "row": row(1)}))
+    page_bytes = len(json.dumps({"items": [row(i) for i in range(args.page)], "next_cursor": "x" * 40},
+                                default=str))
+    print(f"  bytes per write: change event {event_bytes:,} vs refetching a {args.page}-row page {page_bytes:,} "
+          f"({page_bytes / event_bytes:.0f}x), x{args.subscribers:,} clients")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--writes", type=int, default=5_000)
+    parser.add_argument("--page", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""
+Streaming export throughput and memory (export.py).
+
+Reseeds --interactions interactions (datagen.py --reset), optionally archives
+everything older than --hot-months (partitions.py), then exports the whole
+history, archive included, once per format and compression. It reports:
+
+    rows/s       export speed, encoding and compression included
+    size         bytes written
+    peak RSS     the process's high-water mark after each export; it stays
+                 flat as --interactions grows, since rows are never held
+                 beyond one chunk (one row group for Parquet)
+
+Usage (from backend/):
+    python benchmarks/bench_export.py --interactions 2000000 --hot-months 12
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_export.db")
+os.environ.setdefault("ARCHIVE_DIR", "archive/bench_export")
+
+from archive import InteractionArchive  # noqa: E402
+from database import engine  # noqa: E402
+from export import stream_export  # noqa: E402
+from partitions import PartitionMaintainer  # noqa: E402
+
+CASES = [("csv", "none"), ("csv", "gzip"), ("ndjson", "zstd"), ("parquet", "zstd")]
+
+def seed(args):
+    import datagen
+    datagen.main(argparse.Namespace(hcps=args.hcps, interactions=args.interactions, years=args.years, seed=0,
+                                    chunk_size=100_000, reset=True))
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main(args):
+    shutil.rmtree(os.environ["ARCHIVE_DIR"], ignore_errors=True)
+    seed(args)
+    archive = InteractionArchive.from_env()
+    if args.hot_months:
+        moved = PartitionMaintainer(engine, archive, hot_months=args.hot_months).run_once()
+        print(f"Archived {moved:,} interactions older than {args.hot_months} months")
+
+    print(f"Exporting {args.interactions:,} interactions (peak RSS before: {peak_rss_mb():,.0f} MB)")
+    for format, compression in CASES:
+        start = time.perf_counter()
+        size = sum(len(data) for data in stream_export(engine, format, compression, archive=archive))
+        elapsed = time.perf_counter() - start
+        print(f"  {format:<8} {compression:<5} {args.interactions / elapsed:>10,.0f} rows/s "
+              f"{size / 1e6:>9,.1f} MB   peak RSS {peak_rss_mb():>6,.0f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hcps", type=int, default=5_000)
+    parser.add_argument("--interactions", type=int, default=500_000)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--hot-months", type=int, default=12, help="0 keeps every row in the database")
+    main(parser.parse_args())
@@ -0,0 +1,146 @@
+"""
+Follow-up reminders at scale.
+
+Seeds --interactions interactions (skipped when the table already holds
+that many), --followups of them with open follow-ups spread over the next
+--days days, plus --burst follow-ups falling due within the next --burst-seconds
+(a whole day's reminders compressed into seconds). Then times the
+scheduler's startup load, per-write schedule() cost and the burst dispatch
+(throughput, lag from due time to reminder). The baseline is a poll loop:
+one due query per poll, shown with the partial index and as a full scan.
+
+Usage (from backend/):
+    python benchmarks/bench_followups.py --interactions 1000000 --followups 100000 --burst 30000
+    DATABASE_URL=postgresql://... python benchmarks/bench_followups.py
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_followups.db")
+
+from sqlalchemy import bindparam, func, insert, select, update  # noqa: E402
+
+from database import async_engine, engine  # noqa: E402
+from followups import FollowupScheduler  # noqa: E402
+from migrate import migrate  # noqa: E402
+from models import HCP, FollowupReminder, Interaction  # noqa: E402
+
+# executemany UPDATE of follow-up fields by id
+SET_FOLLOWUP = update(Interaction).where(Interaction.id == bindparam("row_id")).values(
+    follow_up_required=True, followup_date=bindparam("due"))
+
+def seed(interactions: int, followups: int, days: float, batch: int = 50_000):
+    migrate()
+    with engine.connect() as conn:
+        have = conn.execute(select(func.count(Interaction.id))).scalar()
+    if have < interactions:
+        rng = random.Random(5)
+        now = datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(FollowupReminder.__table__.delete())
+            conn.execute(Interaction.__table__.delete())
+            conn.execute(HCP.__table__.delete())
+            conn.execute(insert(HCP), [{"id": i, "name": f"HCP {i}"} for i in range(1, 10_001)])
+        start = time.perf_counter()
+        for offset in range(0, interactions, batch):
+            rows = []
+            for _ in range(min(batch, interactions - offset)):
+                created = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+                rows.append({"hcp_id": rng.randint(1, 10_000), "interaction_type": "visit", "notes": "",
+                             "created_at": created, "updated_at": created,
+                             "follow_up_required": False, "followup_date": None})
+            with engine.begin() as conn:
+                conn.execute(insert(Interaction), rows)
+        print(f"Seeded {interactions:,} interactions in {time.perf_counter() - start:.1f} s")
+
+    # Re-dated on every run so the due times are relative to now
+    rng = random.Random(6)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(FollowupReminder.__table__.delete())
+        conn.execute(update(Interaction).where(Interaction.follow_up_required)
+                     .values(follow_up_required=False, followup_date=None))
+        ids = rng.sample(range(1, interactions + 1), followups)
+        conn.execute(SET_FOLLOWUP, [{"row_id": i, "due": now + timedelta(seconds=rng.uniform(60, days * 86400))}
+                                    for i in ids])
+
+def set_burst(burst: int, interactions: int, seconds: float) -> datetime:
+    """Moves `burst` follow-ups to fall due within the next `seconds`"""
+    rng = random.Random(8)
+    now = datetime.utcnow() + timedelta(seconds=1)
+    with engine.begin() as conn:
+        conn.execute(SET_FOLLOWUP, [{"row_id": i, "due": now + timedelta(seconds=rng.uniform(0, seconds))}
+                                    for i in rng.sample(range(1, interactions + 1), burst)])
+    return now
+
+def time_poll(label: str, condition):
+    stmt = select(func.count()).where(condition, Interaction.followup_date <= datetime.utcnow() + timedelta(days=1))
+    with engine.connect() as conn:
+        conn.execute(stmt)
+        start = time.perf_counter()
+        for _ in range(5):
+            conn.execute(stmt).scalar()
+    elapsed = (time.perf_counter() - start) / 5
+    print(f"  {label:<44} {elapsed * 1e3:>8.2f} ms/poll, {elapsed * 86400:>8.0f} s/day at one poll per second")
+
+async def main(args):
+    seed(args.interactions, args.followups, args.days)
+    print(f"{args.interactions:,} interactions, {args.followups:,} follow-ups over {args.days:g} days "
+          f"on {engine.dialect.name}")
+
+    time_poll("poll: due query on the partial index", Interaction.follow_up_required)
+    # Wrapped so it no longer matches the index predicate: the scan a poller without the index pays
+    time_poll("poll: due query as a full scan", func.coalesce(Interaction.follow_up_required, False))
+
+    set_burst(args.burst, args.interactions, args.burst_seconds)
+    lags = []
+    sent = []
+
+    def on_due(reminders):
+        now = datetime.utcnow()
+        sent.extend(reminders)
+        lags.extend((now - r["followup_date"]).total_seconds() for r in reminders)
+
+    scheduler = FollowupScheduler(on_due=on_due, window=args.window_hours * 3600, catchup=0)
+    start = time.perf_counter()
+    await scheduler.start()
+    print(f"  {'scheduler start (first window loaded)':<44} {(time.perf_counter() - start) * 1e3:>8.1f} ms, "
+          f"{len(scheduler):,} in heap")
+
+    rng = random.Random(4)
+    far = time.time() + args.window_hours * 3600 - 60
+    start = time.perf_counter()
+    for i in range(10_000):
+        scheduler.schedule(args.interactions + 1 + i, 1, far - rng.uniform(0, 3600))
+    print(f"  {'schedule() per write':<44} {(time.perf_counter() - start) / 10_000 * 1e6:>8.2f} us")
+    for i in range(10_000):
+        scheduler.cancel(args.interactions + 1 + i)
+
+    start = time.perf_counter()
+    while len(sent) < args.burst and time.perf_counter() - start < args.burst_seconds + 30:
+        await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    await scheduler.stop()
+    if lags:
+        lags.sort()
+        print(f"  burst: {len(sent):,} reminders in {elapsed:.1f} s; lag p50 "
+              f"{statistics.median(lags) * 1e3:.0f} ms, p99 {lags[int(len(lags) * 0.99) - 1] * 1e3:.0f} ms")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interactions", type=int, default=1_000_000)
+    parser.add_argument("--followups", type=int, default=100_000)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--burst", type=int, default=30_000)
+    parser.add_argument("--burst-seconds", type=float, default=10)
+    parser.add_argument("--window-hours", type=float, default=6)
+    asyncio.run(main(parser.parse_args()))
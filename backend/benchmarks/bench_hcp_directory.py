@@ -0,0 +1,76 @@
+"""
+Cold-build time, memory footprint and resolve latency of the in-memory HCP
+directory at 500k HCPs.
+
+Names are built from random syllables so the token vocabulary grows the way
+a real territory's does, rather than repeating a handful of surnames.
+
+Usage (from backend/):
+    python benchmarks/bench_hcp_directory.py --hcps 500000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from hcp_directory import HCPDirectory  # noqa: E402
+
+SYLLABLES = ["an", "bel", "chen", "da", "el", "fer", "gar", "han", "is", "jo", "ka", "li", "mar", "no",
+             "ol", "pa", "qui", "ro", "sa", "ta", "u", "vi", "wil", "xi", "ya", "zo", "son", "ton", "berg", "ski"]
+
+def make_word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+def generate(count: int, seed: int = 11):
+    rng = random.Random(seed)
+    first_names = [make_word(rng) for _ in range(5_000)]
+    last_names = [make_word(rng) for _ in range(60_000)]
+    for i in range(1, count + 1):
+        yield i, f"{rng.choice(first_names)} {rng.choice(last_names)}"
+
+def typo(word, rng):
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hcps", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args()
+
+    rows = list(generate(args.hcps))
+
+    start = time.perf_counter()
+    directory = HCPDirectory()
+    directory.build(rows)
+    build = time.perf_counter() - start
+    print(f"Cold build: {len(directory):,} HCPs in {build:.2f}s ({build / len(directory) * 1e6:.1f} µs/HCP)")
+
+    tracemalloc.start()
+    measured = HCPDirectory()
+    measured.build(rows)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Retained memory: {retained / 1e6:.1f} MB ({retained / len(measured):.0f} B/HCP), "
+          f"{len(measured._ids_by_token):,} distinct tokens")
+    del measured
+
+    rng = random.Random(3)
+    sample = [rng.choice(rows)[1] for _ in range(args.queries)]
+    scenarios = {
+        "exact full name": sample,
+        "Dr. + last name": [f"Dr. {name.split()[1]}" for name in sample],
+        "transposed typo": [f"{name.split()[0]} {typo(name.split()[1], rng)}" for name in sample],
+        "unknown name": [f"Zzqx{i}" for i in range(args.queries)],
+    }
+    for label, queries in scenarios.items():
+        start = time.perf_counter()
+        for query in queries:
+            directory.resolve(query)
+        per_query = (time.perf_counter() - start) / len(queries)
+        print(f"  {label:<20} {per_query * 1e6:>9.1f} µs/resolve")
@@ -0,0 +1,108 @@
+"""
+Instrumentation overhead: request middleware, SQL statement hooks and the timed() decorator.
+
+Each is measured with and without the instrumentation on the smallest unit
+it wraps, so the difference is the whole per-call cost:
+
+    middleware  a trivial FastAPI endpoint called in-process through ASGI
+    sql hooks   SELECT 1 on an in-memory SQLite engine
+    timed()     an async function that returns immediately
+
+Usage (from backend/):
+    python benchmarks/bench_instrumentation.py --requests 2000 --queries 20000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from instrumentation import InstrumentationMiddleware, instrument_engine, timed  # noqa: E402
+from metrics import Histogram  # noqa: E402
+
+def build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    if instrumented:
+        app.add_middleware(InstrumentationMiddleware)
+    return app
+
+async def bench_requests(requests: int, rounds: int):
+    # Timings are noisy at this scale: alternate the two variants and keep each one's best round
+    results = {}
+    clients = {label: httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app(instrumented)),
+                                        base_url="http://bench")
+               for label, instrumented in (("without", False), ("with middleware", True))}
+    for _ in range(rounds):
+        for label, client in clients.items():
+            start = time.perf_counter()
+            for i in range(requests):
+                await client.get(f"/api/items/{i}")
+            elapsed = (time.perf_counter() - start) / requests
+            results[label] = min(results.get(label, elapsed), elapsed)
+    for client in clients.values():
+        await client.aclose()
+    print(f"{requests:,} requests:")
+    for label, elapsed in results.items():
+        print(f"  {label:<22} {elapsed * 1e6:>8.1f} us/request")
+    print(f"  overhead               {(results['with middleware'] - results['without']) * 1e6:>8.1f} us/request")
+
+def bench_queries(queries: int, rounds: int):
+    results = {}
+    engines = {"without": create_engine("sqlite://"), "with hooks": create_engine("sqlite://")}
+    instrument_engine(engines["with hooks"])
+    statement = text("SELECT 1")
+    for _ in range(rounds):
+        for label, engine in engines.items():
+            with engine.connect() as conn:
+                conn.execute(statement)
+                start = time.perf_counter()
+                for _ in range(queries):
+                    conn.execute(statement).scalar()
+                elapsed = (time.perf_counter() - start) / queries
+            results[label] = min(results.get(label, elapsed), elapsed)
+    for engine in engines.values():
+        engine.dispose()
+    print(f"{queries:,} statements:")
+    for label, elapsed in results.items():
+        print(f"  {label:<22} {elapsed * 1e6:>8.1f} us/statement")
+    print(f"  overhead               {(results['with hooks'] - results['without']) * 1e6:>8.1f} us/statement")
+
+async def bench_decorator(calls: int):
+    histogram = Histogram("bench_timed_seconds", "timed() benchmark", ("name", "outcome"))
+
+    async def noop():
+        return None
+    results = {}
+    for label, fn in (("without", noop), ("with timed()", timed(histogram, name="noop")(noop))):
+        start = time.perf_counter()
+        for _ in range(calls):
+            await fn()
+        results[label] = (time.perf_counter() - start) / calls
+    print(f"{calls:,} tool/node calls:")
+    for label, elapsed in results.items():
+        print(f"  {label:<22} {elapsed * 1e6:>8.2f} us/call")
+    print(f"  overhead               {(results['with timed()'] - results['without']) * 1e6:>8.2f} us/call")
+
+async def main(args):
+    await bench_requests(args.requests, args.rounds)
+    bench_queries(args.queries, args.rounds)
+    await bench_decorator(args.queries)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
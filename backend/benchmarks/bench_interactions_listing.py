@@ -0,0 +1,123 @@
+"""
+Benchmark for GET /api/interactions against a large local SQLite stand-in.
+
+Compares the old "load every ORM row" listing with a keyset page and the
+NDJSON stream, reporting wall time and peak Python memory for each.
+
+Usage (from backend/):
+    python benchmarks/bench_interactions_listing.py --rows 1000000
+    DATABASE_URL=postgresql://... python benchmarks/bench_interactions_listing.py
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_interactions.db")
+
+from database import SessionLocal, engine  # noqa: E402
+from main import build_interaction_listing, encode_cursor, parse_fields, stream_interactions_ndjson  # noqa: E402
+from migrate import migrate  # noqa: E402
+from models import HCP, Interaction  # noqa: E402
+
+INTERACTION_TYPES = ["visit", "call", "email", "webinar"]
+PRODUCTS = ["CardioMax", "HeartGuard", "GlucoControl", "OncoSafe", "NeuroPlus", "BrainCare"]
+
+def seed(rows: int, hcps: int = 1000, batch: int = 50_000):
+    db = SessionLocal()
+    try:
+        existing = db.query(Interaction).count()
+    finally:
+        db.close()
+    if existing >= rows:
+        print(f"Using existing {existing:,} interactions")
+        return
+
+    print(f"Seeding {rows:,} interactions...")
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(HCP.__table__.delete())
+        conn.execute(Interaction.__table__.delete())
+        conn.execute(HCP.__table__.insert(), [
+            {"id": i, "name": f"HCP {i}", "specialty": "Cardiology", "hospital": "General",
+             "email": f"hcp{i}@example.com", "phone": "+1-555-0000", "created_at": now}
+            for i in range(1, hcps + 1)
+        ])
+        for start in range(0, rows, batch):
+            conn.execute(Interaction.__table__.insert(), [
+                {
+                    "hcp_id": rng.randint(1, hcps),
+                    "interaction_type": rng.choice(INTERACTION_TYPES),
+                    "notes": "Discussed efficacy data and patient outcomes. " * 3,
+                    "products_discussed": ", ".join(rng.sample(PRODUCTS, 2)),
+                    "follow_up_required": rng.random() < 0.2,
+                    "created_at": now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+                    "updated_at": now,
+                }
+                for _ in range(start, min(start + batch, rows))
+            ])
+
+def measure(label: str, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<32} {count:>10,} rows  {elapsed * 1000:>10.1f} ms  peak {peak / 1e6:>8.1f} MB")
+
+def legacy_full_listing():
+    db = SessionLocal()
+    try:
+        rows = db.query(Interaction).order_by(Interaction.created_at.desc()).all()
+        return len([{c.name: getattr(r, c.name) for c in Interaction.__table__.columns} for r in rows])
+    finally:
+        db.close()
+
+def keyset_pages(pages: int, limit: int = 50):
+    def run():
+        db = SessionLocal()
+        try:
+            cursor, total = None, 0
+            for _ in range(pages):
+                stmt = build_interaction_listing(parse_fields(None), cursor=cursor).limit(limit)
+                rows = db.execute(stmt).mappings().all()
+                if not rows:
+                    break
+                total += len(rows)
+                cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+            return total
+        finally:
+            db.close()
+    return run
+
+def ndjson_stream():
+    async def consume():
+        lines = 0
+        async for chunk in stream_interactions_ndjson(build_interaction_listing(parse_fields(None))):
+            lines += chunk.count("\n")
+        return lines
+    return asyncio.run(consume())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--skip-legacy", action="store_true", help="Skip the full-table ORM listing")
+    args = parser.parse_args()
+
+    migrate()
+    seed(args.rows)
+
+    measure("keyset first page", keyset_pages(1))
+    measure(f"keyset {args.pages} pages", keyset_pages(args.pages))
+    measure("ndjson stream (all rows)", ndjson_stream)
+    if not args.skip_legacy:
+        measure("legacy .all() listing", legacy_full_listing)
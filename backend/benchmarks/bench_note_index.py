@@ -0,0 +1,96 @@
+"""
+Semantic note search: cold build, appends and top-k latency (note_index.py).
+
+Reseeds --interactions interactions (datagen.py --reset) and an empty index
+on every run, then reports:
+
+    build        first sync: every note embedded and appended, rows/s and file size
+    append       one interaction re-embedded per write (the per-save cost), median
+    search       top --k over the whole index, median over --requests:
+                   one query
+                   --batch queries in one pass, per query
+                   one HCP's notes only
+    restart      sync on an index that is already current
+
+Usage (from backend/):
+    python benchmarks/bench_note_index.py --interactions 1000000 --batch 32
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_note_index.db")
+os.environ.setdefault("NOTE_INDEX_DIR", "note_index/bench")
+
+from database import engine  # noqa: E402
+from note_index import NoteIndex  # noqa: E402
+
+QUERIES = [
+    "cost concerns for uninsured patients", "wants more safety data", "side effect management",
+    "dosing in elderly patients", "requested samples", "interested in clinical trial results",
+    "prior authorization problems", "asked about drug interactions",
+]
+
+def seed(args):
+    import datagen
+    datagen.main(argparse.Namespace(hcps=args.hcps, interactions=args.interactions, years=args.years, seed=0,
+                                    chunk_size=100_000, reset=True))
+
+def median_ms(fn, requests: int) -> float:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def main(args):
+    shutil.rmtree(os.environ["NOTE_INDEX_DIR"], ignore_errors=True)
+    seed(args)
+    index = NoteIndex(engine, os.environ["NOTE_INDEX_DIR"], batch_size=args.batch_size)
+
+    start = time.perf_counter()
+    store = index.open()
+    embedded = index.sync(store)
+    elapsed = time.perf_counter() - start
+    index.store = store
+    size = sum(os.path.getsize(os.path.join(index.directory, name)) for name in os.listdir(index.directory))
+    print(f"Built the index for {embedded:,} interactions with {index.embedder.name} in {elapsed:.1f}s "
+          f"({embedded / max(elapsed, 1e-9):,.0f} rows/s); {size / 1e6:,.1f} MB on disk")
+
+    note = "Discussed efficacy data. Raised cost concerns for uninsured patients."
+    append = median_ms(lambda: index.write([(1, 1, note)]), args.requests)
+    print(f"Append one interaction: {append:.2f} ms")
+
+    queries = (QUERIES * (args.batch // len(QUERIES) + 1))[:args.batch]
+    print(f"Top-{args.k} search over {len(store):,} rows (median of {args.requests}):")
+    cases = {
+        "one query": lambda: index.search(QUERIES[:1], args.k),
+        f"batch of {args.batch} (per query)": lambda: index.search(queries, args.k),
+        "one HCP": lambda: index.search(QUERIES[:1], args.k, hcp_id=1),
+    }
+    for label, fn in cases.items():
+        ms = median_ms(fn, args.requests)
+        if label.startswith("batch"):
+            ms /= args.batch
+        print(f"  {label:<28} {ms:>8.2f} ms")
+
+    start = time.perf_counter()
+    index.sync(store)
+    print(f"Restart sync on a current index: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hcps", type=int, default=5_000)
+    parser.add_argument("--interactions", type=int, default=200_000)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--batch-size", type=int, default=256, help="Notes embedded per call")
+    parser.add_argument("--batch", type=int, default=16, help="Queries per batched search")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=20)
+    main(parser.parse_args())
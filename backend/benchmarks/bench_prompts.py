@@ -0,0 +1,193 @@
+"""
+Prompt tokens and per-call latency: inline f-string prompts vs the prompt registry.
+
+Replays a recorded request corpus (JSONL, one insight or summary request per
+line) through both prompt builders. The legacy builders are the old inline
+f-strings: instructions and data in one user message, notes cut at 100
+characters. The backend simulates provider prefix caching: leading messages
+it has seen before are free, every other prompt token costs --token-us on
+top of --base-ms. With --record a synthetic corpus is written first.
+
+Usage (from backend/):
+    python benchmarks/bench_prompts.py --record corpus.jsonl --requests 500
+    python benchmarks/bench_prompts.py --corpus corpus.jsonl --token-us 150
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from analytics import HCPEngagement, parse_products  # noqa: E402
+from ingest import summary_messages  # noqa: E402
+from llm_gateway import LLMGateway, make_completion  # noqa: E402
+from prompts import render  # noqa: E402
+from tokens import count_message_tokens, truncate_tokens  # noqa: E402
+
+INSIGHT_SNIPPET_TOKENS = 32
+INSIGHT_SNIPPETS = 5
+PRODUCTS = ["CardioMax", "GlucoControl", "NeuroCalm", "OncoShield", None]
+PHRASES = [
+    "Discussed efficacy data from the phase III trial", "raised concerns about reimbursement",
+    "asked for patient education material", "interested in the new dosing schedule",
+    "mentioned two patients with side effects", "wants a follow-up with the medical liaison",
+    "compared us with the competitor's pricing", "agreed to a lunch-and-learn next month",
+]
+
+# ---------- legacy builders (inline f-strings, before the registry) ----------
+
+def legacy_insights(interactions):
+    interaction_text = "\n".join([
+        f"- {i['interaction_type']}: {i['notes'][:100]}... (Products: {i['products_discussed']})"
+        for i in interactions
+    ])
+    prompt = f"""Analyze these HCP interactions and provide insights:
+
+{interaction_text}
+
+Provide:
+1. Engagement level (High/Medium/Low)
+2. Key interests and concerns
+3. Recommended next steps
+4. Products to focus on"""
+    return [{"role": "user", "content": prompt}]
+
+def legacy_summary(interaction_type, notes, products):
+    prompt = f"""Summarize this HCP interaction and extract key entities:
+
+Interaction Type: {interaction_type}
+Notes: {notes}
+Products: {products}
+
+Provide a concise summary (max 2 sentences) and list key points."""
+    return [{"role": "user", "content": prompt}]
+
+# ---------- registry builders (same code as main.py / ingest.py) ----------
+
+def registry_insights(interactions):
+    engagement = HCPEngagement(0)
+    now = time.time()
+    for age, i in enumerate(interactions):
+        engagement.add(i["interaction_type"], now - age * 86400, parse_products(i["products_discussed"]))
+    interaction_text = "\n".join(
+        f"- {i['interaction_type']}: {truncate_tokens(i['notes'], INSIGHT_SNIPPET_TOKENS)}"
+        + (f" (Products: {i['products_discussed']})" if i["products_discussed"] else "")
+        for i in interactions[:INSIGHT_SNIPPETS]
+    )
+    return render("hcp_insights", stats=engagement.describe(now), days=30, interactions=interaction_text)
+
+def registry_summary(interaction_type, notes, products):
+    return summary_messages(interaction_type, notes, products)
+
+BUILDERS = {
+    "legacy": {"insights": legacy_insights, "summary": legacy_summary},
+    "registry": {"insights": registry_insights, "summary": registry_summary},
+}
+
+def build(builders, request):
+    if request["kind"] == "insights":
+        return builders["insights"](request["interactions"])
+    return builders["summary"](request["interaction_type"], request["notes"], request["products"])
+
+# ---------- corpus ----------
+
+def interaction(rng):
+    return {
+        "interaction_type": rng.choice(["visit", "call", "email", "webinar"]),
+        "notes": ". ".join(rng.sample(PHRASES, rng.randint(1, 5))) + ".",
+        "products_discussed": rng.choice(PRODUCTS),
+    }
+
+def synthetic_corpus(requests, seed=11):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(requests):
+        if rng.random() < 0.5:
+            corpus.append({"kind": "insights", "interactions": [interaction(rng) for _ in range(rng.randint(3, 10))]})
+        else:
+            row = interaction(rng)
+            corpus.append({"kind": "summary", "interaction_type": row["interaction_type"],
+                           "notes": row["notes"], "products": row["products_discussed"]})
+    return corpus
+
+# ---------- prefix-caching backend ----------
+
+class PrefixCachingBackend:
+    """Charges latency only for prompt tokens after the longest previously seen run of leading messages"""
+
+    name = "prefix-cache"
+
+    def __init__(self, base: float, per_token: float):
+        self.base = base
+        self.per_token = per_token
+        self._seen = set()
+
+    async def create(self, model, messages, **kwargs):
+        cached = 0
+        digest = hashlib.sha256(model.encode())
+        prefix_cached = True
+        for message in messages:
+            digest.update(json.dumps(message, sort_keys=True).encode())
+            key = digest.hexdigest()
+            if prefix_cached and key in self._seen:
+                cached += count_message_tokens([message])
+            else:
+                prefix_cached = False
+                self._seen.add(key)
+        total = count_message_tokens(messages)
+        await asyncio.sleep(self.base + self.per_token * (total - cached))
+        completion = make_completion(model, "ok", total, 1)
+        completion.usage.prompt_tokens_details = SimpleNamespace(cached_tokens=cached)
+        return completion
+
+    def is_retryable(self, exc):
+        return False
+
+async def run(label, corpus, args):
+    builders = BUILDERS[label]
+    build(builders, corpus[0])  # loads the tokenizer outside the timing
+    start = time.perf_counter()
+    prompts = [build(builders, request) for request in corpus]
+    render_us = (time.perf_counter() - start) / len(corpus) * 1e6
+
+    backend = PrefixCachingBackend(args.base_ms / 1000, args.token_us / 1e6)
+    gateway = LLMGateway(backend)
+    tokens = cached = 0
+    start = time.perf_counter()
+    for messages in prompts:
+        response = await gateway.chat("llama-3.3-70b-versatile", messages)
+        tokens += response.usage.prompt_tokens
+        cached += response.usage.prompt_tokens_details.cached_tokens
+    latency_ms = (time.perf_counter() - start) / len(corpus) * 1000
+    n = len(corpus)
+    print(f"{label:<10} {tokens / n:>10.1f} {(tokens - cached) / n:>10.1f} {render_us:>10.1f} {latency_ms:>12.2f}")
+
+async def main(args):
+    if args.record:
+        with open(args.record, "w") as f:
+            for request in synthetic_corpus(args.requests):
+                f.write(json.dumps(request) + "\n")
+        print(f"Recorded {args.requests} requests to {args.record}")
+    path = args.corpus or args.record
+    corpus = [json.loads(line) for line in open(path)] if path else synthetic_corpus(args.requests)
+
+    print(f"{len(corpus)} requests, {args.base_ms:.0f} ms + {args.token_us:.0f} us per uncached prompt token")
+    print(f"{'prompts':<10} {'tokens':>10} {'uncached':>10} {'render us':>10} {'latency ms':>12}")
+    for label in BUILDERS:
+        await run(label, corpus, args)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Recorded JSONL corpus to replay")
+    parser.add_argument("--record", help="Write a synthetic corpus to this path first")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--base-ms", type=float, default=2)
+    parser.add_argument("--token-us", type=float, default=100, help="Provider time per uncached prompt token")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,79 @@
+"""
+Read cache: GET /api/hcps and /api/interactions as a miss, a cached body and a 304.
+
+Seeds --hcps HCPs and --interactions interactions (skipped when present),
+then calls the endpoints in-process through the ASGI app. "miss" bumps the
+resource version before every request, which is what every read cost before
+the cache. Also counts database sessions opened per request.
+
+Usage (from backend/):
+    python benchmarks/bench_response_cache.py --hcps 2000 --requests 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_response_cache.db")
+os.environ.setdefault("LLM_BACKEND", "fake")
+# One process: nothing else writes, so cached bodies never need to expire
+os.environ.setdefault("RESPONSE_CACHE_TTL_SECONDS", "0")
+
+import httpx  # noqa: E402
+from sqlalchemy import event, func, insert, select  # noqa: E402
+
+from database import async_engine, engine  # noqa: E402
+from main import app, response_cache  # noqa: E402
+from migrate import migrate  # noqa: E402
+from models import HCP, Interaction  # noqa: E402
+
+def seed(hcps: int, interactions: int):
+    with engine.connect() as conn:
+        if conn.execute(select(func.count(HCP.id))).scalar() >= hcps:
+            return
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(HCP), [{"name": f"Dr {i}", "specialty": "Cardiology", "hospital": f"Hospital {i % 40}",
+                                    "email": f"hcp{i}@example.com", "phone": "+1-555-0100"} for i in range(hcps)])
+        conn.execute(insert(Interaction), [
+            {"hcp_id": i % hcps + 1, "interaction_type": "visit", "notes": "Discussed efficacy data.",
+             "created_at": now - timedelta(minutes=i), "updated_at": now} for i in range(interactions)])
+
+async def main(args):
+    migrate()
+    seed(args.hcps, args.interactions)
+    checkouts = 0
+
+    def counted(*_):
+        nonlocal checkouts
+        checkouts += 1
+    event.listen(async_engine.sync_engine, "checkout", counted)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for path, resource in (("/api/hcps", "hcps"), ("/api/interactions?limit=50", "interactions")):
+            print(f"GET {path}:")
+            for label, conditional, bump in (("miss (no cache)", False, True), ("cached body", False, False),
+                                             ("If-None-Match -> 304", True, False)):
+                headers = {"If-None-Match": (await client.get(path)).headers["etag"]} if conditional else {}
+                checkouts = 0
+                start = time.perf_counter()
+                for _ in range(args.requests):
+                    if bump:
+                        response_cache.bump(resource)
+                    response = await client.get(path, headers=headers)
+                elapsed = (time.perf_counter() - start) / args.requests
+                print(f"  {label:<22} {elapsed * 1e3:>8.3f} ms/request, {response.status_code}, "
+                      f"{len(response.content):>8,} bytes, "
+                      f"{checkouts / args.requests:.1f} DB connections/request")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hcps", type=int, default=2_000)
+    parser.add_argument("--interactions", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
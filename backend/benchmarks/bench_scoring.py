@@ -0,0 +1,103 @@
+"""
+Territory scoring job at scale.
+
+Seeds --hcps HCPs and --interactions interactions (skipped when the tables
+already hold that many), then runs scoring.run_scoring end to end with the
+fake LLM backend at --latency-ms per review. For comparison the score stage
+is also run as a per-HCP Python loop over the same arrays, on a sample of
+HCPs, and extrapolated.
+
+Usage (from backend/):
+    python benchmarks/bench_scoring.py --hcps 20000 --interactions 1000000
+    DATABASE_URL=postgresql://... python benchmarks/bench_scoring.py
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_scoring.db")
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from database import engine  # noqa: E402
+from llm_gateway import FakeLLMBackend, LLMGateway  # noqa: E402
+from migrate import migrate  # noqa: E402
+from models import HCP, Interaction  # noqa: E402
+from scoring import DAY, load_columns, run_scoring  # noqa: E402
+
+TYPES = ["visit", "call", "email", "webinar"]
+
+def seed(hcps: int, interactions: int, batch: int = 50_000):
+    migrate()
+    with engine.connect() as conn:
+        have = conn.execute(select(func.count(Interaction.id))).scalar()
+    if have >= interactions:
+        return
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(Interaction.__table__.delete())
+        conn.execute(HCP.__table__.delete())
+        conn.execute(insert(HCP), [{"id": i, "name": f"HCP {i}"} for i in range(1, hcps + 1)])
+    start = time.perf_counter()
+    for offset in range(0, interactions, batch):
+        rows = []
+        for _ in range(min(batch, interactions - offset)):
+            created = now - timedelta(seconds=rng.randint(0, 2 * 365 * 86400))
+            follow_up = rng.random() < 0.1
+            rows.append({
+                "hcp_id": rng.randint(1, hcps), "interaction_type": rng.choice(TYPES), "notes": "",
+                "created_at": created, "updated_at": created, "follow_up_required": follow_up,
+                "followup_date": created + timedelta(days=rng.randint(1, 60)) if follow_up else None,
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(Interaction), rows)
+    print(f"Seeded {interactions:,} interactions in {time.perf_counter() - start:.1f} s")
+
+def loop_score(columns, now, sample, half_life_days=30.0, cooling_days=45.0):
+    """Per-HCP scoring in plain Python: what one-query-per-HCP code ends up doing"""
+    by_hcp = {}
+    for i, position in enumerate(columns.hcp_index.tolist()):
+        by_hcp.setdefault(position, []).append(i)
+    start = time.perf_counter()
+    for position in sample:
+        rows = by_hcp.get(position, [])
+        last = max((columns.created_at[i] for i in rows), default=-math.inf)
+        decayed = sum(columns.weight[i] * 2 ** (-max(now - columns.created_at[i], 0) / DAY / half_life_days)
+                      for i in rows)
+        overdue = sum(1 for i in rows if columns.follow_up[i] and columns.followup_date[i] < now
+                      and last < columns.followup_date[i])
+        _ = (decayed, overdue > 0 or (rows and (now - last) / DAY > cooling_days))
+    return time.perf_counter() - start
+
+async def main(args):
+    seed(args.hcps, args.interactions)
+    gateway = LLMGateway(FakeLLMBackend(latency=args.latency_ms / 1000))
+    timings = await run_scoring(engine, gateway, "llama-3.3-70b-versatile", top=args.top,
+                                concurrency=args.concurrency)
+    print(f"{timings['hcps']:,} HCPs, {timings['interactions']:,} interactions on {engine.dialect.name}, "
+          f"{timings['flagged']:,} flagged, {timings['reviewed']} reviewed")
+    for stage in ("load", "score", "review", "write"):
+        print(f"  {stage:<8} {timings[stage]:>8.2f} s")
+
+    columns = load_columns(engine)
+    sample = random.Random(1).sample(range(len(columns.hcp_ids)), min(2_000, len(columns.hcp_ids)))
+    elapsed = loop_score(columns, time.time(), sample)
+    print(f"  per-HCP Python loop: {elapsed / len(sample) * 1e3:.2f} ms/HCP, "
+          f"~{elapsed / len(sample) * len(columns.hcp_ids):.1f} s for all (vs {timings['score']:.2f} s vectorized)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hcps", type=int, default=20_000)
+    parser.add_argument("--interactions", type=int, default=1_000_000)
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""
+Response serialization for large lists: ORM + jsonable_encoder versus response models and orjson.
+
+Loads --rows interactions from a seeded SQLite file, as ORM objects and as
+column rows, and encodes them the three ways the API has done it:
+
+    before        ORM objects -> jsonable_encoder -> json.dumps (FastAPI default, no response_model)
+    response_model ORM objects -> InteractionOut (from_attributes) -> orjson (create/update endpoints)
+    columns       column rows -> dicts -> orjson (cached list endpoints)
+
+Usage (from backend/):
+    python benchmarks/bench_serialization.py --rows 10000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_serialization.db")
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from database import SessionLocal, engine  # noqa: E402
+from encoding import dumps  # noqa: E402
+from main import INTERACTION_FIELDS, InteractionOut  # noqa: E402
+from migrate import migrate  # noqa: E402
+from models import Interaction  # noqa: E402
+
+def seed(rows: int):
+    with engine.connect() as conn:
+        if conn.execute(select(func.count(Interaction.id))).scalar() >= rows:
+            return
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Interaction), [
+            {"hcp_id": i % 500 + 1, "interaction_type": "visit",
+             "notes": "Discussed efficacy data for hypertension patients; requested the latest study results.",
+             "products_discussed": "CardioMax, HeartGuard", "follow_up_required": i % 7 == 0,
+             "followup_date": now + timedelta(days=i % 30) if i % 7 == 0 else None,
+             "created_at": now - timedelta(minutes=i), "updated_at": now} for i in range(rows)])
+
+def timed(label, fn, rows, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:<40} {elapsed * 1e3:>8.1f} ms  {rows / elapsed:>12,.0f} rows/s")
+    return result
+
+def main(args):
+    migrate()
+    seed(args.rows)
+    print(f"{args.rows:,} interactions:")
+    columns = [getattr(Interaction, name) for name in INTERACTION_FIELDS]
+    with SessionLocal() as session:
+        orm_rows = timed("load ORM objects", lambda: (session.expunge_all(), session.execute(
+            select(Interaction).limit(args.rows)).scalars().all())[1], args.rows, args.repeat)
+        dict_rows = timed("load columns as dicts", lambda: [dict(row) for row in session.execute(
+            select(*columns).limit(args.rows)).mappings()], args.rows, args.repeat)
+
+    adapter = TypeAdapter(List[InteractionOut])
+    before = timed("before: jsonable_encoder + json.dumps",
+                   lambda: json.dumps(jsonable_encoder(orm_rows)).encode(), args.rows, args.repeat)
+    timed("response_model + orjson",
+          lambda: dumps(adapter.dump_python(adapter.validate_python(orm_rows), mode="json")), args.rows, args.repeat)
+    after = timed("column dicts + orjson", lambda: dumps(dict_rows), args.rows, args.repeat)
+    assert json.loads(before) == json.loads(after)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
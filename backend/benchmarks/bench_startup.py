@@ -0,0 +1,85 @@
+"""
+Cold start: import time, lifespan startup and time to the first responses, in fresh interpreters.
+
+Seeds a SQLite file with --hcps HCPs and --interactions interactions
+(datagen.py, skipped when present), then starts --runs new Python processes.
+Each one imports main, runs the app's startup, and sends GET /api/hcps and a
+first chat turn (LLM_BACKEND=fake) in-process. Reported as medians:
+
+    process + imports   interpreter start until `import main` returns
+    startup             lifespan startup (schema check, index loads, services)
+    first GET /api/hcps
+    first chat turn     includes building the agent if the startup pre-build
+                        has not finished yet
+    ready to serve      process start until the first GET has been answered
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py --runs 5 --hcps 20000 --interactions 200000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_startup.db")
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+CHILD = """
+import asyncio, json, sys, time
+started = time.time()
+import httpx
+import main
+
+async def run():
+    imported = time.time()
+    lifespan = main.app.router.lifespan_context(main.app)
+    await lifespan.__aenter__()
+    ready = time.time()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+        assert (await client.get("/api/hcps")).status_code == 200
+        first_get = time.time()
+        response = await client.post("/api/chat/interact", json={"message": "Thanks, that's all for today"})
+        assert response.status_code == 200 and "Error" not in response.json()["response"], response.text
+        first_chat = time.time()
+    await lifespan.__aexit__(None, None, None)
+    print(json.dumps({"started": started, "imported": imported, "ready": ready, "first_get": first_get,
+                      "first_chat": first_chat}))
+
+asyncio.run(run())
+"""
+
+def seed(hcps: int, interactions: int):
+    import datagen
+    datagen.main(argparse.Namespace(hcps=hcps, interactions=interactions, years=3, seed=0, chunk_size=100_000,
+                                    reset=False))
+
+def main(args):
+    seed(args.hcps, args.interactions)
+    samples = {"process + imports": [], "startup": [], "first GET /api/hcps": [], "first chat turn": [],
+               "ready to serve": []}
+    for _ in range(args.runs):
+        spawned = time.time()
+        output = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND, capture_output=True, text=True,
+                                check=True).stdout
+        t = json.loads(output.strip().splitlines()[-1])
+        samples["process + imports"].append(t["imported"] - spawned)
+        samples["startup"].append(t["ready"] - t["imported"])
+        samples["first GET /api/hcps"].append(t["first_get"] - t["ready"])
+        samples["first chat turn"].append(t["first_chat"] - t["first_get"])
+        samples["ready to serve"].append(t["first_get"] - spawned)
+    print(f"{args.runs} cold starts, {args.hcps:,} HCPs / {args.interactions:,} interactions (median):")
+    for label, values in samples.items():
+        print(f"  {label:<22} {statistics.median(values) * 1000:>8.0f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--hcps", type=int, default=20_000)
+    parser.add_argument("--interactions", type=int, default=200_000)
+    main(parser.parse_args())
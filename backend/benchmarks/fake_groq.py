@@ -0,0 +1,99 @@
+"""
+Deterministic stand-in for the Groq backend that answers with tool calls, for offline benchmarks.
+
+Unlike LLM_BACKEND=fake, which always answers with text, this backend scripts
+what the agent's models would do with the CRM tools it is offered, chosen by
+keywords in the user's message:
+
+    "met/visited/called Dr. <Name> ..."   log_interaction(hcp_name=<Name>, ...)
+    "find <query>" / "search for <query>" search_hcp(query=<query>)
+    "insights ... HCP <id>"               generate_insights(hcp_id=<id>)
+    "analyze ..."                         escalate (router model only)
+
+Anything else, and every turn after a tool result, gets a text answer. Each
+call sleeps its model's latency plus up to `jitter` seconds (seeded), so runs
+are repeatable.
+"""
+
+import asyncio
+import json
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from llm_gateway import make_chunk, make_completion
+
+_NAME = re.compile(r"\bDr\.?\s+([A-Z][\w'-]+(?:\s+[A-Z][\w'-]+)?)")
+_QUERY = re.compile(r"\b(?:find|search for|search)\s+([^,.;]+?)(?:\s+and\b|[,.;]|$)", re.IGNORECASE)
+_HCP_ID = re.compile(r"\bHCP\s*#?(\d+)", re.IGNORECASE)
+
+class FakeGroq:
+    """LLM gateway backend; pass to LLMGateway or assign to an existing gateway's .backend"""
+
+    name = "fake_groq"
+
+    def __init__(self, latencies: Optional[Dict[str, float]] = None, default_latency: float = 0.0,
+                 jitter: float = 0.0, token_latency: float = 0.0, seed: int = 0):
+        self.latencies = latencies or {}
+        self.default_latency = default_latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    def script(self, messages: List[Dict[str, Any]], tools) -> List[tuple]:
+        """(tool name, arguments) calls for the last message, given the offered tools"""
+        last = messages[-1] if messages else {}
+        if last.get("role") != "user":
+            return []
+        text = str(last.get("content", ""))
+        lower = text.lower()
+        offered = {t["function"]["name"] for t in tools or []}
+        calls = []
+        if "analyze" in lower and "escalate" in offered:
+            return [("escalate", {})]
+        name = _NAME.search(text)
+        if "log_interaction" in offered and name and re.search(r"\b(met|visited|called|saw)\b", lower):
+            interaction_type = "call" if "called" in lower else "visit"
+            calls.append(("log_interaction", {"hcp_name": name.group(1), "interaction_type": interaction_type,
+                                              "notes": text}))
+        query = _QUERY.search(text)
+        if "search_hcp" in offered and query:
+            calls.append(("search_hcp", {"query": query.group(1).strip()}))
+        hcp_id = _HCP_ID.search(text)
+        if "generate_insights" in offered and "insight" in lower:
+            calls.append(("generate_insights", {"hcp_id": int(hcp_id.group(1)) if hcp_id else 1}))
+        if "search_notes" in offered and re.search(r"\b(who|which)\b.*\b(raised|mentioned|asked|concerns?)\b", lower):
+            calls.append(("search_notes", {"query": text}))
+        return calls
+
+    async def create(self, model: str, messages: List[Dict[str, Any]], tools=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latencies.get(model, self.default_latency)
+                            + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0))
+        calls = self.script(messages, tools)
+        answer = f"Answer from {model}: " + " ".join(["lorem"] * 40)
+        prompt = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        completion = make_completion(model, "" if calls else answer, prompt_tokens=max(1, prompt),
+                                     completion_tokens=0 if calls else 60)
+        completion.choices[0].message.tool_calls = [
+            SimpleNamespace(id=f"call_{i}", type="function",
+                            function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+            for i, (name, args) in enumerate(calls)
+        ] or None
+        return completion
+
+    async def stream(self, model: str, messages: List[Dict[str, Any]], tools=None, **kwargs):
+        message = (await self.create(model, messages, tools)).choices[0].message
+        for i, call in enumerate(message.tool_calls or []):
+            call.index = i
+        if message.tool_calls:
+            yield make_chunk(model, tool_calls=message.tool_calls)
+        for i, word in enumerate(message.content.split(" ") if message.content else []):
+            if i and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield make_chunk(model, word if i == 0 else " " + word)
+
+    def is_retryable(self, exc: Exception) -> bool:
+        return False
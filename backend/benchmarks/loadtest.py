@@ -0,0 +1,216 @@
+"""
+Load test: throughput and p50/p95/p99 latency of the main API paths under concurrent clients.
+
+Scenarios (--scenario, repeatable; all by default), each run on its own:
+
+    interactions  GET /api/interactions: a first page, or (half the time) the
+                  next page by cursor; a third filtered to one HCP
+    search_hcp    GET /api/tools/search-hcp for a last name, specialty or city
+    insights      POST /api/tools/generate-insights for a random HCP
+    chat          POST /api/chat/interact: log a visit, find HCPs, insights
+                  for an HCP, or small talk
+
+--concurrency clients each send their next request as soon as the previous
+one returns, for --duration seconds after --warmup seconds. Requests and
+HCPs are drawn from the datagen.py dataset with the same --seed (run it
+first; --hcps must match).
+
+By default the app runs in-process over ASGI against DATABASE_URL, with
+FakeGroq (fake_groq.py) answering LLM calls after --llm-ms (+ --llm-jitter-ms)
+and calling the real tools. With --url a running server is tested instead;
+its LLM is whatever it was started with (e.g. LLM_BACKEND=fake).
+
+--json saves the results. --baseline compares with a saved run and exits 1
+when any scenario's p95 grew, or its throughput fell, by more than
+--tolerance, or its error rate rose by more than a point.
+
+Usage (from backend/):
+    python benchmarks/datagen.py --hcps 100000 --interactions 2000000
+    python benchmarks/loadtest.py --hcps 100000 --concurrency 32 --duration 30 --json before.json
+    python benchmarks/loadtest.py --hcps 100000 --concurrency 32 --duration 30 --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_load.db")
+os.environ.setdefault("LLM_BACKEND", "fake")
+# Every chat message would otherwise be answered from the LLM cache after its first run
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+from datagen import CITIES, PRODUCTS, SPECIALTIES, hcp_table  # noqa: E402
+from fake_groq import FakeGroq  # noqa: E402
+
+# (method, path, JSON body or None)
+Request = Tuple[str, str, Optional[Dict[str, Any]]]
+
+class Workload:
+    """Draws requests for each scenario from the generated dataset"""
+
+    def __init__(self, hcps: int, seed: int):
+        table = hcp_table(hcps, seed)
+        self.hcps = hcps
+        self.names = table["name"]
+        self.cursors: List[str] = []
+
+    def interactions(self, rng: random.Random) -> Request:
+        params = "limit=50"
+        if rng.random() < 1 / 3:
+            params += f"&hcp_id={rng.randint(1, self.hcps)}"
+        elif self.cursors and rng.random() < 0.5:
+            params += f"&cursor={rng.choice(self.cursors)}"
+        return "GET", f"/api/interactions?{params}", None
+
+    def search_hcp(self, rng: random.Random) -> Request:
+        kind = rng.random()
+        if kind < 0.5:
+            query = self.names[rng.randrange(self.hcps)].split()[-1]
+        elif kind < 0.8:
+            query = rng.choice(SPECIALTIES)[0]
+        else:
+            query = rng.choice(CITIES)
+        return "GET", f"/api/tools/search-hcp?query={query}", None
+
+    def insights(self, rng: random.Random) -> Request:
+        return "POST", "/api/tools/generate-insights", {"hcp_id": rng.randint(1, self.hcps)}
+
+    def chat(self, rng: random.Random) -> Request:
+        hcp_id = rng.randint(1, self.hcps)
+        message = rng.choice([
+            f"I met Dr. {self.names[hcp_id - 1]} today and discussed {rng.choice(PRODUCTS)}",
+            f"Find {rng.choice(SPECIALTIES)[0]}",
+            f"Show me insights for HCP {hcp_id}",
+            "Thanks, that's all for today",
+        ])
+        return "POST", "/api/chat/interact", {"message": message}
+
+    def observe(self, scenario: str, response: httpx.Response):
+        # Cursors seen on first pages feed the "next page" requests
+        if scenario == "interactions" and len(self.cursors) < 1000 and response.status_code == 200:
+            cursor = response.json().get("next_cursor")
+            if cursor:
+                self.cursors.append(cursor)
+
+SCENARIOS = ("interactions", "search_hcp", "insights", "chat")
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"requests": len(latencies), "errors": errors, "rps": len(latencies) / elapsed,
+            "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(values.max())}
+
+async def run_scenario(client: httpx.AsyncClient, workload: Workload, scenario: str, concurrency: int,
+                       duration: float, warmup: float, seed: int) -> Dict[str, float]:
+    draw: Callable[[random.Random], Request] = getattr(workload, scenario)
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + warmup
+    stop = measure_from + duration
+    latencies: List[float] = []
+    errors = 0
+
+    async def client_loop(worker: int):
+        nonlocal errors
+        rng = random.Random(f"{seed}-{scenario}-{worker}")
+        while loop.time() < stop:
+            method, path, body = draw(rng)
+            start = loop.time()
+            try:
+                response = await client.request(method, path, json=body)
+                failed = response.status_code >= 400
+                workload.observe(scenario, response)
+            except httpx.HTTPError:
+                failed = True
+            if start >= measure_from:
+                latencies.append(loop.time() - start)
+                errors += failed
+
+    await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+    return summarize(latencies, errors, duration)
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    regressions = []
+    for scenario, result in results.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{scenario}: p95 {base['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {base['rps']:.1f} -> {result['rps']:.1f} req/s")
+        rate, base_rate = (r["errors"] / max(r["requests"], 1) for r in (result, base))
+        if rate > base_rate + 0.01:
+            regressions.append(f"{scenario}: error rate {base_rate:.1%} -> {rate:.1%}")
+    return regressions
+
+async def main(args) -> int:
+    scenarios = args.scenario or list(SCENARIOS)
+    workload = Workload(args.hcps, args.seed)
+    if args.url:
+        app = None
+        client = httpx.AsyncClient(base_url=args.url, timeout=60,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        from main import app, llm
+        llm.backend = FakeGroq(default_latency=args.llm_ms / 1000, jitter=args.llm_jitter_ms / 1000,
+                               seed=args.seed)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60)
+
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        target = args.url or os.environ["DATABASE_URL"]
+        print(f"{target}: {args.concurrency} clients, {args.duration:g}s per scenario")
+        print(f"{'scenario':<14} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9} {'max ms':>9}")
+        for scenario in scenarios:
+            result = await run_scenario(client, workload, scenario, args.concurrency, args.duration, args.warmup,
+                                        args.seed)
+            results[scenario] = result
+            print(f"{scenario:<14} {result['requests']:>9,} {result['errors']:>7,} {result['rps']:>9.1f} "
+                  f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                  f"{result['max_ms']:>9.1f}")
+    finally:
+        await client.aclose()
+        if app is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("--hcps", type=int, default=100_000, help="HCPs in the datagen.py dataset")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--llm-ms", type=float, default=300, help="FakeGroq latency per call (in-process only)")
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--url", help="Test a running server instead, e.g. http://localhost:8000")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,327 @@
+# changes.py - Change feed: compact write events with a replay buffer, fanned out to subscribers
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import deque
+from itertools import islice
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from encoding import dumps
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CHANGE_EVENTS = Counter("crm_change_events", "Change events published by op", ("op",))
+CHANGE_SUBSCRIBERS = Gauge("crm_change_subscribers", "Open change feed streams")
+CHANGE_RESETS = Counter("crm_change_resets", "Clients told to reload instead of replaying, by reason", ("reason",))
+CHANGE_ROWS_DROPPED = Counter("crm_change_rows_dropped", "Events sent without their row, too big for a NOTIFY")
+CHANGE_RECONNECTS = Counter("crm_change_reconnects", "NOTIFY connections re-established, by role", ("role",))
+
+# Postgres caps a NOTIFY payload at 8000 bytes
+NOTIFY_PAYLOAD_BYTES = 7900
+# Reconnect delays for the LISTEN and NOTIFY connections: doubling from the first up to the second
+RECONNECT_BACKOFF = (0.5, 30.0)
+
+class Reset(Exception):
+    """The cursor can't be replayed from the buffer; the client must reload and continue from `head`"""
+
+    def __init__(self, head: str, reason: str):
+        super().__init__(reason)
+        self.head = head
+        CHANGE_RESETS.labels(reason=reason).inc()
+
+def encode(event: Dict[str, Any]) -> str:
+    return dumps(event).decode()
+
+def fit_notify(event: Dict[str, Any], data: str) -> str:
+    """The event as it can travel by NOTIFY: one too big on its own goes without its row, which clients refetch"""
+    if "row" not in event or len(data.encode()) + 2 <= NOTIFY_PAYLOAD_BYTES:
+        return data
+    CHANGE_ROWS_DROPPED.inc()
+    return encode({key: value for key, value in event.items() if key != "row"})
+
+class Subscription:
+    """One open stream: a bounded queue of (cursor, data); a subscriber that falls behind is cut off"""
+
+    def __init__(self, size: int):
+        self.queue: "asyncio.Queue[Optional[Tuple[str, str]]]" = asyncio.Queue(size)
+        self.overflowed = False
+
+    def put(self, item: Tuple[str, str]):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # The reader sends a reset instead of an incomplete stream
+            self.reset()
+
+    def reset(self):
+        """Ends the stream with a reset: events it should have seen were lost"""
+        self.overflowed = True
+        self.close()
+
+    def close(self):
+        """Ends the stream after what is already queued (or at once, if the queue is full)"""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class ChangeFeed:
+    """Compact change events for writes, replayable by cursor and pushed to open streams.
+
+    Each event is JSON-encoded once when published and numbered in order. The
+    last `backlog` events are kept, so a client can pass the cursor of the last
+    event it applied and receive only what it missed. A cursor the buffer no
+    longer covers, or one from another process, raises Reset and the client
+    reloads once.
+
+    Events normally stay in this process. With `channel` set (Postgres only),
+    they are sent with NOTIFY and every worker LISTENs, so streams on any
+    worker see every write. Cursors stay per worker, so a client that
+    reconnects to a different worker reloads once. Each NOTIFY names the
+    worker that sent it, and `listeners` get the events other workers wrote,
+    to apply to this worker's in-memory state.
+
+    One connection sends every NOTIFY, in publish order; the LISTEN
+    connection is pinged every `ping_interval` seconds. Either one is
+    reopened with backoff when it drops. Events sent while nobody was
+    listening are lost, so after the LISTEN connection comes back every
+    cursor is reset and `on_resync` runs, to reload what the listeners keep.
+    """
+
+    def __init__(self, backlog: int = 10_000, queue_size: int = 1000, channel: Optional[str] = None,
+                 engine=None, ping_interval: float = 10.0):
+        self.id = uuid.uuid4().hex[:8]
+        # Names this worker in its NOTIFYs; unlike `id` it survives a resync
+        self.origin = self.id
+        self.queue_size = queue_size
+        self.channel = channel
+        self.engine = engine
+        self.ping_interval = ping_interval
+        self._seq = 0
+        self._buffer: Deque[Tuple[int, str]] = deque(maxlen=backlog)
+        self._subscribers: Set[Subscription] = set()
+        self._outbox: "asyncio.Queue[Optional[List[str]]]" = asyncio.Queue()
+        self._publisher: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._inbox: "asyncio.Queue[List[Dict[str, Any]]]" = asyncio.Queue()
+        self._deliverer: Optional[asyncio.Task] = None
+        # Awaited with every batch of events another worker published, one batch at a time in order
+        self.listeners: List[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = []
+        # Awaited after the LISTEN connection was lost and re-established
+        self.on_resync: Optional[Callable[[], Awaitable[None]]] = None
+
+    @classmethod
+    def from_env(cls, engine):
+        channel = os.getenv("CHANGE_FEED_NOTIFY_CHANNEL", "") or None
+        if channel and engine.dialect.name != "postgresql":
+            logger.warning("CHANGE_FEED_NOTIFY_CHANNEL needs Postgres; change events stay in this process")
+            channel = None
+        return cls(
+            backlog=int(os.getenv("CHANGE_FEED_BACKLOG", "10000")),
+            queue_size=int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "1000")),
+            channel=channel,
+            engine=engine,
+            ping_interval=float(os.getenv("CHANGE_FEED_PING_SECONDS", "10")),
+        )
+
+    # ---------- publishing ----------
+
+    @property
+    def head(self) -> str:
+        return f"{self.id}-{self._seq}"
+
+    def publish(self, *events: Dict[str, Any]):
+        if not events:
+            return
+        for event in events:
+            CHANGE_EVENTS.labels(op=event["op"]).inc()
+        encoded = [encode(event) for event in events]
+        if self.channel is None:
+            self._append(encoded)
+            return
+        # Our own notifications come back through the listener, in the same order as every other worker's
+        self._outbox.put_nowait([fit_notify(event, data) for event, data in zip(events, encoded)])
+
+    def _append(self, encoded: List[str]):
+        for data in encoded:
+            self._seq += 1
+            self._buffer.append((self._seq, data))
+            item = (f"{self.id}-{self._seq}", data)
+            for subscription in self._subscribers:
+                subscription.put(item)
+
+    def _payloads(self, encoded: List[str]) -> List[str]:
+        """Packs events into as few NOTIFY payloads as fit: {"origin": worker, "events": [...]}"""
+        head = '{"origin":"%s","events":[' % self.origin
+        payloads, batch, size = [], [], len(head) + 2
+        for data in encoded:
+            length = len(data.encode())
+            if batch and size + length + 1 > NOTIFY_PAYLOAD_BYTES:
+                payloads.append(head + ",".join(batch) + "]}")
+                batch, size = [], len(head) + 2
+            batch.append(data)
+            size += length + 1
+        payloads.append(head + ",".join(batch) + "]}")
+        return payloads
+
+    async def _publish(self):
+        """Sends queued events over one connection, kept open between batches and reopened when it fails"""
+        conn, delay, stopping = None, RECONNECT_BACKOFF[0], False
+        while not stopping and (encoded := await self._outbox.get()) is not None:
+            # Whatever queued up meanwhile goes in the same transaction
+            while not self._outbox.empty():
+                more = self._outbox.get_nowait()
+                if more is None:
+                    stopping = True
+                    break
+                encoded += more
+            while True:
+                try:
+                    if conn is None:
+                        conn = await self.engine.connect()
+                    for payload in self._payloads(encoded):
+                        await conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                           {"channel": self.channel, "payload": payload})
+                    await conn.commit()
+                    delay = RECONNECT_BACKOFF[0]
+                    break
+                except Exception as exc:
+                    if conn is not None:
+                        await conn.invalidate()
+                        conn = None
+                    if stopping:
+                        logger.error("Dropping %d change events at shutdown: %s", len(encoded), exc)
+                        break
+                    logger.warning("Publishing %d change events failed (%s); reconnecting in %.1fs",
+                                   len(encoded), exc, delay)
+                    CHANGE_RECONNECTS.labels(role="notify").inc()
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, RECONNECT_BACKOFF[1])
+        if conn is not None:
+            await conn.close()
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        message = json.loads(payload)
+        events = message["events"]
+        self._append([encode(event) for event in events])
+        if message["origin"] != self.origin and self.listeners:
+            self._inbox.put_nowait(events)
+
+    async def _deliver(self):
+        while True:
+            events = await self._inbox.get()
+            for listener in self.listeners:
+                try:
+                    await listener(events)
+                except Exception:
+                    logger.exception("Applying %d change events from another worker failed", len(events))
+
+    async def _listen(self):
+        """Holds the LISTEN connection open, reopening it with backoff whenever it drops"""
+        delay, connected = RECONNECT_BACKOFF[0], False
+        while True:
+            conn = None
+            try:
+                conn = await self.engine.connect()
+                raw = (await conn.get_raw_connection()).driver_connection
+                lost = asyncio.Event()
+                raw.add_termination_listener(lambda _: lost.set())
+                await raw.add_listener(self.channel, self._on_notify)
+                if connected:
+                    logger.warning("LISTEN connection for %r re-established; resetting change feed cursors",
+                                   self.channel)
+                    CHANGE_RECONNECTS.labels(role="listen").inc()
+                    await self._resync()
+                connected, delay = True, RECONNECT_BACKOFF[0]
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.ping_interval)
+                    except asyncio.TimeoutError:
+                        await raw.execute("SELECT 1")
+                raise ConnectionError("connection closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("LISTEN connection for %r lost (%s); reconnecting in %.1fs", self.channel, exc, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_BACKOFF[1])
+            finally:
+                if conn is not None:
+                    try:
+                        await conn.invalidate()
+                    except Exception:
+                        pass
+
+    async def _resync(self):
+        """After a gap in the feed: new cursors (old ones reset), streams told to reload, local state reloaded"""
+        self.id = uuid.uuid4().hex[:8]
+        self._buffer.clear()
+        for subscription in list(self._subscribers):
+            subscription.reset()
+        if self.on_resync is not None:
+            try:
+                await self.on_resync()
+            except Exception:
+                logger.exception("Reloading after a change feed gap failed")
+
+    # ---------- lifecycle ----------
+
+    async def start(self):
+        if self.channel is None:
+            return
+        self._publisher = asyncio.create_task(self._publish())
+        self._listener = asyncio.create_task(self._listen())
+        self._deliverer = asyncio.create_task(self._deliver())
+
+    async def stop(self):
+        for subscription in list(self._subscribers):
+            subscription.close()
+        if self._publisher is not None:
+            # Flushes what is queued first, unless the database is unreachable
+            self._outbox.put_nowait(None)
+            _, pending = await asyncio.wait([self._publisher], timeout=5)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(self._publisher, return_exceptions=True)
+            self._publisher = None
+        for task in (self._listener, self._deliverer):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._listener = self._deliverer = None
+
+    # ---------- reading ----------
+
+    def since(self, cursor: Optional[str], limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Buffered events after `cursor` as (cursor, data); no cursor means "from now on" """
+        if not cursor:
+            return []
+        origin, _, seq = cursor.rpartition("-")
+        if origin != self.id or not seq.isdigit():
+            raise Reset(self.head, "unknown cursor")
+        seq = int(seq)
+        if seq > self._seq:
+            raise Reset(self.head, "unknown cursor")
+        missed = self._seq - seq
+        if missed > len(self._buffer):
+            raise Reset(self.head, "expired")
+        start = len(self._buffer) - missed
+        end = len(self._buffer) if limit is None else min(start + limit, len(self._buffer))
+        return [(f"{self.id}-{s}", data) for s, data in islice(self._buffer, start, end)]
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        CHANGE_SUBSCRIBERS.set(len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        CHANGE_SUBSCRIBERS.set(len(self._subscribers))
@@ -0,0 +1,260 @@
+# conversations.py - Server-side chat memory with token-budgeted rolling summaries
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from llm_gateway import LLMError
+from metrics import Counter, Gauge
+from prompts import render
+from tokens import count_message_tokens, count_tokens
+
+logger = logging.getLogger(__name__)
+
+COMPACTIONS = Counter("crm_chat_compactions", "Conversation history compactions by outcome", ("outcome",))
+CONVERSATIONS = Gauge("crm_chat_conversations", "Conversations held in memory")
+
+@dataclass
+class Conversation:
+    id: str
+    # Rolling summary of every turn that has been compacted out of `turns`
+    summary: str = ""
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.time)
+    # Bumped by every save; compaction writes back only over the version it compacted
+    version: int = 0
+
+    def context(self, budget: int) -> List[Dict[str, str]]:
+        """Summary plus the newest turns that fit in `budget` tokens.
+
+        Compaction normally keeps the history under budget; this cut also holds
+        while a compaction is still running or after one failed.
+        """
+        context = []
+        used = 0
+        if self.summary:
+            context.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+            used = count_message_tokens(context)
+        recent = []
+        for message in reversed(self.turns):
+            used += count_message_tokens([message])
+            if used > budget and recent:
+                break
+            recent.append(message)
+        return context + recent[::-1]
+
+class ConversationStore:
+    """Conversations keyed by ID: LRU + TTL in memory, optionally written through to SQLite.
+
+    After each turn, if a conversation's history exceeds `token_budget`, its
+    oldest turns are folded into the rolling summary by one small-model call
+    in the background. Only the newly folded turns and the previous summary
+    are sent, so the cost per compaction stays flat as the conversation grows.
+    """
+
+    def __init__(self, llm, model: str, token_budget: int = 2000, max_conversations: int = 1000,
+                 ttl: float = 86400.0, path: Optional[str] = None):
+        self.llm = llm
+        self.model = model
+        self.token_budget = token_budget
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._compacting: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        # Serializes read-modify-save sequences (appends, compaction write-backs) within this process
+        self._writes = asyncio.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS chat_conversations (
+                    id TEXT PRIMARY KEY, summary TEXT NOT NULL, turns TEXT NOT NULL, updated_at REAL NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = {row[1] for row in self._disk.execute("PRAGMA table_info(chat_conversations)")}
+            if "version" not in columns:
+                self._disk.execute("ALTER TABLE chat_conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    @classmethod
+    def from_env(cls, llm) -> "ConversationStore":
+        return cls(
+            llm,
+            model=os.getenv("CHAT_SUMMARY_MODEL", "llama-3.1-8b-instant"),
+            token_budget=int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000")),
+            max_conversations=int(os.getenv("CHAT_STORE_MAX_CONVERSATIONS", "1000")),
+            ttl=float(os.getenv("CHAT_STORE_TTL_SECONDS", "86400")),
+            path=os.getenv("CHAT_STORE_PATH") or None,
+        )
+
+    # ---------- storage ----------
+
+    def _remember(self, conversation: Conversation):
+        with self._lock:
+            self._conversations[conversation.id] = conversation
+            self._conversations.move_to_end(conversation.id)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        CONVERSATIONS.set(len(self._conversations))
+
+    def _disk_get(self, conversation_id: str) -> Optional[Conversation]:
+        with self._lock:
+            row = self._disk.execute(
+                "SELECT summary, turns, updated_at, version FROM chat_conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return Conversation(conversation_id, row[0], json.loads(row[1]), row[2], row[3])
+
+    def _disk_save(self, conversation: Conversation, expected: Optional[int] = None) -> bool:
+        values = (conversation.summary, json.dumps(conversation.turns), conversation.updated_at, conversation.version)
+        with self._lock, self._disk:
+            if expected is None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO chat_conversations (summary, turns, updated_at, version, id) "
+                    "VALUES (?, ?, ?, ?, ?)", values + (conversation.id,),
+                )
+            elif not self._disk.execute(
+                "UPDATE chat_conversations SET summary = ?, turns = ?, updated_at = ?, version = ? "
+                "WHERE id = ? AND version = ?", values + (conversation.id, expected),
+            ).rowcount:
+                return False
+            self._disk.execute("DELETE FROM chat_conversations WHERE updated_at <= ?", (time.time() - self.ttl,))
+        return True
+
+    async def _save(self, conversation: Conversation, expected: Optional[int] = None) -> bool:
+        """Bumps the version and writes through; with `expected`, only over a stored copy still at that
+        version (returns False if another worker has written it since)"""
+        conversation.updated_at = time.time()
+        conversation.version += 1
+        if self._disk is not None and not await asyncio.to_thread(self._disk_save, conversation, expected):
+            return False
+        self._remember(conversation)
+        return True
+
+    # ---------- public API ----------
+
+    async def get(self, conversation_id: str) -> Optional[Conversation]:
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+        if conversation is None and self._disk is not None:
+            conversation = await asyncio.to_thread(self._disk_get, conversation_id)
+        if conversation is None or conversation.updated_at <= time.time() - self.ttl:
+            return None
+        self._remember(conversation)
+        return conversation
+
+    async def get_or_create(self, conversation_id: Optional[str] = None,
+                            seed: Optional[List[Dict[str, str]]] = None) -> Conversation:
+        """Existing conversation, or a new one (seeded from client-sent history, for older clients).
+
+        A new conversation always gets a server-generated ID: an unknown or
+        expired `conversation_id` from the client is not adopted.
+        """
+        if conversation_id:
+            conversation = await self.get(conversation_id)
+            if conversation is not None:
+                return conversation
+        conversation = Conversation(uuid.uuid4().hex, turns=[
+            {"role": m["role"], "content": m["content"]} for m in seed or [] if m.get("role") in ("user", "assistant")
+        ])
+        async with self._writes:
+            await self._save(conversation)
+        self._schedule_compaction(conversation)
+        return conversation
+
+    async def append(self, conversation: Conversation, *messages: Dict[str, str]):
+        async with self._writes:
+            conversation.turns.extend(messages)
+            await self._save(conversation)
+        self._schedule_compaction(conversation)
+
+    async def delete(self, conversation_id: str):
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+        CONVERSATIONS.set(len(self._conversations))
+        if self._disk is not None:
+            def drop():
+                with self._lock, self._disk:
+                    self._disk.execute("DELETE FROM chat_conversations WHERE id = ?", (conversation_id,))
+            await asyncio.to_thread(drop)
+
+    async def close(self):
+        for task in list(self._compacting.values()):
+            task.cancel()
+        await asyncio.gather(*self._compacting.values(), return_exceptions=True)
+
+    # ---------- compaction ----------
+
+    def _schedule_compaction(self, conversation: Conversation):
+        if conversation.id in self._compacting or count_message_tokens(conversation.turns) <= self.token_budget:
+            return
+        task = asyncio.create_task(self.compact(conversation))
+        self._compacting[conversation.id] = task
+        task.add_done_callback(lambda _: self._compacting.pop(conversation.id, None))
+
+    def _split(self, turns: List[Dict[str, str]]) -> int:
+        """Number of oldest turns to fold so the rest fits in half the budget, cut before a user message"""
+        keep_tokens = self.token_budget // 2
+        used = 0
+        cut = len(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            used += count_message_tokens([turns[i]])
+            if used > keep_tokens:
+                break
+            cut = i
+        while 0 < cut < len(turns) and turns[cut]["role"] != "user":
+            cut += 1
+        return cut
+
+    async def compact(self, conversation: Conversation):
+        folded = conversation.turns[:self._split(conversation.turns)]
+        if not folded:
+            return
+        previous = conversation.summary
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in folded)
+        try:
+            response = await self.llm.chat(
+                model=self.model,
+                messages=render("conversation_summary", summary=conversation.summary or "(none)",
+                                transcript=transcript),
+                temperature=0.2,
+                max_tokens=250,
+            )
+        except LLMError as exc:
+            # The budget is still enforced by Conversation.context(); the next turn retries
+            COMPACTIONS.labels(outcome="error").inc()
+            logger.warning("Compaction of conversation %s failed: %s", conversation.id, exc)
+            return
+        summary = response.choices[0].message.content.strip()
+        async with self._writes:
+            with self._lock:
+                current = self._conversations.get(conversation.id)
+            # Turns appended meanwhile sit after the folded ones, so dropping the prefix is safe; anything
+            # else (deleted, reloaded, compacted elsewhere) means the summary no longer fits the history
+            if (current is not conversation or conversation.summary != previous
+                    or conversation.turns[:len(folded)] != folded):
+                COMPACTIONS.labels(outcome="conflict").inc()
+                return
+            version, turns = conversation.version, conversation.turns
+            conversation.summary, conversation.turns = summary, turns[len(folded):]
+            if not await self._save(conversation, expected=version):
+                # Another worker wrote it since we read it: its copy wins, ours is reloaded on next use
+                conversation.summary, conversation.turns, conversation.version = previous, turns, version
+                with self._lock:
+                    if self._conversations.get(conversation.id) is conversation:
+                        del self._conversations[conversation.id]
+                COMPACTIONS.labels(outcome="conflict").inc()
+                return
+        COMPACTIONS.labels(outcome="ok").inc()
+        logger.debug("Compacted %d turns of %s into a %d-token summary",
+                     len(folded), conversation.id, count_tokens(conversation.summary))
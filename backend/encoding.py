@@ -0,0 +1,17 @@
+# encoding.py - JSON encoding for cached bodies, the change feed and NDJSON streams (orjson)
+
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+# Same options as FastAPI's ORJSONResponse, so cached and live responses encode alike
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def _default(value: Any) -> Any:
+    # orjson handles dicts, lists, datetimes, dataclasses and NumPy natively; anything else
+    # (ORM objects, Pydantic models) takes FastAPI's slower generic path
+    return jsonable_encoder(value)
+
+def dumps(value: Any, newline: bool = False) -> bytes:
+    return orjson.dumps(value, default=_default, option=(OPTIONS | orjson.OPT_APPEND_NEWLINE) if newline else OPTIONS)
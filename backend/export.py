@@ -0,0 +1,239 @@
+# export.py - Streaming bulk export of interactions, with their HCP's fields, as CSV, NDJSON or Parquet
+"""
+Rows are read from a server-side cursor EXPORT_CHUNK_ROWS at a time, with the
+HCP columns joined in the same SELECT. Each chunk is encoded (and compressed)
+before the next one is fetched, so memory stays flat however many rows are
+exported. Archived months (archive.py) can follow the database's rows. Their
+HCP fields are looked up with one query per chunk.
+
+Rows come newest first, as in the listing, and archived rows after the
+database's. Parquet output is a single file with its row groups compressed
+inside it: --compression picks the codec, and rows are buffered up to
+archive.ROW_GROUP_ROWS per group. CSV and NDJSON are compressed as one
+continuous stream.
+
+The whole export reads from one connection. On Postgres it sees one
+snapshot of the table from start to end.
+
+Serves GET /api/export/interactions, and runs standalone.
+
+Usage (from backend/):
+    python export.py -o interactions.csv
+    python export.py --compression gzip -o interactions.csv.gz
+    python export.py --format parquet --compression zstd --include-archived -o history.parquet
+    python export.py --format ndjson --from 2025-01-01 --to 2025-02-01 > 2025-01.ndjson
+"""
+
+import argparse
+import csv
+import io
+import logging
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+
+from archive import COLUMNS as ARCHIVE_COLUMNS, ROW_GROUP_ROWS, InteractionArchive, arrow_schema
+from encoding import dumps
+from metrics import Counter
+from models import HCP, Interaction
+
+logger = logging.getLogger(__name__)
+
+EXPORTED_ROWS = Counter("crm_exported_interactions", "Interactions written by exports", ("format",))
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+
+# HCP fields joined onto every row
+HCP_FIELDS = {"hcp_name": HCP.name, "hcp_specialty": HCP.specialty, "hcp_hospital": HCP.hospital}
+# Exported columns, in file order
+COLUMNS = ARCHIVE_COLUMNS + tuple(HCP_FIELDS)
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+def export_schema():
+    import pyarrow as pa
+    return pa.schema(list(arrow_schema()) + [pa.field(name, pa.string()) for name in HCP_FIELDS])
+
+def export_filename(format: str, compression: str, now: Optional[datetime] = None) -> str:
+    suffix = "" if format == "parquet" else COMPRESSIONS[compression]
+    return f"interactions-{now or datetime.utcnow():%Y%m%d}.{format}{suffix}"
+
+def export_media_type(format: str, compression: str) -> str:
+    if format == "parquet" or compression == "none":
+        return FORMATS[format]
+    return f"application/{compression}"
+
+class _Sink(io.RawIOBase):
+    """Collects what the writers produced since the last take()"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+class Encoder:
+    """Encodes chunks of rows (COLUMNS order) into one file, returning its bytes as they are ready"""
+
+    def __init__(self, format: str, compression: str = "none"):
+        if format not in FORMATS or compression not in COMPRESSIONS:
+            raise ValueError(f"Unsupported export: {format} with {compression} compression")
+        self.format = format
+        self._sink = _Sink()
+        self._gzip = self._zstd = self._parquet = None
+        if format == "parquet":
+            import pyarrow.parquet as pq
+            self._schema = export_schema()
+            self._pending: List[Any] = []
+            self._parquet = pq.ParquetWriter(self._sink, self._schema, compression=compression)
+        elif compression == "gzip":
+            self._gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif compression == "zstd":
+            import pyarrow as pa
+            self._zstd = pa.CompressedOutputStream(self._sink, "zstd")
+        self._header = format == "csv"
+
+    def _write(self, data: bytes):
+        if self._gzip is not None:
+            self._sink.write(self._gzip.compress(data))
+        elif self._zstd is not None:
+            self._zstd.write(data)
+            # Lets the chunk out now instead of when the compressor's buffer fills
+            self._zstd.flush()
+        else:
+            self._sink.write(data)
+
+    def _write_row_group(self):
+        import pyarrow as pa
+        self._parquet.write_table(pa.Table.from_batches(self._pending), row_group_size=ROW_GROUP_ROWS)
+        self._pending = []
+
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        if self.format == "parquet":
+            import pyarrow as pa
+            self._pending.append(pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(zip(*rows), self._schema)],
+                schema=self._schema))
+            if sum(batch.num_rows for batch in self._pending) >= ROW_GROUP_ROWS:
+                self._write_row_group()
+        elif self.format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if self._header:
+                writer.writerow(COLUMNS)
+                self._header = False
+            writer.writerows([v.isoformat() if isinstance(v, datetime) else v for v in row] for row in rows)
+            self._write(buffer.getvalue().encode())
+        else:
+            self._write(b"".join(dumps(dict(zip(COLUMNS, row)), newline=True) for row in rows))
+        return self._sink.take()
+
+    def finish(self) -> bytes:
+        if self._parquet is not None:
+            if self._pending:
+                self._write_row_group()
+            self._parquet.close()
+        elif self._header:
+            self._write(",".join(COLUMNS).encode() + b"\r\n")
+        if self._gzip is not None:
+            self._sink.write(self._gzip.flush())
+        elif self._zstd is not None:
+            self._zstd.close()
+        return self._sink.take()
+
+def export_statement(hcp_id: Optional[int] = None, interaction_type: Optional[str] = None,
+                     follow_up_required: Optional[bool] = None, created_from: Optional[datetime] = None,
+                     created_to: Optional[datetime] = None):
+    """Interactions with their HCP's fields (COLUMNS order), newest first"""
+    stmt = (select(*[getattr(Interaction, c) for c in ARCHIVE_COLUMNS],
+                   *[column.label(name) for name, column in HCP_FIELDS.items()])
+            .outerjoin(HCP, HCP.id == Interaction.hcp_id))
+    if hcp_id is not None:
+        stmt = stmt.where(Interaction.hcp_id == hcp_id)
+    if interaction_type is not None:
+        stmt = stmt.where(Interaction.interaction_type == interaction_type)
+    if follow_up_required is not None:
+        stmt = stmt.where(Interaction.follow_up_required == follow_up_required)
+    if created_from is not None:
+        stmt = stmt.where(Interaction.created_at >= created_from)
+    if created_to is not None:
+        stmt = stmt.where(Interaction.created_at < created_to)
+    return stmt.order_by(Interaction.created_at.desc(), Interaction.id.desc())
+
+def export_rows(engine, filters: Dict[str, Any], archive: Optional[InteractionArchive] = None,
+                chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[Sequence[Sequence[Any]]]:
+    """Chunks of rows (COLUMNS order): the database's, then the archive's when one is given"""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(
+            export_statement(**filters))
+        yield from result.partitions()
+        if archive is None:
+            return
+        missing = (None,) * len(HCP_FIELDS)
+        for batch in archive.batches(chunk_rows, **filters):
+            rows = list(zip(*(batch.column(c).to_pylist() for c in ARCHIVE_COLUMNS)))
+            hcp_ids = {row[1] for row in rows if row[1] is not None}
+            hcps = {row[0]: tuple(row[1:]) for row in conn.execute(
+                select(HCP.id, *HCP_FIELDS.values()).where(HCP.id.in_(hcp_ids)))} if hcp_ids else {}
+            yield [row + hcps.get(row[1], missing) for row in rows]
+
+def stream_export(engine, format: str, compression: str = "none", filters: Optional[Dict[str, Any]] = None,
+                  archive: Optional[InteractionArchive] = None) -> Iterator[bytes]:
+    """The export file's bytes, a chunk of rows at a time; blocking"""
+    encoder = Encoder(format, compression)
+    exported = 0
+    start = time.perf_counter()
+    for rows in export_rows(engine, filters or {}, archive):
+        data = encoder.encode(rows)
+        exported += len(rows)
+        EXPORTED_ROWS.labels(format=format).inc(len(rows))
+        if data:
+            yield data
+    yield encoder.finish()
+    logger.info("Exported %d interactions as %s in %.1fs", exported, format, time.perf_counter() - start)
+
+def main(args):
+    from database import engine
+    filters = {"hcp_id": args.hcp_id, "interaction_type": args.interaction_type,
+               "created_from": args.created_from, "created_to": args.created_to}
+    archive = InteractionArchive.from_env() if args.include_archived else None
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    start = time.perf_counter()
+    written = 0
+    try:
+        for data in stream_export(engine, args.format, args.compression, filters, archive):
+            out.write(data)
+            written += len(data)
+    finally:
+        if args.output:
+            out.close()
+    print(f"Wrote {written / 1e6:,.1f} MB of {args.format} in {time.perf_counter() - start:.1f}s"
+          + (f" to {args.output}" if args.output else ""), file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", help="File to write (default: stdout)")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--compression", choices=list(COMPRESSIONS), default="none")
+    parser.add_argument("--include-archived", action="store_true", help="Append the archived months' rows")
+    parser.add_argument("--hcp-id", type=int)
+    parser.add_argument("--interaction-type")
+    parser.add_argument("--from", dest="created_from", type=datetime.fromisoformat, help="created_at >= (ISO date)")
+    parser.add_argument("--to", dest="created_to", type=datetime.fromisoformat, help="created_at < (ISO date)")
+    main(parser.parse_args())
@@ -0,0 +1,224 @@
+# followups.py - Follow-up reminders: a min-heap of upcoming due times, refilled from the partial due index
+
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, literal, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import async_engine, db_session
+from metrics import Counter, Gauge, Histogram
+from models import FollowupReminder, Interaction
+
+logger = logging.getLogger(__name__)
+
+FOLLOWUP_REMINDERS = Counter("crm_followup_reminders", "Follow-up reminders by outcome", ("outcome",))
+FOLLOWUP_PENDING = Gauge("crm_followup_pending", "Follow-ups held in the scheduler heap")
+FOLLOWUP_LAG = Histogram(
+    "crm_followup_dispatch_lag_seconds", "Time between a follow-up falling due and its reminder firing",
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 30.0, 300.0, 3600.0),
+)
+
+def _epoch(value: datetime) -> float:
+    """Naive datetimes are UTC, as stored by the models"""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+def _insert(dialect: str):
+    return postgresql_insert if dialect == "postgresql" else sqlite_insert
+
+def open_followups(start: datetime, end: datetime):
+    """Open follow-ups due in [start, end) that have not been reminded yet, served by idx_interactions_followup_due"""
+    return (
+        select(Interaction.id, Interaction.hcp_id, Interaction.followup_date)
+        .outerjoin(FollowupReminder, and_(FollowupReminder.interaction_id == Interaction.id,
+                                          FollowupReminder.followup_date == Interaction.followup_date))
+        .where(Interaction.follow_up_required, Interaction.followup_date >= start,
+               Interaction.followup_date < end, FollowupReminder.interaction_id.is_(None))
+    )
+
+class FollowupScheduler:
+    """Fires one reminder per follow-up when it falls due.
+
+    Only follow-ups due before `horizon` sit in memory, as a min-heap of
+    (due, interaction id); the loop sleeps until the earliest one. When the
+    horizon is reached the next `window` of due dates is read from the
+    partial index, so the interactions table is never scanned. Writes call
+    track()/cancel(); superseded heap entries are skipped when popped.
+
+    Due reminders are claimed by inserting into followup_reminders straight
+    from the live interactions rows: a follow-up that was cleared, moved or
+    deleted since it was queued is not claimed, and neither is one another
+    worker already sent. on_due receives the claimed reminders in batches.
+    """
+
+    def __init__(self, on_due: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                 window: float = 6 * 3600.0, catchup: float = 86400.0, batch_size: int = 1000,
+                 retry_delay: float = 30.0):
+        self.on_due = on_due
+        self.window = window
+        self.catchup = catchup
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self._heap: List[Tuple[float, int]] = []
+        # interaction id -> (due, hcp_id) for the live entry; heap entries not matching it are stale
+        self._due: Dict[int, Tuple[float, Optional[int]]] = {}
+        # Everything due before this is in the heap; None until start()
+        self._horizon: Optional[float] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def schedule(self, interaction_id: int, hcp_id: Optional[int], due: float):
+        if self._horizon is None or due >= self._horizon:
+            # Read from the index when the horizon gets there
+            self._due.pop(interaction_id, None)
+            return
+        if self._due.get(interaction_id, (None,))[0] == due:
+            return
+        self._due[interaction_id] = (due, hcp_id)
+        heapq.heappush(self._heap, (due, interaction_id))
+        FOLLOWUP_PENDING.set(len(self._due))
+        if self._wakeup is not None and self._heap[0][1] == interaction_id:
+            self._wakeup.set()
+
+    def cancel(self, interaction_id: int):
+        if self._due.pop(interaction_id, None) is not None:
+            FOLLOWUP_PENDING.set(len(self._due))
+
+    def track(self, interaction: Interaction):
+        """schedule() or cancel() from an ORM row after insert or update"""
+        self.track_row(interaction.id, interaction.hcp_id, interaction.follow_up_required, interaction.followup_date)
+
+    def track_row(self, interaction_id: int, hcp_id: Optional[int], follow_up_required: Optional[bool],
+                  followup_date: Optional[datetime]):
+        if follow_up_required and followup_date is not None:
+            self.schedule(interaction_id, hcp_id, _epoch(followup_date))
+        else:
+            self.cancel(interaction_id)
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        now = time.time()
+        # Set first so writes made while the first window loads are queued too
+        self._horizon = now + self.window
+        await self._load(now - self.catchup, self._horizon)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _load(self, start: float, end: float):
+        async with db_session() as db:
+            result = await db.stream(open_followups(datetime.utcfromtimestamp(start), datetime.utcfromtimestamp(end))
+                                     .execution_options(yield_per=10000))
+            async for interaction_id, hcp_id, followup_date in result:
+                # A write during the load is newer than what the query saw
+                if interaction_id not in self._due:
+                    self.schedule(interaction_id, hcp_id, _epoch(followup_date))
+
+    def _pop_due(self, now: float) -> List[Tuple[int, Optional[int], float]]:
+        ready = []
+        while self._heap and self._heap[0][0] <= now and len(ready) < self.batch_size:
+            due, interaction_id = heapq.heappop(self._heap)
+            entry = self._due.get(interaction_id)
+            if entry is None or entry[0] != due:
+                continue
+            del self._due[interaction_id]
+            ready.append((interaction_id, entry[1], due))
+        FOLLOWUP_PENDING.set(len(self._due))
+        return ready
+
+    async def _run(self):
+        while True:
+            # Stale entries would otherwise wake the loop for nothing
+            while self._heap and self._due.get(self._heap[0][1], (None,))[0] != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            next_at = min(self._heap[0][0], self._horizon) if self._heap else self._horizon
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(next_at - time.time(), 0))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            now = time.time()
+            if now >= self._horizon:
+                start, self._horizon = self._horizon, now + self.window
+                try:
+                    await self._load(start, self._horizon)
+                except Exception:
+                    logger.exception("Loading follow-ups due before %s failed", datetime.utcfromtimestamp(self._horizon))
+                    self._horizon = start
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+            ready = self._pop_due(now)
+            if ready:
+                await self._dispatch(ready, now)
+                if self._heap and self._heap[0][0] <= now:
+                    self._wakeup.set()
+
+    async def _dispatch(self, ready: List[Tuple[int, Optional[int], float]], now: float):
+        try:
+            claimed = await self.claim([interaction_id for interaction_id, _, _ in ready], now)
+        except Exception:
+            FOLLOWUP_REMINDERS.labels(outcome="error").inc(len(ready))
+            logger.exception("Claiming %d follow-up reminders failed; retrying in %.0fs", len(ready), self.retry_delay)
+            for interaction_id, hcp_id, _ in ready:
+                self.schedule(interaction_id, hcp_id, now + self.retry_delay)
+            return
+
+        FOLLOWUP_REMINDERS.labels(outcome="skipped").inc(len(ready) - len(claimed))
+        if not claimed:
+            return
+        reminders = []
+        for interaction_id, hcp_id, due in ready:
+            followup_date = claimed.get(interaction_id)
+            if followup_date is not None:
+                FOLLOWUP_LAG.observe(max(now - due, 0.0))
+                reminders.append({
+                    "interaction_id": interaction_id,
+                    "hcp_id": hcp_id,
+                    "followup_date": followup_date,
+                    "sent_at": datetime.utcfromtimestamp(now),
+                })
+        FOLLOWUP_REMINDERS.labels(outcome="sent").inc(len(reminders))
+        try:
+            (self.on_due or log_reminders)(reminders)
+        except Exception:
+            logger.exception("Follow-up reminder handler failed")
+
+    async def claim(self, interaction_ids: List[int], now: float) -> Dict[int, datetime]:
+        """Records reminders for those follow-ups that are still open and due; returns id -> followup_date"""
+        sent_at = datetime.utcfromtimestamp(now)
+        source = (
+            select(Interaction.id, Interaction.followup_date, literal(sent_at))
+            .where(Interaction.id.in_(interaction_ids), Interaction.follow_up_required,
+                   Interaction.followup_date <= sent_at)
+        )
+        stmt = (
+            _insert(async_engine.dialect.name)(FollowupReminder)
+            .from_select(["interaction_id", "followup_date", "sent_at"], source)
+            .on_conflict_do_nothing()
+            .returning(FollowupReminder.interaction_id, FollowupReminder.followup_date)
+        )
+        async with db_session() as db:
+            rows = (await db.execute(stmt)).all()
+            await db.commit()
+        return {interaction_id: followup_date for interaction_id, followup_date in rows}
+
+def log_reminders(reminders: List[Dict[str, Any]]):
+    for reminder in reminders:
+        logger.info("Follow-up due: interaction %s (HCP %s) at %s", reminder["interaction_id"],
+                    reminder["hcp_id"], reminder["followup_date"].isoformat())
@@ -0,0 +1,193 @@
+# hcp_directory.py - Process-local HCP name resolver with fuzzy matching
+
+from array import array
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from hcp_search import query_tokens, normalize
+from models import HCP
+
+@dataclass
+class Candidate:
+    id: int
+    name: str
+    score: float
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal-string-alignment distance (adjacent swaps cost 1), or limit + 1 once it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before_previous[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+def _deletions(token: str) -> Set[str]:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+def _typo_budget(token: str) -> int:
+    return 0 if len(token) < 3 else 1 if len(token) <= 7 else 2
+
+class HCPDirectory:
+    """Normalized-name index over every HCP, held in process memory.
+
+    Names are split into tokens; each distinct token keeps an int32 array of
+    HCP ids. The token vocabulary (much smaller than the HCP count) is also
+    indexed by its single-character deletions, so misspelled query tokens are
+    corrected with a few dict lookups plus a bounded edit distance. Resolution
+    scores candidates by token-set overlap weighted by per-token similarity,
+    so "Dr. Jon Smtih" still ranks "John Smith" first.
+    """
+
+    def __init__(self):
+        self._names: Dict[int, str] = {}
+        self._tokens: Dict[int, Tuple[str, ...]] = {}
+        self._ids_by_token: Dict[str, array] = {}
+        # Single-character deletions of every vocabulary token (SymSpell-style typo lookup)
+        self._deletes: Dict[str, Set[str]] = {}
+        self._vocab: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, hcp_id: int, name: Optional[str], _bulk: bool = False):
+        if hcp_id in self._names:
+            self.remove(hcp_id)
+        tokens = tuple(dict.fromkeys(normalize(name).split()))
+        self._names[hcp_id] = name or ""
+        self._tokens[hcp_id] = tokens
+        for token in tokens:
+            ids = self._ids_by_token.get(token)
+            if ids is None:
+                ids = self._ids_by_token[token] = array("i")
+                for variant in _deletions(token):
+                    self._deletes.setdefault(variant, set()).add(token)
+                if _bulk:
+                    self._vocab.append(token)
+                else:
+                    insort(self._vocab, token)
+            ids.append(hcp_id)
+
+    def remove(self, hcp_id: int):
+        self._names.pop(hcp_id, None)
+        for token in self._tokens.pop(hcp_id, ()):
+            ids = self._ids_by_token.get(token)
+            if ids is not None and hcp_id in ids:
+                ids.remove(hcp_id)
+
+    def build(self, rows: Iterable[Tuple[int, Optional[str]]]):
+        for hcp_id, name in rows:
+            self.add(hcp_id, name, _bulk=True)
+        self._vocab.sort()
+
+    async def load(self, db):
+        """Cold-builds the directory from the hcps table"""
+        directory = HCPDirectory()
+        result = await db.execute(select(HCP.id, HCP.name))
+        directory.build(result.tuples().all())
+        self.__dict__.update(directory.__dict__)
+
+    def _token_matches(self, token: str, expand_known: bool) -> List[Tuple[str, float]]:
+        """Vocabulary tokens matching one query token, with a similarity in (0, 1]"""
+        matches = {token: 1.0} if token in self._ids_by_token else {}
+        if matches and not expand_known:
+            return list(matches.items())
+        budget = _typo_budget(token)
+        if budget:
+            variants = {token} | _deletions(token)
+            if budget > 1:
+                variants |= {d for v in list(variants) for d in _deletions(v)}
+            candidates = set()
+            for variant in variants:
+                candidates |= self._deletes.get(variant, set())
+                if variant in self._ids_by_token:
+                    candidates.add(variant)
+            for candidate in candidates - matches.keys():
+                distance = bounded_edit_distance(token, candidate, budget)
+                if distance <= budget:
+                    matches[candidate] = 1.0 - distance / (len(token) + 1)
+        # Prefix of a longer token ("Jen" -> "jennifer") counts, but below a typo fix
+        if len(token) >= 3:
+            start = bisect_left(self._vocab, token)
+            for candidate in self._vocab[start:start + 50]:
+                if not candidate.startswith(token):
+                    break
+                matches.setdefault(candidate, 0.6)
+        return list(matches.items())
+
+    def resolve(self, name: str, limit: int = 5, min_score: float = 0.5) -> List[Candidate]:
+        """Ranked candidates for a free-text HCP name"""
+        tokens = list(dict.fromkeys(query_tokens(name)))
+        if not tokens:
+            return []
+        # Fast pass trusts tokens that exist verbatim; unless some name contains every query token
+        # (score >= 0.85), the query is re-ranked with fuzzy expansion
+        candidates = self._rank(tokens, limit, min_score, expand_known=False)
+        if not candidates or candidates[0].score < 0.85:
+            candidates = self._rank(tokens, limit, min_score, expand_known=True)
+        return candidates
+
+    def _rank(self, tokens: List[str], limit: int, min_score: float, expand_known: bool) -> List[Candidate]:
+        id_chunks, weight_chunks = [], []
+        for token in tokens:
+            ids, weights = [], []
+            for match, similarity in self._token_matches(token, expand_known):
+                postings = np.frombuffer(self._ids_by_token[match], dtype=np.int32)
+                ids.append(postings)
+                weights.append(np.full(len(postings), similarity))
+            if not ids:
+                continue
+            ids, weights = np.concatenate(ids), np.concatenate(weights)
+            # One query token counts once per HCP: keep its best similarity
+            order = np.lexsort((-weights, ids))
+            ids, weights = ids[order], weights[order]
+            first = np.ones(len(ids), dtype=bool)
+            first[1:] = ids[1:] != ids[:-1]
+            id_chunks.append(ids[first])
+            weight_chunks.append(weights[first])
+        if not id_chunks:
+            return []
+
+        unique_ids, inverse = np.unique(np.concatenate(id_chunks), return_inverse=True)
+        matched = np.bincount(inverse, weights=np.concatenate(weight_chunks))
+        coverage = matched / len(tokens)
+        keep = np.flatnonzero(coverage >= min_score)
+        if not len(keep):
+            return []
+        ids = unique_ids[keep].tolist()
+        name_lengths = np.fromiter((len(self._tokens[hcp_id]) for hcp_id in ids), dtype=np.float64, count=len(ids))
+        # Token-set ratio: driven by query coverage, lightly penalizing name tokens the query left out
+        scores = coverage[keep] * (0.7 + 0.3 * np.minimum(matched[keep] / name_lengths, 1.0))
+        ranked = np.flatnonzero(scores >= min_score)
+        if len(ranked) > limit:
+            # Everything tied with the k-th best score survives so ties break on name/id, not array order
+            kth = np.partition(scores[ranked], len(ranked) - limit)[len(ranked) - limit]
+            ranked = ranked[scores[ranked] >= kth]
+
+        candidates = [Candidate(ids[i], self._names[ids[i]], round(float(scores[i]), 4)) for i in ranked.tolist()]
+        candidates.sort(key=lambda c: (-c.score, c.name, c.id))
+        return candidates[:limit]
+
+    def resolve_one(self, name: str, margin: float = 0.1):
+        """Returns (candidate, alternatives): candidate is None when nothing matched or the top match is ambiguous"""
+        candidates = self.resolve(name)
+        if not candidates:
+            return None, []
+        top = candidates[0]
+        rivals = [c for c in candidates[1:] if top.score - c.score < margin]
+        if rivals:
+            return None, [top] + rivals
+        return top, candidates[1:]
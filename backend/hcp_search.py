@@ -0,0 +1,308 @@
+# hcp_search.py - Ranked HCP search: pg_trgm/tsvector on Postgres, in-process trigram index elsewhere
+
+import re
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, text
+
+from metrics import Histogram
+from models import HCP
+
+SEARCH_LATENCY = Histogram(
+    "crm_hcp_search_seconds", "HCP search latency by backend and mode", ("backend", "mode"),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+
+SEARCH_FIELDS = ("name", "specialty", "hospital")
+# Name hits outrank specialty hits, which outrank hospital hits
+FIELD_WEIGHTS = {"name": 1.0, "specialty": 0.8, "hospital": 0.6}
+# pg_trgm's default word_similarity_threshold, which `<%` applies on Postgres
+WORD_SIMILARITY_THRESHOLD = 0.6
+# Score of a record containing the whole query as a substring of a field: above any trigram-only match
+SUBSTRING_SCORES = {"name": 1.5, "specialty": 1.3, "hospital": 1.1}
+# Honorifics reps type that never appear in the stored names
+STOPWORDS = {"dr", "doctor", "prof", "md"}
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+def normalize(value: Optional[str]) -> str:
+    """Lowercases, strips accents and collapses everything but letters/digits to single spaces"""
+    if not value:
+        return ""
+    if not value.isascii():
+        value = unicodedata.normalize("NFKD", value)
+        value = "".join(c for c in value if not unicodedata.combining(c))
+    return " ".join(_NON_ALNUM.sub(" ", value.lower()).split())
+
+def query_tokens(query: str) -> List[str]:
+    return [t for t in normalize(query).split() if t not in STOPWORDS]
+
+@lru_cache(maxsize=65536)
+def _word_trigrams(word: str) -> Tuple[str, ...]:
+    padded = f"  {word} "
+    return tuple(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def trigrams(value: str) -> set:
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing"""
+    grams = set()
+    for word in value.split():
+        grams.update(_word_trigrams(word))
+    return grams
+
+@dataclass
+class SearchHit:
+    id: int
+    name: str
+    specialty: Optional[str]
+    hospital: Optional[str]
+    score: float
+
+# ==================== IN-PROCESS INDEX ====================
+
+class TrigramIndex:
+    """Inverted trigram index over HCP name/specialty/hospital.
+
+    Postings are compact int32 arrays of dense document slots, kept per
+    field, so scoring a query is one np.bincount per field over the postings
+    of its trigrams. As with pg_trgm's `<%` on each column, a record matches
+    when one field covers WORD_SIMILARITY_THRESHOLD of the query's trigrams.
+    A sorted token list next to it answers prefix (typeahead) lookups by
+    bisection.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, array]] = {field: {} for field in SEARCH_FIELDS}
+        self._slots: Dict[int, int] = {}
+        self._docs: List[Optional[Tuple[int, str, Optional[str], Optional[str]]]] = []
+        self._normalized: List[Optional[Dict[str, str]]] = []
+        self._tokens: List[Tuple[str, int, int]] = []
+        self._live = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def add(self, hcp_id: int, name: Optional[str], specialty: Optional[str], hospital: Optional[str],
+            _bulk: bool = False):
+        if hcp_id in self._slots:
+            self.remove(hcp_id)
+        slot = len(self._docs)
+        self._slots[hcp_id] = slot
+        self._docs.append((hcp_id, name, specialty, hospital))
+        fields = {"name": normalize(name), "specialty": normalize(specialty), "hospital": normalize(hospital)}
+        self._normalized.append(fields)
+        for field, value in fields.items():
+            postings = self._postings[field]
+            for gram in trigrams(value):
+                if gram not in postings:
+                    postings[gram] = array("i")
+                postings[gram].append(slot)
+        tokens = [(token, rank, slot) for rank, field in enumerate(SEARCH_FIELDS) for token in fields[field].split()]
+        if _bulk:
+            self._tokens.extend(tokens)
+        else:
+            for token in tokens:
+                insort(self._tokens, token)
+        self._live += 1
+
+    def build(self, rows: Iterable[Tuple[int, Optional[str], Optional[str], Optional[str]]]):
+        """Bulk-loads (id, name, specialty, hospital) rows, sorting the token list once at the end"""
+        for row in rows:
+            self.add(*row, _bulk=True)
+        self._tokens.sort()
+
+    def remove(self, hcp_id: int):
+        # Tombstone the slot; its postings are skipped at query time
+        slot = self._slots.pop(hcp_id, None)
+        if slot is not None:
+            self._docs[slot] = None
+            self._normalized[slot] = None
+            self._live -= 1
+
+    def _hit(self, slot: int, score: float) -> SearchHit:
+        hcp_id, name, specialty, hospital = self._docs[slot]
+        return SearchHit(hcp_id, name, specialty, hospital, round(score, 4))
+
+    def search(self, query: str, limit: int = 10, candidates: int = 200) -> List[SearchHit]:
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        if sum(len(t) for t in tokens) < 3:
+            return self.typeahead(query, limit)
+        grams = trigrams(" ".join(tokens))
+        # Per field: coverage of the query's trigrams, like pg_trgm word_similarity
+        coverage = np.zeros(len(self._docs))
+        weighted = np.zeros(len(self._docs))
+        for field, weight in FIELD_WEIGHTS.items():
+            index = self._postings[field]
+            postings = [np.frombuffer(index[g], dtype=np.int32) for g in grams if g in index]
+            if postings:
+                shared = np.bincount(np.concatenate(postings), minlength=len(self._docs)) / len(grams)
+                np.maximum(coverage, shared, out=coverage)
+                np.maximum(weighted, weight * shared, out=weighted)
+        top = np.flatnonzero(coverage >= WORD_SIMILARITY_THRESHOLD)
+        if len(top) > candidates:
+            top = top[np.argpartition(-weighted[top], candidates)[:candidates]]
+
+        phrase = " ".join(tokens)
+        hits = []
+        for slot in top.tolist():
+            fields = self._normalized[slot]
+            if fields is None:
+                continue
+            score = float(weighted[slot])
+            for field, weight in FIELD_WEIGHTS.items():
+                value = fields[field]
+                if f" {phrase} " in f" {value} ":
+                    score = max(score, 1.2 + weight)
+                elif f" {phrase}" in f" {value}":
+                    score = max(score, 1.0 + weight)
+                elif phrase in value:
+                    score = max(score, SUBSTRING_SCORES[field])
+            hits.append(self._hit(slot, score))
+        hits.sort(key=lambda h: (-h.score, h.name or ""))
+        return hits[:limit]
+
+    def typeahead(self, prefix: str, limit: int = 10, scan: int = 500) -> List[SearchHit]:
+        tokens = query_tokens(prefix)
+        if not tokens:
+            return []
+        *complete, last = tokens
+        start = bisect_left(self._tokens, (last, -1, -1))
+        best: Dict[int, float] = {}
+        for token, rank, slot in self._tokens[start:start + scan]:
+            if not token.startswith(last):
+                break
+            fields = self._normalized[slot]
+            if fields is None:
+                continue
+            # Earlier words must match whole words in the same record
+            if complete:
+                haystack = " ".join(fields.values()).split()
+                if any(word not in haystack for word in complete):
+                    continue
+            score = FIELD_WEIGHTS[SEARCH_FIELDS[rank]] + (0.5 if token == last else 0.0)
+            best[slot] = max(best.get(slot, 0.0), score)
+        hits = [self._hit(slot, score) for slot, score in best.items()]
+        hits.sort(key=lambda h: (-h.score, h.name or ""))
+        return hits[:limit]
+
+# ==================== SEARCH SERVICE ====================
+
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_hcps_name_trgm ON hcps USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_hcps_specialty_trgm ON hcps USING gin (specialty gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_hcps_hospital_trgm ON hcps USING gin (hospital gin_trgm_ops)",
+    """ALTER TABLE hcps ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(specialty, '') || ' ' || coalesce(hospital, ''))
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS idx_hcps_search_vector ON hcps USING gin (search_vector)",
+]
+
+POSTGRES_SEARCH_SQL = text("""
+    SELECT id, name, specialty, hospital,
+           greatest(word_similarity(:q, name),
+                    0.8 * word_similarity(:q, coalesce(specialty, '')),
+                    0.6 * word_similarity(:q, coalesce(hospital, '')),
+                    ts_rank(search_vector, plainto_tsquery('simple', :q)),
+                    -- Substring matches first, scored as in TrigramIndex.search
+                    CASE WHEN strpos(lower(name), :q) > 0 THEN 1.5 ELSE 0 END,
+                    CASE WHEN strpos(lower(coalesce(specialty, '')), :q) > 0 THEN 1.3 ELSE 0 END,
+                    CASE WHEN strpos(lower(coalesce(hospital, '')), :q) > 0 THEN 1.1 ELSE 0 END) AS score
+    FROM hcps
+    WHERE :q <% name OR :q <% specialty OR :q <% hospital
+       OR search_vector @@ plainto_tsquery('simple', :q)
+    ORDER BY score DESC, name
+    LIMIT :limit
+""")
+
+POSTGRES_TYPEAHEAD_SQL = text("""
+    SELECT id, name, specialty, hospital,
+           ts_rank(search_vector, to_tsquery('simple', :tsq)) AS score
+    FROM hcps
+    WHERE search_vector @@ to_tsquery('simple', :tsq)
+    ORDER BY score DESC, name
+    LIMIT :limit
+""")
+
+def install_postgres_search(connection):
+    """Creates the pg_trgm/tsvector indexes; idempotent, mirrors init.sql"""
+    for statement in POSTGRES_SEARCH_DDL:
+        connection.execute(text(statement))
+
+class HCPSearch:
+    """Dispatches HCP search to Postgres indexes or, on other databases, the in-process index"""
+
+    def __init__(self, dialect: str):
+        self.dialect = dialect
+        self.index: Optional[TrigramIndex] = None if dialect == "postgresql" else TrigramIndex()
+        self._loaded = False
+
+    @property
+    def backend(self) -> str:
+        return "postgres" if self.index is None else "memory"
+
+    async def load(self, db):
+        """Builds the in-process index from the hcps table (no-op on Postgres)"""
+        if self.index is None:
+            return
+        index = TrigramIndex()
+        result = await db.execute(select(HCP.id, HCP.name, HCP.specialty, HCP.hospital))
+        index.build(result.tuples().all())
+        self.index, self._loaded = index, True
+
+    def hcp_written(self, hcp: HCP):
+        """Keeps the in-process index in sync after an HCP insert/update"""
+        if self.index is not None:
+            self.index.add(hcp.id, hcp.name, hcp.specialty, hcp.hospital)
+
+    def hcp_deleted(self, hcp_id: int):
+        if self.index is not None:
+            self.index.remove(hcp_id)
+
+    async def search(self, db, query: str, limit: int = 10) -> List[SearchHit]:
+        with _timed(self.backend, "search"):
+            if self.index is not None:
+                if not self._loaded:
+                    await self.load(db)
+                return self.index.search(query, limit)
+            q = " ".join(query_tokens(query))
+            if not q:
+                return []
+            if len(q) < 3:
+                return await self._typeahead_pg(db, q, limit)
+            rows = (await db.execute(POSTGRES_SEARCH_SQL, {"q": q, "limit": limit})).all()
+            return [SearchHit(r.id, r.name, r.specialty, r.hospital, round(float(r.score), 4)) for r in rows]
+
+    async def typeahead(self, db, prefix: str, limit: int = 10) -> List[SearchHit]:
+        with _timed(self.backend, "typeahead"):
+            if self.index is not None:
+                if not self._loaded:
+                    await self.load(db)
+                return self.index.typeahead(prefix, limit)
+            return await self._typeahead_pg(db, prefix, limit)
+
+    async def _typeahead_pg(self, db, prefix: str, limit: int) -> List[SearchHit]:
+        tokens = query_tokens(prefix)
+        if not tokens:
+            return []
+        # Words are already reduced to [a-z0-9], so they are safe inside to_tsquery
+        tsq = " & ".join(tokens[:-1] + [tokens[-1] + ":*"])
+        rows = (await db.execute(POSTGRES_TYPEAHEAD_SQL, {"tsq": tsq, "limit": limit})).all()
+        return [SearchHit(r.id, r.name, r.specialty, r.hospital, round(float(r.score), 4)) for r in rows]
+
+class _timed:
+    def __init__(self, backend: str, mode: str):
+        self.histogram = SEARCH_LATENCY.labels(backend=backend, mode=mode)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._start)
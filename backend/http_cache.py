@@ -0,0 +1,152 @@
+# http_cache.py - Versioned read cache: strong ETags, 304s without a query, serialized bodies in memory
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from encoding import dumps
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "crm_response_cache_lookups", "Cached read endpoint lookups by resource and result (not_modified, hit, miss)",
+    ("resource", "result"),
+)
+
+class ResponseCache:
+    """Read responses cached per (resource, request key), invalidated by bumping a version.
+
+    Every resource ("hcps", "interactions") has a version counter that write
+    paths bump. A response's ETag is derived from the version and the request
+    key, so If-None-Match is answered with 304 from memory, before any
+    database work. Otherwise the serialized body for the current version is
+    served if present, or built once: concurrent misses for the same key share
+    one build. Bumping a version drops that resource's bodies.
+
+    Versions are per process (the ETag names the process), so with several
+    workers a client may get a 200 from a worker it has not seen yet. Each
+    worker hears about other workers' writes only through the change feed's
+    NOTIFY channel. Without one, set `ttl`: a version older than that is
+    bumped on the next read, which bounds how long a body or a 304 can
+    outlive another worker's write.
+
+    With `model`, a built payload is validated and serialized by that
+    response model, as FastAPI would for the route's response_model.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.id = uuid.uuid4().hex[:8]
+        self._versions: Dict[str, int] = {}
+        # resource -> monotonic time its current version started
+        self._since: Dict[str, float] = {}
+        # resource -> key -> (etag, body), least recently used first
+        self._entries: Dict[str, "OrderedDict[str, Tuple[str, bytes]]"] = {}
+        self._building: Dict[Tuple[str, int, str], asyncio.Future] = {}
+
+    @classmethod
+    def from_env(cls, shared: bool = False) -> "ResponseCache":
+        """`shared`: other workers' writes reach this one (CHANGE_FEED_NOTIFY_CHANNEL), so no TTL is needed"""
+        ttl = os.getenv("RESPONSE_CACHE_TTL_SECONDS", "")
+        if ttl == "":
+            ttl = "0" if shared else "5"
+            if not shared:
+                logger.info("No change feed channel: cached reads expire after %ss in case other workers write", ttl)
+        return cls(max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256")), ttl=float(ttl))
+
+    def bump(self, *resources: str):
+        for resource in resources:
+            self._versions[resource] = self._versions.get(resource, 0) + 1
+            self._since[resource] = time.monotonic()
+            self._entries.pop(resource, None)
+
+    def _expire(self, resource: str):
+        now = time.monotonic()
+        since = self._since.setdefault(resource, now)
+        if self.ttl and now - since >= self.ttl:
+            self.bump(resource)
+
+    def etag(self, resource: str, key: str) -> str:
+        digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+        return f'"{resource}-{self.id}-{self._versions.get(resource, 0)}-{digest}"'
+
+    async def respond(self, request: Request, resource: str, build: Callable[[], Awaitable[Any]],
+                      key: Optional[str] = None, model: Any = None) -> Response:
+        """ETag-validated, cached JSON response for a GET; `build` returns the payload on a miss.
+
+        The key defaults to the query string with parameters sorted.
+        """
+        if key is None:
+            key = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        self._expire(resource)
+        version = self._versions.get(resource, 0)
+        etag = self.etag(resource, key)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            RESPONSE_CACHE_LOOKUPS.labels(resource=resource, result="not_modified").inc()
+            return Response(status_code=304, headers=headers)
+
+        entries = self._entries.setdefault(resource, OrderedDict())
+        cached = entries.get(key)
+        if cached is not None and cached[0] == etag:
+            entries.move_to_end(key)
+            RESPONSE_CACHE_LOOKUPS.labels(resource=resource, result="hit").inc()
+            return Response(cached[1], media_type="application/json", headers=headers)
+
+        RESPONSE_CACHE_LOOKUPS.labels(resource=resource, result="miss").inc()
+        flight = (resource, version, key)
+        if flight in self._building:
+            body = await asyncio.shield(self._building[flight])
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._building[flight] = future
+            try:
+                payload = await build()
+                if model is None:
+                    body = dumps(payload)
+                else:
+                    adapter = type_adapter(model)
+                    body = adapter.dump_json(adapter.validate_python(payload))
+                future.set_result(body)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as exc:
+                future.set_exception(exc)
+                # Waiters get the error; mark it retrieved for the case with none
+                future.exception()
+                raise
+            finally:
+                del self._building[flight]
+            # A write during the build bumped the version; this body may predate it
+            if self._versions.get(resource, 0) == version:
+                entries = self._entries.setdefault(resource, OrderedDict())
+                entries[key] = (etag, body)
+                if len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+        if self._versions.get(resource, 0) != version:
+            # Don't let the client revalidate against a version that is already stale
+            headers = {"Cache-Control": "no-cache"}
+        return Response(body, media_type="application/json", headers=headers)
+
+@lru_cache(maxsize=None)
+def type_adapter(model: Any) -> TypeAdapter:
+    return TypeAdapter(model)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
@@ -0,0 +1,246 @@
+# ingest.py - Bulk interaction ingestion: chunked multi-row inserts with batched LLM summaries
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db_session
+from llm_gateway import LLMError
+from metrics import Counter, Histogram
+from models import HCP, Interaction
+from prompts import render
+from tokens import truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+INGEST_ROWS = Counter("crm_ingest_rows", "Bulk-ingested interaction rows by status", ("status",))
+INGEST_CHUNK_SECONDS = Histogram(
+    "crm_ingest_chunk_seconds", "Time to summarize and insert one ingestion chunk", ("stage",),
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0),
+)
+
+SUMMARY_MODEL = "gemma2-9b-it"
+
+# Notes beyond this are cut before summarizing; the stored notes stay complete
+SUMMARY_NOTES_TOKENS = 1500
+
+def summary_messages(interaction_type: str, notes: str, products: Optional[str]) -> List[Dict[str, str]]:
+    """Single-interaction summary prompt, shared with log_interaction_tool so cached answers are reused.
+
+    No products renders as an empty line, as the tool's default "" does, rather than "None".
+    """
+    return render("interaction_summary", interaction_type=interaction_type,
+                  notes=truncate_tokens(notes, SUMMARY_NOTES_TOKENS), products=products or "")
+
+def packed_summary_messages(rows: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    visits = "\n\n".join(
+        f"[{i}] Interaction Type: {row['interaction_type']}\n"
+        f"Notes: {truncate_tokens(row['notes'], SUMMARY_NOTES_TOKENS)}\nProducts: {row.get('products_discussed') or ''}"
+        for i, row in enumerate(rows)
+    )
+    return render("interaction_summary_packed", count=len(rows), interactions=visits)
+
+# ==================== INPUT PARSING ====================
+
+def iter_json_array(body: bytes) -> AsyncIterator[Tuple[int, Any]]:
+    """(index, item) pairs from a JSON array body; a malformed body raises ValueError up front"""
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array of interactions")
+    return _enumerate(items)
+
+async def _enumerate(items: List[Any]) -> AsyncIterator[Tuple[int, Any]]:
+    for index, item in enumerate(items):
+        yield index, item
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yields (index, item) per non-blank NDJSON line as the body streams in.
+
+    A line that is not valid JSON yields its ValueError in place of the item,
+    so one corrupt record does not sink the rest of the upload.
+    """
+    index = 0
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, _loads(line)
+                index += 1
+    if buffer.strip():
+        yield index, _loads(buffer)
+
+def _loads(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return ValueError(f"Invalid JSON: {exc}")
+
+def _describe(exc: Exception) -> str:
+    errors = getattr(exc, "errors", None)
+    if callable(errors):
+        return "; ".join(f"{'.'.join(str(p) for p in e['loc']) or 'row'}: {e['msg']}" for e in errors())
+    return str(exc)
+
+# ==================== SUMMARIZATION ====================
+
+class BatchSummarizer:
+    """Generates interaction summaries for a chunk of rows.
+
+    In "packed" mode up to `batch_size` notes share one completion that
+    answers with a JSON list; any batch the model answers malformed falls back
+    to one call per row. In "fanout" mode every row gets its own call, at most
+    `concurrency` in flight. Failed rows get None instead of a summary.
+    """
+
+    def __init__(self, llm, mode: str = "packed", batch_size: int = 8, concurrency: int = 16,
+                 model: str = SUMMARY_MODEL):
+        if mode not in ("packed", "fanout"):
+            raise ValueError(f"Unknown summary mode: {mode}")
+        self.llm = llm
+        self.mode = mode
+        self.batch_size = batch_size
+        self.model = model
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(self, rows: List[Dict[str, Any]]) -> List[Optional[str]]:
+        if self.mode == "fanout" or self.batch_size <= 1:
+            return list(await asyncio.gather(*(self._one(row) for row in rows)))
+        batches = [rows[i:i + self.batch_size] for i in range(0, len(rows), self.batch_size)]
+        results = await asyncio.gather(*(self._packed(batch) for batch in batches))
+        return [summary for batch in results for summary in batch]
+
+    async def _one(self, row: Dict[str, Any]) -> Optional[str]:
+        messages = summary_messages(row["interaction_type"], row["notes"], row.get("products_discussed"))
+        async with self._semaphore:
+            try:
+                response = await self.llm.chat(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=200,
+                    cache=True,
+                )
+            except LLMError as exc:
+                # Provider failures arrive wrapped (LLMProviderError, LLMTimeoutError, CircuitOpenError)
+                logger.warning("Summary failed: %s", exc)
+                return None
+        return response.choices[0].message.content
+
+    async def _packed(self, rows: List[Dict[str, Any]]) -> List[Optional[str]]:
+        if len(rows) == 1:
+            return [await self._one(rows[0])]
+        async with self._semaphore:
+            try:
+                response = await self.llm.chat(
+                    model=self.model,
+                    messages=packed_summary_messages(rows),
+                    temperature=0.3,
+                    max_tokens=120 * len(rows),
+                    response_format={"type": "json_object"},
+                    cache=True,
+                )
+                summaries = json.loads(response.choices[0].message.content)["summaries"]
+                if len(summaries) == len(rows) and all(isinstance(s, str) for s in summaries):
+                    return summaries
+            except (LLMError, ValueError, KeyError, TypeError) as exc:
+                logger.info("Packed summary unusable, falling back to per-row calls: %s", exc)
+        return list(await asyncio.gather(*(self._one(row) for row in rows)))
+
+# ==================== INGESTION ====================
+
+class BulkIngestor:
+    """Validates, summarizes and inserts interactions in chunks of `chunk_size`.
+
+    Each chunk is one multi-row INSERT ... RETURNING in its own transaction,
+    so a database error only fails the rows of that chunk. Results are
+    reported per input row, in input order. on_written receives each chunk's
+    inserted rows, with their ids, as soon as the chunk commits, so caches and
+    indexes stay in step even if a later chunk or the request itself fails.
+    """
+
+    def __init__(self, summarizer: BatchSummarizer, chunk_size: int = 500,
+                 on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.summarizer = summarizer
+        self.chunk_size = chunk_size
+        self.on_written = on_written
+
+    async def ingest(self, items: AsyncIterator[Tuple[int, Any]], validate: Callable[[Any], Dict[str, Any]],
+                     summarize: bool = False) -> Dict[str, Any]:
+        results: List[Dict[str, Any]] = []
+        chunk: List[Tuple[int, Dict[str, Any]]] = []
+
+        async for index, item in items:
+            try:
+                if isinstance(item, Exception):
+                    raise item
+                chunk.append((index, validate(item)))
+            except ValueError as exc:
+                results.append({"index": index, "status": "error", "error": _describe(exc)})
+            if len(chunk) >= self.chunk_size:
+                results.extend(await self._flush(chunk, summarize))
+                chunk = []
+        if chunk:
+            results.extend(await self._flush(chunk, summarize))
+
+        results.sort(key=lambda r: r["index"])
+        counts = {"created": 0, "error": 0}
+        for result in results:
+            counts[result["status"]] += 1
+        INGEST_ROWS.labels(status="created").inc(counts["created"])
+        INGEST_ROWS.labels(status="error").inc(counts["error"])
+        return {"created": counts["created"], "failed": counts["error"], "results": results}
+
+    async def _flush(self, chunk: List[Tuple[int, Dict[str, Any]]], summarize: bool):
+        results = []
+        async with db_session() as db:
+            known = set((await db.execute(
+                select(HCP.id).where(HCP.id.in_({row["hcp_id"] for _, row in chunk}))
+            )).scalars())
+        rows = []
+        for index, row in chunk:
+            if row["hcp_id"] in known:
+                rows.append((index, row))
+            else:
+                results.append({"index": index, "status": "error", "error": f"HCP {row['hcp_id']} not found"})
+        if not rows:
+            return results
+
+        summarized = [False] * len(rows)
+        if summarize:
+            start = time.perf_counter()
+            summaries = await self.summarizer.summarize([row for _, row in rows])
+            INGEST_CHUNK_SECONDS.labels(stage="summarize").observe(time.perf_counter() - start)
+            for i, ((_, row), summary) in enumerate(zip(rows, summaries)):
+                if summary:
+                    row["notes"] = f"{row['notes']}\n\nAI Summary: {summary}"
+                    summarized[i] = True
+
+        start = time.perf_counter()
+        try:
+            async with db_session() as db:
+                stmt = insert(Interaction).returning(Interaction.id, sort_by_parameter_order=True)
+                ids = (await db.execute(stmt, [row for _, row in rows])).scalars().all()
+                await db.commit()
+        except SQLAlchemyError as exc:
+            logger.exception("Bulk insert chunk of %d rows failed", len(rows))
+            error = f"Insert failed: {exc.__class__.__name__}"
+            return results + [{"index": index, "status": "error", "error": error} for index, _ in rows]
+        INGEST_CHUNK_SECONDS.labels(stage="insert").observe(time.perf_counter() - start)
+
+        written = []
+        for (index, row), interaction_id, was_summarized in zip(rows, ids, summarized):
+            written.append({**row, "id": interaction_id})
+            result = {"index": index, "status": "created", "id": interaction_id}
+            if summarize:
+                result["summarized"] = was_summarized
+            results.append(result)
+        if self.on_written is not None:
+            self.on_written(written)
+        return results
@@ -3,13 +3,15 @@ Database initialization script for Windows local development
 Run this after setting up the backend to create tables and sample data
 """
 
-from main import Base, engine, SessionLocal, HCP, Interaction
+from database import SessionLocal
+from migrate import migrate
+from models import HCP, Interaction
 from datetime import datetime, timedelta
 
 print("🔧 Initializing database...")
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
+# Create all tables (same step as `python migrate.py`)
+migrate()
 print("✅ Tables created")
 
 # Create database session
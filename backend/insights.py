@@ -0,0 +1,147 @@
+# insights.py - Precomputed per-HCP insight snapshots kept fresh by a background worker
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import func, select
+
+from database import db_session
+from metrics import Counter, Gauge
+from models import HCP, HCPInsightSnapshot, Interaction
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_REFRESHES = Counter("crm_insight_refreshes", "Insight snapshot refreshes by outcome", ("outcome",))
+SNAPSHOT_PENDING = Gauge("crm_insight_refresh_pending", "HCPs waiting for a debounced insight refresh")
+
+async def interaction_fingerprint(db, hcp_id: int) -> str:
+    """Cheap summary of an HCP's interactions; changes on any insert, update or delete"""
+    count, last_updated, last_id = (await db.execute(
+        select(func.count(Interaction.id), func.max(Interaction.updated_at), func.max(Interaction.id))
+        .where(Interaction.hcp_id == hcp_id)
+    )).one()
+    return f"{count}:{last_updated.isoformat() if last_updated else ''}:{last_id or 0}"
+
+class InsightRefresher:
+    """Debounced, coalescing refresher for HCP insight snapshots.
+
+    Writes call mark_dirty(hcp_id). Each dirty HCP is refreshed once it has
+    been quiet for `debounce` seconds (or after `max_delay` at the latest),
+    so a burst of edits costs one LLM call. A refresh is skipped when the
+    interaction fingerprint still matches the stored snapshot.
+
+    `generate(hcp_id, fresh)` returns the insight text; `fresh` asks it to
+    bypass the LLM response cache (forced refreshes).
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[int, bool], Awaitable[str]],
+        debounce: float = 2.0,
+        max_delay: float = 30.0,
+        concurrency: int = 4,
+    ):
+        self.generate = generate
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        self._due: Dict[int, float] = {}
+        self._first_dirty: Dict[int, float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self, hcp_id: int):
+        now = time.monotonic()
+        first = self._first_dirty.setdefault(hcp_id, now)
+        self._due[hcp_id] = min(now + self.debounce, first + self.max_delay)
+        SNAPSHOT_PENDING.set(len(self._due))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        if self._due:
+            self._wakeup.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def refresh_one(hcp_id: int):
+            async with semaphore:
+                try:
+                    await self.refresh(hcp_id)
+                except Exception:
+                    SNAPSHOT_REFRESHES.labels(outcome="error").inc()
+                    logger.exception("Insight refresh failed for HCP %s", hcp_id)
+
+        while True:
+            timeout = None
+            if self._due:
+                timeout = max(min(self._due.values()) - time.monotonic(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            now = time.monotonic()
+            ready = [hcp_id for hcp_id, due in self._due.items() if due <= now]
+            for hcp_id in ready:
+                del self._due[hcp_id]
+                del self._first_dirty[hcp_id]
+            SNAPSHOT_PENDING.set(len(self._due))
+            if ready:
+                await asyncio.gather(*(refresh_one(hcp_id) for hcp_id in ready))
+
+    async def refresh(self, hcp_id: int, force: bool = False) -> Optional[HCPInsightSnapshot]:
+        """Regenerates the snapshot if the HCP's interactions changed since it was built"""
+        async with db_session() as db:
+            exists = (await db.execute(select(HCP.id).where(HCP.id == hcp_id))).first() is not None
+            fingerprint = await interaction_fingerprint(db, hcp_id)
+            snapshot = await db.get(HCPInsightSnapshot, hcp_id)
+        if snapshot is not None and snapshot.fingerprint == fingerprint and not force:
+            SNAPSHOT_REFRESHES.labels(outcome="unchanged").inc()
+            return snapshot
+
+        insights = await self.generate(hcp_id, force)
+        if not exists:
+            # Snapshots reference hcps; the answer for an unknown HCP is returned without one
+            SNAPSHOT_REFRESHES.labels(outcome="unknown_hcp").inc()
+            return HCPInsightSnapshot(hcp_id=hcp_id, insights=insights, fingerprint=fingerprint,
+                                      generated_at=datetime.utcnow())
+        async with db_session() as db:
+            snapshot = await db.get(HCPInsightSnapshot, hcp_id)
+            if snapshot is None:
+                snapshot = HCPInsightSnapshot(hcp_id=hcp_id)
+                db.add(snapshot)
+            snapshot.insights = insights
+            snapshot.fingerprint = fingerprint
+            snapshot.generated_at = datetime.utcnow()
+            await db.commit()
+        SNAPSHOT_REFRESHES.labels(outcome="refreshed").inc()
+        return snapshot
+
+    async def get(self, hcp_id: int, refresh: bool = False):
+        """Returns (snapshot, stale), generating inline only when no snapshot exists or refresh is forced"""
+        async with db_session() as db:
+            snapshot = await db.get(HCPInsightSnapshot, hcp_id)
+            fingerprint = await interaction_fingerprint(db, hcp_id) if snapshot is not None else None
+        if snapshot is None or refresh:
+            return await self.refresh(hcp_id, force=refresh), False
+        stale = snapshot.fingerprint != fingerprint
+        if stale:
+            self.mark_dirty(hcp_id)
+        return snapshot, stale
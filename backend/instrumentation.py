@@ -0,0 +1,251 @@
+# instrumentation.py - Request, tool/node and SQL timing; sampled per-request profiling
+
+import functools
+import hmac
+import inspect
+import logging
+import os
+import random
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "crm_http_request_seconds", "Request wall time by method, route template and status (streams until closed)",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = Gauge("crm_http_requests_in_flight", "Requests currently being handled")
+HTTP_DB_QUERIES = Histogram(
+    "crm_http_db_queries", "SQL statements executed per request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+DB_QUERY_SECONDS = Histogram(
+    "crm_db_query_seconds", "SQL statement execution time by operation and first table", ("operation", "table"),
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+DB_SLOW_QUERIES = Counter("crm_db_slow_queries", "Statements slower than SLOW_QUERY_SECONDS", ("operation", "table"))
+PROFILES = Counter("crm_profiles", "Requests profiled, by trigger (sample, header)", ("trigger",))
+
+# ==================== DECORATOR ====================
+
+def timed(histogram: Histogram, **labels: str):
+    """Observes the wrapped function's wall time into `histogram`.
+
+    The histogram needs an "outcome" label besides `labels`: ok, error (an
+    exception escaped) or cancelled. Works on sync and async functions and
+    keeps the signature, so agent tools built with tool_from_function still
+    get their schema from it.
+    """
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                outcome = "cancelled"
+                try:
+                    result = await fn(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                except Exception:
+                    outcome = "error"
+                    raise
+                finally:
+                    histogram.labels(outcome=outcome, **labels).observe(time.perf_counter() - start)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = fn(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    histogram.labels(outcome=outcome, **labels).observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+# ==================== SQL ====================
+
+# Per-request statement counter, set by the middleware; a list so greenlet-run listeners can update it in place
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+\"?(\w+)", re.IGNORECASE)
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.5"))
+
+@lru_cache(maxsize=2048)
+def classify(statement: str) -> Tuple[str, str]:
+    """(operation, first table) of a SQL statement; compiled statements repeat, so this is cached"""
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else "OTHER"
+    if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+        # BEGIN, COMMIT, pragmas, DDL, pg_notify ...: one series each would only add noise
+        return "OTHER", ""
+    match = _TABLE.search(statement)
+    return operation, match.group(1) if match else ""
+
+@lru_cache(maxsize=2048)
+def _series(statement: str) -> Histogram:
+    operation, table = classify(statement)
+    return DB_QUERY_SECONDS.labels(operation=operation, table=table)
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._crm_started = time.perf_counter()
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._crm_started
+    _series(statement).observe(elapsed)
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+    if elapsed >= SLOW_QUERY_SECONDS:
+        operation, table = classify(statement)
+        DB_SLOW_QUERIES.labels(operation=operation, table=table).inc()
+        logger.warning("Slow query (%.3fs): %s", elapsed, " ".join(statement.split())[:300])
+
+def instrument_engine(sync_engine):
+    """Times every statement on a (sync, or an async engine's .sync_engine) Engine"""
+    if not event.contains(sync_engine, "before_cursor_execute", _before_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_execute)
+
+# ==================== PROFILING ====================
+
+class Profiler:
+    """Profiles a sample of requests, or those sent with `X-Profile: <token>`.
+
+    cProfile is process-wide while enabled, so everything the event loop runs
+    during the request (other requests too) shows up; pyinstrument, when
+    installed and selected, follows only the request's own task. One request
+    is profiled at a time; others go unprofiled meanwhile. Profiles are
+    written to `directory` (.prof for pstats/snakeviz, .html for pyinstrument)
+    and the top functions are logged.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, token: Optional[str] = None, directory: str = "profiles",
+                 backend: str = "cprofile"):
+        self.sample_rate = sample_rate
+        self.token = token
+        self.directory = directory
+        self.backend = backend
+        self._active = False
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        return cls(
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            token=os.getenv("PROFILE_TOKEN") or None,
+            directory=os.getenv("PROFILE_DIR", "profiles"),
+            backend=os.getenv("PROFILE_BACKEND", "cprofile"),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.token is not None
+
+    def trigger(self, scope) -> Optional[str]:
+        """Why this request should be profiled, or None"""
+        if self._active:
+            return None
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return "header" if hmac.compare_digest(value.decode("latin-1"), self.token) else None
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def start(self):
+        self._active = True
+        if self.backend == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as PyinstrumentProfiler
+                profile = PyinstrumentProfiler(async_mode="enabled")
+                profile.start()
+                return profile
+            except ImportError:
+                logger.warning("PROFILE_BACKEND=pyinstrument but pyinstrument is not installed; using cProfile")
+                self.backend = "cprofile"
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, label: str, elapsed: float):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')}"
+            if self.backend == "pyinstrument":
+                profile.stop()
+                path = os.path.join(self.directory, name + ".html")
+                with open(path, "w") as f:
+                    f.write(profile.output_html())
+                logger.info("Profiled %s (%.1f ms) -> %s", label, elapsed * 1e3, path)
+                return
+            import io
+            import pstats
+            profile.disable()
+            path = os.path.join(self.directory, name + ".prof")
+            profile.dump_stats(path)
+            top = io.StringIO()
+            pstats.Stats(profile, stream=top).sort_stats("cumulative").print_stats(15)
+            logger.info("Profiled %s (%.1f ms) -> %s\n%s", label, elapsed * 1e3, path, top.getvalue())
+        except Exception:
+            logger.exception("Could not write profile for %s", label)
+        finally:
+            self._active = False
+
+# ==================== MIDDLEWARE ====================
+
+class InstrumentationMiddleware:
+    """Times every HTTP request and counts its SQL statements.
+
+    Plain ASGI rather than BaseHTTPMiddleware: no extra task per request and
+    streaming bodies pass straight through. The route label is the matched
+    route's path template (FastAPI puts the route in the scope), so
+    /api/interactions/{interaction_id} is one series; unmatched paths share
+    "unmatched".
+    """
+
+    def __init__(self, app, profiler: Optional[Profiler] = None):
+        self.app = app
+        self.profiler = profiler if profiler is not None and profiler.enabled else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        trigger = self.profiler.trigger(scope) if self.profiler is not None else None
+        profile = self.profiler.start() if trigger else None
+        queries = [0]
+        token = _request_queries.set(queries)
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            _request_queries.reset(token)
+            template = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.labels(method=scope["method"], route=template, status=status).observe(elapsed)
+            HTTP_DB_QUERIES.labels(route=template).observe(queries[0])
+            if profile is not None:
+                PROFILES.labels(trigger=trigger).inc()
+                self.profiler.finish(profile, f"{scope['method']} {template}", elapsed)
@@ -0,0 +1,257 @@
+# llm_cache.py - Content-addressed LLM response cache (memory LRU + optional SQLite tier)
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = Counter("crm_llm_cache_lookups", "LLM cache lookups by tier and result", ("tier", "result"))
+CACHE_SAVED_SECONDS = Counter("crm_llm_cache_saved_seconds", "Provider latency avoided by cache hits")
+CACHE_SAVED_TOKENS = Counter("crm_llm_cache_saved_tokens", "Prompt + completion tokens avoided by cache hits")
+CACHE_INVALIDATIONS = Counter("crm_llm_cache_invalidations", "Entries dropped by tag invalidation")
+CACHE_PURGED = Counter("crm_llm_cache_purged", "Disk-tier entries removed by the purge, by reason", ("reason",))
+
+def cache_key(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """Hashes everything that influences the completion: model, prompt and sampling params"""
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+@dataclass
+class CacheEntry:
+    content: str
+    expires_at: float
+    latency: float = 0.0
+    tokens: int = 0
+    tags: List[str] = field(default_factory=list)
+
+class LLMResponseCache:
+    """LRU + TTL cache in memory, optionally backed by a SQLite file that survives restarts.
+
+    Entries carry tags (e.g. "hcp:42") so everything derived from one HCP's
+    interactions can be dropped when a new interaction for that HCP is written.
+
+    The memory tier has its own lock and is used straight from the event
+    loop; the SQLite tier is only touched from worker threads, under another
+    lock, so a slow disk write never holds up a memory hit. Expired disk
+    entries are purged every `purge_interval` seconds (started by start()),
+    which also trims the file to `max_disk_entries`, dropping the entries
+    closest to expiry first.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600.0, path: Optional[str] = None,
+                 max_disk_entries: int = 100_000, purge_interval: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.purge_interval = purge_interval
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        # Tags whose disk invalidation is still running: disk hits carrying them count as misses
+        self._invalidating: Dict[str, int] = {}
+        self._pending: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._disk: Optional[sqlite3.Connection] = None
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.executescript("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY, content TEXT NOT NULL, expires_at REAL NOT NULL,
+                    latency REAL NOT NULL, tokens INTEGER NOT NULL, tags TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS llm_cache_tags (tag TEXT NOT NULL, key TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS idx_llm_cache_tags_tag ON llm_cache_tags(tag);
+                CREATE INDEX IF NOT EXISTS idx_llm_cache_tags_key ON llm_cache_tags(key);
+                CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache(expires_at);
+                -- Tag rows are deleted with their entry; this clears any left by older versions
+                DELETE FROM llm_cache_tags WHERE key NOT IN (SELECT key FROM llm_cache);
+            """)
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048")),
+            ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")),
+            path=os.getenv("LLM_CACHE_PATH") or None,
+            max_disk_entries=int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "100000")),
+            purge_interval=float(os.getenv("LLM_CACHE_PURGE_SECONDS", "60")),
+        )
+
+    # ---------- memory tier ----------
+
+    def _memory_get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _memory_set(self, key: str, entry: CacheEntry):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    # ---------- disk tier ----------
+
+    def _disk_get(self, key: str) -> Optional[CacheEntry]:
+        with self._disk_lock:
+            row = self._disk.execute(
+                "SELECT content, expires_at, latency, tokens, tags FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return CacheEntry(content=row[0], expires_at=row[1], latency=row[2], tokens=row[3], tags=json.loads(row[4]))
+
+    def _disk_set(self, key: str, entry: CacheEntry):
+        # Every path that removes an entry removes its tag rows with it
+        with self._disk_lock, self._disk:
+            self._disk.execute("DELETE FROM llm_cache_tags WHERE key = ?", (key,))
+            self._disk.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, content, expires_at, latency, tokens, tags) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry.content, entry.expires_at, entry.latency, entry.tokens, json.dumps(entry.tags)),
+            )
+            self._disk.executemany("INSERT INTO llm_cache_tags (tag, key) VALUES (?, ?)", [(t, key) for t in entry.tags])
+
+    def _disk_delete(self, keys: str, params: tuple) -> int:
+        """Deletes the entries selected by the `keys` subquery, tag rows first"""
+        self._disk.execute(f"DELETE FROM llm_cache_tags WHERE key IN ({keys})", params)
+        return self._disk.execute(f"DELETE FROM llm_cache WHERE key IN ({keys})", params).rowcount
+
+    def _disk_purge(self):
+        """Drops expired entries, then the ones closest to expiry beyond max_disk_entries"""
+        with self._disk_lock, self._disk:
+            expired = self._disk_delete("SELECT key FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            excess = self._disk.execute("SELECT count(*) FROM llm_cache").fetchone()[0] - self.max_disk_entries
+            evicted = 0
+            if excess > 0:
+                evicted = self._disk_delete("SELECT key FROM llm_cache ORDER BY expires_at LIMIT ?", (excess,))
+        CACHE_PURGED.labels(reason="expired").inc(expired)
+        CACHE_PURGED.labels(reason="capacity").inc(evicted)
+
+    def _disk_invalidate(self, tags: List[str]):
+        with self._disk_lock, self._disk:
+            for tag in tags:
+                self._disk.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache_tags WHERE tag = ?)", (tag,)
+                )
+                # All of each entry's tag rows, not just this tag's
+                self._disk.execute(
+                    "DELETE FROM llm_cache_tags WHERE key IN (SELECT key FROM llm_cache_tags WHERE tag = ?)", (tag,)
+                )
+
+    # ---------- lifecycle ----------
+
+    async def start(self):
+        if self._disk is not None and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._disk_purge)
+            except Exception:
+                logger.exception("Purging the LLM cache file failed")
+            await asyncio.sleep(self.purge_interval)
+
+    # ---------- public API ----------
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._memory_get(key)
+        if entry is not None:
+            CACHE_LOOKUPS.labels(tier="memory", result="hit").inc()
+        elif self._disk is not None:
+            entry = await asyncio.to_thread(self._disk_get, key)
+            if entry is not None and any(tag in self._invalidating for tag in entry.tags):
+                entry = None
+            CACHE_LOOKUPS.labels(tier="disk", result="hit" if entry else "miss").inc()
+            if entry is not None:
+                self._memory_set(key, entry)
+        else:
+            CACHE_LOOKUPS.labels(tier="memory", result="miss").inc()
+        if entry is not None:
+            CACHE_SAVED_SECONDS.inc(entry.latency)
+            CACHE_SAVED_TOKENS.inc(entry.tokens)
+        return entry
+
+    async def set(self, key: str, content: str, latency: float = 0.0, tokens: int = 0,
+                  tags: Iterable[str] = (), ttl: Optional[float] = None):
+        entry = CacheEntry(content=content, expires_at=time.time() + (ttl or self.ttl),
+                           latency=latency, tokens=tokens, tags=list(tags))
+        self._memory_set(key, entry)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk_set, key, entry)
+
+    def invalidate(self, *tags: str):
+        """Drops every entry carrying any of the given tags: from memory now, from disk in a worker thread"""
+        with self._lock:
+            keys = set().union(*(self._tags.get(tag, set()) for tag in tags)) if tags else set()
+            for key in keys:
+                self._drop(key)
+        CACHE_INVALIDATIONS.inc(len(keys))
+        if self._disk is None or not tags:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Scripts without an event loop
+            self._disk_invalidate(list(tags))
+            return
+        for tag in tags:
+            self._invalidating[tag] = self._invalidating.get(tag, 0) + 1
+        task = loop.create_task(asyncio.to_thread(self._disk_invalidate, list(tags)))
+        self._pending.add(task)
+        task.add_done_callback(lambda done: self._invalidated(done, tags))
+
+    def _invalidated(self, task: asyncio.Task, tags: Iterable[str]):
+        self._pending.discard(task)
+        for tag in tags:
+            self._invalidating[tag] -= 1
+            if not self._invalidating[tag]:
+                del self._invalidating[tag]
+
+    def __len__(self) -> int:
+        return len(self._entries)
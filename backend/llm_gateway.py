@@ -0,0 +1,447 @@
+# llm_gateway.py - Async LLM gateway: concurrency limits, deadlines, retries, circuit breaking
+
+import asyncio
+import hashlib
+import os
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from llm_cache import LLMResponseCache, cache_key
+from metrics import Counter, Gauge, Histogram
+
+LLM_REQUESTS = Counter("crm_llm_requests", "LLM completions by model and outcome", ("model", "outcome"))
+LLM_RETRIES = Counter("crm_llm_retries", "LLM attempts retried after a transient failure", ("model",))
+LLM_IN_FLIGHT = Gauge("crm_llm_in_flight", "LLM completions currently awaiting the provider", ("model",))
+LLM_QUEUE_WAIT = Histogram("crm_llm_queue_wait_seconds", "Time spent waiting for a per-model concurrency slot", ("model",))
+LLM_LATENCY = Histogram("crm_llm_latency_seconds", "End-to-end LLM completion latency including retries", ("model",))
+LLM_PROMPT_TOKENS = Counter("crm_llm_prompt_tokens", "Prompt tokens sent, as reported by the provider", ("model",))
+LLM_COMPLETION_TOKENS = Counter("crm_llm_completion_tokens", "Completion tokens generated, as reported by the provider",
+                                ("model",))
+LLM_CACHED_PROMPT_TOKENS = Counter("crm_llm_cached_prompt_tokens", "Prompt tokens served from the provider's prefix cache",
+                                   ("model",))
+LLM_FIRST_TOKEN = Histogram("crm_llm_time_to_first_token_seconds", "Time until a streamed completion's first chunk",
+                            ("model",))
+
+class LLMError(Exception):
+    """Base class for gateway failures surfaced to callers"""
+
+class LLMTimeoutError(LLMError):
+    """The request's deadline expired before the provider answered"""
+
+class LLMQueueTimeoutError(LLMTimeoutError):
+    """No concurrency slot for the model freed up before the deadline; the provider was not called"""
+
+class CircuitOpenError(LLMError):
+    """The model's circuit breaker is open; the call was not attempted"""
+
+class LLMProviderError(LLMError):
+    """The provider call failed and could not be retried, or its retries ran out"""
+
+def make_completion(model: str, content: str, prompt_tokens: int = 0, completion_tokens: int = 0, **extra):
+    """Builds an object shaped like a provider chat completion"""
+    return SimpleNamespace(
+        id=extra.pop("id", None),
+        model=model,
+        choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                 message=SimpleNamespace(role="assistant", content=content, tool_calls=None))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              total_tokens=prompt_tokens + completion_tokens),
+        **extra,
+    )
+
+def make_chunk(model: str, content: Optional[str] = None, tool_calls=None, finish_reason: Optional[str] = None):
+    """Builds an object shaped like a provider streaming chunk"""
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, finish_reason=finish_reason,
+                                 delta=SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls))],
+    )
+
+# ==================== BACKENDS ====================
+
+class GroqBackend:
+    """Forwards completions to Groq through the async client"""
+
+    name = "groq"
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        # The SDK (and its HTTP stack) is imported on the first completion, not at app import
+        if self._client is None:
+            from groq import AsyncGroq
+            # Retries are owned by the gateway, not the SDK
+            self._client = AsyncGroq(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    async def create(self, **kwargs):
+        return await self.client.chat.completions.create(**kwargs)
+
+    async def stream(self, **kwargs) -> AsyncIterator[Any]:
+        response = await self.client.chat.completions.create(stream=True, **kwargs)
+        async for chunk in response:
+            yield chunk
+
+    def is_retryable(self, exc: Exception) -> bool:
+        import groq
+        if isinstance(exc, (groq.APITimeoutError, groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)):
+            return True
+        return isinstance(exc, groq.APIStatusError) and exc.status_code in (408, 409)
+
+class FakeLLMBackend:
+    """Deterministic offline stand-in for load tests and local development.
+
+    Replies are derived from a hash of the request so identical prompts always
+    produce identical completions, after a configurable simulated latency.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: int = 0,
+                 token_latency: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        # Streaming only: latency is time to first token, then one word every token_latency
+        self.token_latency = token_latency
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    async def create(self, model: str, messages: List[Dict[str, Any]], max_tokens: int = 256, **kwargs):
+        prompt, digest, content = await self._reply(model, messages, max_tokens)
+        return make_completion(model, content, max(1, len(prompt) // 4), max(1, len(content) // 4), id=f"fake-{digest}")
+
+    async def stream(self, model: str, messages: List[Dict[str, Any]], max_tokens: int = 256,
+                     **kwargs) -> AsyncIterator[Any]:
+        _, _, content = await self._reply(model, messages, max_tokens)
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            if i and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield make_chunk(model, word if i == 0 else " " + word)
+        yield make_chunk(model, finish_reason="stop")
+
+    async def _reply(self, model: str, messages: List[Dict[str, Any]], max_tokens: int):
+        self.calls += 1
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise ConnectionError("fake backend injected failure")
+
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        digest = hashlib.sha256(f"{model}\n{prompt}".encode()).hexdigest()[:12]
+        last = str(messages[-1].get("content", "")) if messages else ""
+        return prompt, digest, f"[{model}:{digest}] Summary: {' '.join(last.split()[:min(max_tokens, 40)])}"
+
+    def is_retryable(self, exc: Exception) -> bool:
+        return isinstance(exc, ConnectionError)
+
+# ==================== CIRCUIT BREAKER ====================
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one probe through after reset_timeout"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release(self):
+        """Ends a call that says nothing about the provider's health (cancelled, rejected, never sent)"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+# ==================== GATEWAY ====================
+
+def _parse_overrides(raw: str) -> Dict[str, int]:
+    overrides = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        model, _, limit = item.partition("=")
+        overrides[model.strip()] = int(limit)
+    return overrides
+
+class LLMGateway:
+    """Single entry point for chat completions.
+
+    Each model gets its own semaphore and circuit breaker. A call waits for a
+    slot, then retries transient failures with jittered exponential backoff
+    until it succeeds or its deadline expires.
+    """
+
+    def __init__(
+        self,
+        backend,
+        default_concurrency: int = 16,
+        concurrency_overrides: Optional[Dict[str, int]] = None,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        circuit_failures: int = 5,
+        circuit_reset: float = 30.0,
+        cache: Optional[LLMResponseCache] = None,
+    ):
+        self.backend = backend
+        self.cache = cache
+        self.default_concurrency = default_concurrency
+        self.concurrency_overrides = concurrency_overrides or {}
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_failures = circuit_failures
+        self.circuit_reset = circuit_reset
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        if os.getenv("LLM_BACKEND", "groq") == "fake":
+            backend = FakeLLMBackend(latency=float(os.getenv("LLM_FAKE_LATENCY_MS", "0")) / 1000,
+                                     jitter=float(os.getenv("LLM_FAKE_JITTER_MS", "0")) / 1000,
+                                     failure_rate=float(os.getenv("LLM_FAKE_FAILURE_RATE", "0")),
+                                     token_latency=float(os.getenv("LLM_FAKE_TOKEN_LATENCY_MS", "0")) / 1000)
+        else:
+            backend = GroqBackend(api_key=os.getenv("GROQ_API_KEY", "YOUR_GROQ_API_KEY"))
+        return cls(
+            backend,
+            default_concurrency=int(os.getenv("LLM_CONCURRENCY", "16")),
+            concurrency_overrides=_parse_overrides(os.getenv("LLM_CONCURRENCY_OVERRIDES", "")),
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            circuit_failures=int(os.getenv("LLM_CIRCUIT_FAILURES", "5")),
+            circuit_reset=float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30")),
+            cache=LLMResponseCache.from_env() if os.getenv("LLM_CACHE_ENABLED", "true") == "true" else None,
+        )
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.concurrency_overrides.get(model, self.default_concurrency))
+        return self._semaphores[model]
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(self.circuit_failures, self.circuit_reset)
+        return self._breakers[model]
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform over [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def chat(self, model: str, messages: List[Dict[str, Any]], timeout: Optional[float] = None,
+                   cache: bool = False, cache_tags: Iterable[str] = (), **params):
+        """Returns the provider's completion object for one chat request.
+
+        With cache=True the completion is looked up by (model, prompt, params)
+        first and stored afterwards under cache_tags for later invalidation.
+        """
+        if not cache or self.cache is None:
+            return await self._chat(model, messages, timeout, params)
+
+        key = cache_key(model, messages, params)
+        entry = await self.cache.get(key)
+        if entry is not None:
+            return make_completion(model, entry.content, cached=True)
+
+        started = time.perf_counter()
+        response = await self._chat(model, messages, timeout, params)
+        usage = getattr(response, "usage", None)
+        await self.cache.set(
+            key,
+            response.choices[0].message.content,
+            latency=time.perf_counter() - started,
+            tokens=getattr(usage, "total_tokens", 0) or 0,
+            tags=cache_tags,
+        )
+        return response
+
+    async def _chat(self, model, messages, timeout, params):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + (timeout or self.timeout)
+        breaker = self.breaker(model)
+        attempt = 0
+        try:
+            while True:
+                if not breaker.allow():
+                    LLM_REQUESTS.labels(model=model, outcome="circuit_open").inc()
+                    raise CircuitOpenError(f"Circuit open for {model}")
+                try:
+                    response = await self._attempt(model, messages, params, deadline)
+                except (asyncio.CancelledError, LLMQueueTimeoutError) as exc:
+                    # Cancelled or never sent: not the provider's doing, but a half-open probe must be freed
+                    breaker.release()
+                    if isinstance(exc, LLMQueueTimeoutError):
+                        LLM_REQUESTS.labels(model=model, outcome="queue_timeout").inc()
+                    raise
+                except Exception as exc:
+                    retryable = isinstance(exc, asyncio.TimeoutError) or self.backend.is_retryable(exc)
+                    if retryable:
+                        # Only provider-side trouble counts against the breaker, not bad requests
+                        breaker.record_failure()
+                    else:
+                        breaker.release()
+                    pause = self._backoff(attempt)
+                    if not retryable or attempt >= self.max_retries or loop.time() + pause >= deadline:
+                        if isinstance(exc, asyncio.TimeoutError):
+                            LLM_REQUESTS.labels(model=model, outcome="timeout").inc()
+                            raise LLMTimeoutError(f"{model} did not answer within the deadline") from exc
+                        LLM_REQUESTS.labels(model=model, outcome="error").inc()
+                        raise LLMProviderError(f"{model} request failed: {exc!r}") from exc
+                    attempt += 1
+                    LLM_RETRIES.labels(model=model).inc()
+                    await asyncio.sleep(pause)
+                    continue
+                breaker.record_success()
+                LLM_REQUESTS.labels(model=model, outcome="ok").inc()
+                self._record_usage(model, response)
+                return response
+        finally:
+            LLM_LATENCY.labels(model=model).observe(loop.time() - started)
+
+    def _record_usage(self, model: str, response):
+        # Streams report usage on their last chunk: `usage` (OpenAI style) or `x_groq.usage`
+        usage = getattr(response, "usage", None) or getattr(getattr(response, "x_groq", None), "usage", None)
+        if usage is None:
+            return
+        LLM_PROMPT_TOKENS.labels(model=model).inc(getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_COMPLETION_TOKENS.labels(model=model).inc(getattr(usage, "completion_tokens", 0) or 0)
+        details = getattr(usage, "prompt_tokens_details", None)
+        LLM_CACHED_PROMPT_TOKENS.labels(model=model).inc(getattr(details, "cached_tokens", 0) or 0)
+
+    async def _attempt(self, model, messages, params, deadline):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore(model)
+        queued = loop.time()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError as exc:
+            raise LLMQueueTimeoutError(f"No {model} slot freed up within the deadline") from exc
+        LLM_QUEUE_WAIT.labels(model=model).observe(loop.time() - queued)
+        in_flight = LLM_IN_FLIGHT.labels(model=model)
+        in_flight.inc()
+        try:
+            return await asyncio.wait_for(
+                self.backend.create(model=model, messages=messages, **params),
+                max(deadline - loop.time(), 0),
+            )
+        finally:
+            in_flight.dec()
+            semaphore.release()
+
+    async def complete(self, model: str, messages: List[Dict[str, Any]], **params) -> str:
+        """Convenience wrapper returning only the completion text"""
+        response = await self.chat(model, messages, **params)
+        return response.choices[0].message.content
+
+    async def stream(self, model: str, messages: List[Dict[str, Any]], timeout: Optional[float] = None,
+                     **params) -> AsyncIterator[Any]:
+        """Yields the provider's streaming chunks as they arrive.
+
+        Transient failures are retried only until the first chunk has been
+        yielded; after that an error ends the stream. The model's concurrency
+        slot is held until the stream finishes or the consumer stops iterating,
+        and the whole stream shares one deadline.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + (timeout or self.timeout)
+        breaker = self.breaker(model)
+        semaphore = self._semaphore(model)
+        in_flight = LLM_IN_FLIGHT.labels(model=model)
+        attempt = 0
+        try:
+            while True:
+                if not breaker.allow():
+                    LLM_REQUESTS.labels(model=model, outcome="circuit_open").inc()
+                    raise CircuitOpenError(f"Circuit open for {model}")
+                queued = loop.time()
+                try:
+                    await asyncio.wait_for(semaphore.acquire(), max(deadline - loop.time(), 0))
+                except BaseException as exc:
+                    # A local queue that is full (or a cancelled wait) says nothing about the provider
+                    breaker.release()
+                    if isinstance(exc, asyncio.TimeoutError):
+                        LLM_REQUESTS.labels(model=model, outcome="queue_timeout").inc()
+                        raise LLMQueueTimeoutError(f"No {model} slot freed up within the deadline") from exc
+                    raise
+                LLM_QUEUE_WAIT.labels(model=model).observe(loop.time() - queued)
+                in_flight.inc()
+                chunks = self.backend.stream(model=model, messages=messages, **params).__aiter__()
+                first = True
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), max(deadline - loop.time(), 0))
+                        except StopAsyncIteration:
+                            LLM_REQUESTS.labels(model=model, outcome="ok").inc()
+                            return
+                        if first:
+                            first = False
+                            breaker.record_success()
+                            LLM_FIRST_TOKEN.labels(model=model).observe(loop.time() - started)
+                        self._record_usage(model, chunk)
+                        yield chunk
+                except asyncio.CancelledError:
+                    if first:
+                        breaker.release()
+                    raise
+                except Exception as exc:
+                    retryable = isinstance(exc, asyncio.TimeoutError) or self.backend.is_retryable(exc)
+                    if not first:
+                        retryable = False
+                    elif retryable:
+                        breaker.record_failure()
+                    else:
+                        breaker.release()
+                    pause = self._backoff(attempt)
+                    if not retryable or attempt >= self.max_retries or loop.time() + pause >= deadline:
+                        if isinstance(exc, asyncio.TimeoutError):
+                            LLM_REQUESTS.labels(model=model, outcome="timeout").inc()
+                            raise LLMTimeoutError(f"{model} did not finish within the deadline") from exc
+                        LLM_REQUESTS.labels(model=model, outcome="error").inc()
+                        raise LLMProviderError(f"{model} stream failed: {exc!r}") from exc
+                finally:
+                    in_flight.dec()
+                    semaphore.release()
+                    await chunks.aclose()
+                attempt += 1
+                LLM_RETRIES.labels(model=model).inc()
+                await asyncio.sleep(pause)
+        finally:
+            LLM_LATENCY.labels(model=model).observe(loop.time() - started)
@@ -0,0 +1,187 @@
+# metrics.py - Minimal Prometheus-format metrics registry
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+        REGISTRY.register(self)
+
+    def labels(self, **labels: str):
+        """Returns the child series for one label combination, creating it on first use"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _series(self):
+        """Yields (label_pairs, child) for every series of this metric"""
+        if not self.labelnames:
+            yield (), self
+            return
+        for key, child in list(self._children.items()):
+            yield tuple(zip(self.labelnames, key)), child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for pairs, child in self._series():
+            lines.extend(child._samples(self.name, pairs))
+        return lines
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self._value = 0.0
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        child = Counter.__new__(Counter)
+        child._value = 0.0
+        child._lock = threading.Lock()
+        return child
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def _samples(self, name, pairs):
+        return [f"{name}_total{_format_labels(pairs)} {self._value}"]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        child = Gauge.__new__(Gauge)
+        child._value = 0.0
+        child._function = None
+        child._lock = threading.Lock()
+        return child
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Computes the value at scrape time instead of storing it"""
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        return float(self._function()) if self._function else self._value
+
+    def _samples(self, name, pairs):
+        return [f"{name}{_format_labels(pairs)} {self.value}"]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        self._init_state()
+        super().__init__(name, documentation, labelnames)
+
+    def _init_state(self):
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def _new_child(self):
+        child = Histogram.__new__(Histogram)
+        child._buckets = self._buckets
+        child._lock = threading.Lock()
+        child._init_state()
+        return child
+
+    def observe(self, value: float):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def _samples(self, name, pairs):
+        lines, cumulative = [], 0
+        for bound, count in zip(self._buckets + (float("inf"),), self._counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_format_labels(pairs + (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(pairs)} {self._sum}")
+        lines.append(f"{name}_count{_format_labels(pairs)} {self._count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+def render_latest() -> str:
+    """Renders every registered metric in the Prometheus text exposition format"""
+    return REGISTRY.render()
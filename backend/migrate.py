@@ -0,0 +1,26 @@
+# migrate.py - Schema setup as its own step: tables, indexes and the Postgres search DDL (idempotent)
+
+import time
+
+from database import Base, engine
+from hcp_search import install_postgres_search
+from models import HCP
+from partitions import install_postgres_partitions
+
+def migrate(bind=engine):
+    """Creates missing tables and indexes; safe to run on every deploy"""
+    postgres = bind.dialect.name == "postgresql"
+    with bind.begin() as connection:
+        if postgres:
+            # interactions is created partitioned (partitions.py) before create_all would make it a plain table
+            Base.metadata.create_all(bind=connection, tables=[HCP.__table__])
+            install_postgres_partitions(connection)
+        Base.metadata.create_all(bind=connection)
+        if postgres:
+            install_postgres_search(connection)
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    migrate()
+    print(f"Schema up to date on {engine.url.render_as_string(hide_password=True)} "
+          f"({time.perf_counter() - start:.2f}s)")
@@ -0,0 +1,76 @@
+# models.py - SQLAlchemy ORM models
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey, Index
+
+from database import Base
+
+class HCP(Base):
+    __tablename__ = "hcps"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, index=True)
+    specialty = Column(String)
+    hospital = Column(String)
+    email = Column(String)
+    phone = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Interaction(Base):
+    __tablename__ = "interactions"
+    id = Column(Integer, primary_key=True, index=True)
+    hcp_id = Column(Integer, ForeignKey("hcps.id"))
+    interaction_type = Column(String)
+    notes = Column(Text)
+    products_discussed = Column(String, nullable=True)
+    follow_up_required = Column(Boolean, default=False)
+    followup_date = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Keyset pagination walks (created_at, id) newest first
+    __table_args__ = (
+        Index("idx_interactions_created_at_id", created_at.desc(), id.desc()),
+        # Open follow-ups only, in due order: the due listing and the reminder scheduler read ranges of it.
+        # Each predicate is written the way that dialect renders a bare boolean filter, so queries match it.
+        Index("idx_interactions_followup_due", followup_date, id,
+              postgresql_where=follow_up_required, sqlite_where=follow_up_required == 1),
+        # Archival deletes rows (partitions.py); SQLite would otherwise hand the highest deleted ids out again
+        {"sqlite_autoincrement": True},
+    )
+
+class HCPInsightSnapshot(Base):
+    __tablename__ = "hcp_insight_snapshots"
+    hcp_id = Column(Integer, ForeignKey("hcps.id", ondelete="CASCADE"), primary_key=True)
+    insights = Column(Text)
+    # Fingerprint of the interactions the insights were generated from
+    fingerprint = Column(String)
+    generated_at = Column(DateTime, default=datetime.utcnow)
+
+class FollowupReminder(Base):
+    """One row per reminder sent (followups.py); a rescheduled follow-up gets a new row"""
+    __tablename__ = "followup_reminders"
+    # No foreign key, on any backend: a partitioned interactions table (Postgres) has no unique id to
+    # reference, so deleting or archiving an interaction removes its reminders explicitly
+    interaction_id = Column(Integer, primary_key=True)
+    followup_date = Column(DateTime, primary_key=True)
+    sent_at = Column(DateTime, default=datetime.utcnow)
+
+class HCPScore(Base):
+    """Nightly territory scoring output (scoring.py), rewritten in full by each run"""
+    __tablename__ = "hcp_scores"
+    hcp_id = Column(Integer, ForeignKey("hcps.id", ondelete="CASCADE"), primary_key=True)
+    # Sum of type-weighted interactions, halved every half-life
+    score = Column(Float)
+    interactions = Column(Integer)
+    days_since_last_contact = Column(Float, nullable=True)
+    overdue_followups = Column(Integer)
+    flagged = Column(Boolean, default=False)
+    priority = Column(Float)
+    # LLM review, only for the top flagged HCPs
+    review = Column(Text, nullable=True)
+    scored_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("idx_hcp_scores_flagged_priority", flagged, priority.desc()),
+    )
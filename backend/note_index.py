@@ -0,0 +1,414 @@
+# note_index.py - Semantic search over interaction notes: local embeddings in a memory-mapped float32 matrix
+"""
+Every interaction's notes (which carry the AI summary the log tool appends)
+and products are embedded on the CPU and stored in NOTE_INDEX_DIR:
+
+    vectors.f32   float32 [capacity, dim], unit-length rows
+    ids.i64       interaction id per row; 0 marks a replaced or deleted row
+    hcps.i64      HCP id per row, for per-HCP searches
+    header.i64    [rows used, capacity, sync watermark]
+    meta.json     embedder name and dimension; a mismatch rebuilds the index
+
+Writes append rows under a file lock, so the workers of one host share one
+index. A re-embedded interaction gets a new row and its old one is zeroed.
+Readers take no lock: a row counts once the header's row count covers it.
+A search embeds its queries and scores them against the matrix
+CHUNK_ROWS rows at a time (one matrix product per chunk), keeping the
+running top k per query.
+
+Embedders:
+- hashing (default): signed feature hashing of word stems and stem bigrams.
+  No model download, and identical in every process.
+- sentence-transformers: NOTE_EMBEDDER=sentence-transformers with the package
+  installed (NOTE_EMBEDDING_MODEL, a small CPU model by default).
+
+On startup the index embeds whatever changed since its watermark, all of
+history the first time, in the background. Until that is done, searches
+report that the index isn't ready. Rows deleted while the server was down
+are dropped when a search finds them missing from the database.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+
+from metrics import Gauge, Histogram
+from models import Interaction
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process per index directory
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+NOTE_INDEX_ROWS = Gauge("crm_note_index_rows", "Interaction vectors in the note index (live and replaced)")
+NOTE_EMBED_SECONDS = Histogram(
+    "crm_note_embed_seconds", "Time to embed one batch of notes or queries",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+CHUNK_ROWS = 65_536
+# header.i64 slots
+COUNT, CAPACITY, SYNCED = 0, 1, 2
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be been but by did do for from had has have he her his i in into is it its me my no not "
+    "of on or our she so that the their them they this to up was we were what when which who will with you".split()
+)
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+def note_text(notes: Optional[str], products: Optional[str]) -> str:
+    """What gets embedded for one interaction"""
+    return f"{notes or ''}\nProducts: {products}" if products else notes or ""
+
+class HashingEmbedder:
+    """Signed feature hashing of word stems and stem bigrams into `dim` buckets (power of two)"""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            stems = [_stem(w) for w in _WORD.findall((text or "").lower()) if w not in STOP_WORDS]
+            features = stems + [f"{a} {b}" for a, b in zip(stems, stems[1:])]
+            if not features:
+                continue
+            # crc32, not hash(): str hashes differ per process and the vectors are persisted
+            hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+            out[row] = np.bincount(hashes & (self.dim - 1), weights=signs, minlength=self.dim)
+        # Sublinear term frequency, then unit length so a dot product is the cosine
+        np.copysign(np.log1p(np.abs(out)), out, out=out)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+class SentenceTransformerEmbedder:
+    """A local sentence-transformers model on the CPU"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return self.model.encode(list(texts), batch_size=64, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32, copy=False)
+
+def embedder_from_env():
+    if os.getenv("NOTE_EMBEDDER", "hashing") == "sentence-transformers":
+        try:
+            return SentenceTransformerEmbedder(os.getenv("NOTE_EMBEDDING_MODEL",
+                                                         "sentence-transformers/all-MiniLM-L6-v2"))
+        except ImportError:
+            logger.warning("NOTE_EMBEDDER=sentence-transformers but it is not installed; using hashed features")
+    return HashingEmbedder(int(os.getenv("NOTE_EMBEDDING_DIM", "512")))
+
+class VectorStore:
+    """Append-only memory-mapped rows of (vector, interaction id, HCP id), shared by the processes of one host"""
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self._capacity = -1
+        self._thread_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        header = os.path.join(directory, "header.i64")
+        if not os.path.exists(header):
+            np.zeros(3, dtype=np.int64).tofile(header)
+        self._header = np.memmap(header, dtype=np.int64, mode="r+", shape=(3,))
+        self._remap()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _remap(self):
+        """Maps the files again after another process (or this one) grew them"""
+        capacity = int(self._header[CAPACITY])
+        if capacity == self._capacity:
+            return
+        if capacity == 0:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._ids = np.zeros(0, dtype=np.int64)
+            self._hcps = np.zeros(0, dtype=np.int64)
+        else:
+            self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+",
+                                      shape=(capacity, self.dim))
+            self._ids = np.memmap(self._path("ids.i64"), dtype=np.int64, mode="r+", shape=(capacity,))
+            self._hcps = np.memmap(self._path("hcps.i64"), dtype=np.int64, mode="r+", shape=(capacity,))
+        self._capacity = capacity
+
+    @contextmanager
+    def locked(self):
+        with self._thread_lock, open(self._path("lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._remap()
+            yield
+
+    def __len__(self) -> int:
+        return int(self._header[COUNT])
+
+    @property
+    def synced(self) -> int:
+        return int(self._header[SYNCED])
+
+    @synced.setter
+    def synced(self, value: int):
+        self._header[SYNCED] = value
+
+    def _grow(self, needed: int):
+        capacity = max(needed, 2 * self._capacity, 4096)
+        for name, width in (("vectors.f32", 4 * self.dim), ("ids.i64", 8), ("hcps.i64", 8)):
+            with open(self._path(name), "ab") as f:
+                f.truncate(capacity * width)
+        self._header[CAPACITY] = capacity
+        self._remap()
+
+    def _kill(self, ids: np.ndarray):
+        count = len(self)
+        stale = np.flatnonzero(np.isin(self._ids[:count], ids))
+        self._ids[stale] = 0
+
+    def upsert(self, ids: np.ndarray, hcp_ids: np.ndarray, vectors: np.ndarray):
+        with self.locked():
+            self._kill(ids)
+            count, n = len(self), len(ids)
+            if count + n > self._capacity:
+                self._grow(count + n)
+            self._vectors[count:count + n] = vectors
+            self._hcps[count:count + n] = hcp_ids
+            self._ids[count:count + n] = ids
+            # Published last: readers only look at rows below the count
+            self._header[COUNT] = count + n
+
+    def delete(self, ids: Sequence[int]):
+        with self.locked():
+            self._kill(np.asarray(ids, dtype=np.int64))
+
+    def compact(self) -> int:
+        """Drops replaced and deleted rows; returns how many"""
+        with self.locked():
+            count = len(self)
+            live = np.flatnonzero(self._ids[:count] != 0)
+            for start in range(0, len(live), CHUNK_ROWS):
+                rows = live[start:start + CHUNK_ROWS]
+                target = slice(start, start + len(rows))
+                self._vectors[target], self._ids[target], self._hcps[target] = (
+                    self._vectors[rows], self._ids[rows], self._hcps[rows])
+            self._header[COUNT] = len(live)
+            return count - len(live)
+
+    def dead(self) -> int:
+        return int(np.count_nonzero(self._ids[:len(self)] == 0))
+
+    def search(self, queries: np.ndarray, k: int, hcp_id: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k (interaction id, cosine) per query row, best first"""
+        count = len(self)
+        self._remap()
+        m = len(queries)
+        best_ids = np.zeros((m, 0), dtype=np.int64)
+        best_scores = np.zeros((m, 0), dtype=np.float32)
+        if hcp_id is not None:
+            # A per-HCP search scores only that HCP's rows
+            rows = np.flatnonzero((self._hcps[:count] == hcp_id) & (self._ids[:count] != 0))
+            chunks = [(self._vectors[rows], self._ids[rows])]
+        else:
+            chunks = ((self._vectors[s:s + CHUNK_ROWS], self._ids[s:min(s + CHUNK_ROWS, count)])
+                      for s in range(0, count, CHUNK_ROWS))
+        for vectors, ids in chunks:
+            vectors = vectors[:len(ids)]
+            scores = queries @ vectors.T
+            scores[:, ids == 0] = -np.inf
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                chunk_ids = ids[top]
+            else:
+                chunk_ids = np.broadcast_to(ids, scores.shape)
+            best_ids = np.concatenate([best_ids, chunk_ids], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        results = []
+        for ids, scores in zip(best_ids, best_scores):
+            order = np.argsort(-scores)
+            results.append([(int(ids[i]), float(scores[i])) for i in order if scores[i] > 0])
+        return results
+
+class NoteIndex:
+    """Embeds interaction notes as they are written and answers top-k semantic searches"""
+
+    def __init__(self, engine, directory: str, batch_size: int = 256, retry_delay: float = 30.0):
+        self.engine = engine
+        self.directory = directory
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.embedder = None
+        self.store: Optional[VectorStore] = None
+        # interaction id -> (hcp id, text) to embed, or None to delete; applied in the background
+        self._pending: Dict[int, Optional[Tuple[Optional[int], str]]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, engine) -> "NoteIndex":
+        return cls(engine, os.getenv("NOTE_INDEX_DIR", "note_index"),
+                   batch_size=int(os.getenv("NOTE_INDEX_BATCH_SIZE", "256")))
+
+    @property
+    def ready(self) -> bool:
+        return self.store is not None
+
+    # ---------- writes ----------
+
+    def saved(self, interaction_id: int, hcp_id: Optional[int], notes: Optional[str], products: Optional[str]):
+        self._pending[interaction_id] = (hcp_id, note_text(notes, products))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def deleted(self, interaction_id: int):
+        self._pending[interaction_id] = None
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        start = time.perf_counter()
+        vectors = self.embedder.embed(texts)
+        NOTE_EMBED_SECONDS.observe(time.perf_counter() - start)
+        return vectors
+
+    def write(self, rows: Sequence[Tuple[int, Optional[int], str]], deleted: Sequence[int] = ()):
+        """Embeds and stores (interaction id, hcp id, text) rows; blocking"""
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            self.store.upsert(np.array([r[0] for r in batch], dtype=np.int64),
+                              np.array([r[1] or 0 for r in batch], dtype=np.int64),
+                              self._embed([r[2] for r in batch]))
+        if deleted:
+            self.store.delete(deleted)
+        NOTE_INDEX_ROWS.set(len(self.store))
+
+    # ---------- startup ----------
+
+    def open(self):
+        """Creates the embedder and maps the index, starting over if the embedder changed; blocking"""
+        embedder = embedder_from_env()
+        meta = {"embedder": embedder.name, "dim": embedder.dim}
+        meta_path = os.path.join(self.directory, "meta.json")
+        try:
+            with open(meta_path) as f:
+                current = json.load(f)
+        except (OSError, ValueError):
+            current = None
+        if current != meta:
+            if current is not None:
+                logger.info("Note index was built with %s; re-embedding every interaction with %s",
+                            current.get("embedder"), embedder.name)
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory)
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+        self.embedder = embedder
+        return VectorStore(self.directory, embedder.dim)
+
+    def sync(self, store: VectorStore) -> int:
+        """Embeds interactions changed since the store's watermark (all of them the first time); blocking"""
+        changed = func.coalesce(Interaction.updated_at, Interaction.created_at)
+        stmt = select(Interaction.id, Interaction.hcp_id, Interaction.notes, Interaction.products_discussed, changed)
+        if store.synced:
+            stmt = stmt.where(changed >= datetime.utcfromtimestamp(store.synced / 1e6))
+        started = int(time.time() * 1e6)
+        embedded = 0
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=self.batch_size * 8).execute(stmt)
+            for partition in result.partitions():
+                rows = [(i, hcp_id, note_text(notes, products)) for i, hcp_id, notes, products, _ in partition]
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start:start + self.batch_size]
+                    store.upsert(np.array([r[0] for r in batch], dtype=np.int64),
+                                 np.array([r[1] or 0 for r in batch], dtype=np.int64),
+                                 self._embed([r[2] for r in batch]))
+                embedded += len(rows)
+        # Writes from here on arrive through saved()/deleted(); a minute's margin covers clock skew
+        with store.locked():
+            store.synced = max(store.synced, started - 60_000_000)
+        if store.dead() > len(store) // 2:
+            logger.info("Compacted the note index: %d replaced rows dropped", store.compact())
+        NOTE_INDEX_ROWS.set(len(store))
+        return embedded
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while self.store is None:
+            try:
+                started = time.perf_counter()
+                store = await asyncio.to_thread(self.open)
+                embedded = await asyncio.to_thread(self.sync, store)
+                self.store = store
+                logger.info("Note index ready: %d interactions embedded in %.1fs, %d rows",
+                            embedded, time.perf_counter() - started, len(store))
+            except Exception:
+                logger.exception("Opening the note index failed; retrying in %.0fs", self.retry_delay)
+                await asyncio.sleep(self.retry_delay)
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            pending, self._pending = self._pending, {}
+            rows = [(i, entry[0], entry[1]) for i, entry in pending.items() if entry is not None]
+            deleted = [i for i, entry in pending.items() if entry is None]
+            try:
+                await asyncio.to_thread(self.write, rows, deleted)
+            except Exception:
+                logger.exception("Updating the note index failed for %d interactions; retrying in %.0fs",
+                                 len(pending), self.retry_delay)
+                # Anything written since is newer than what failed
+                for interaction_id, entry in pending.items():
+                    self._pending.setdefault(interaction_id, entry)
+                await asyncio.sleep(self.retry_delay)
+                self._wakeup.set()
+
+    # ---------- reads ----------
+
+    def search(self, queries: Sequence[str], k: int = 10,
+               hcp_id: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k (interaction id, cosine) per query, best first; blocking"""
+        if not queries:
+            return []
+        return self.store.search(self._embed(queries), k, hcp_id)
@@ -0,0 +1,353 @@
+# partitions.py - Monthly interaction partitions on Postgres, and archival of cold months to Parquet
+"""
+On Postgres, interactions is range-partitioned by created_at, one partition
+per calendar month (interactions_pYYYYMM), plus interactions_default for
+rows of months that have no partition yet. Queries that filter on created_at
+read only the matching months; newest-first listings read the newest
+partitions' indexes first.
+
+Postgres requires the partition key in every unique constraint, so the table's
+primary key is (id, created_at). That has two effects:
+- followup_reminders cannot reference interactions(id) with a foreign key
+  (models.FollowupReminder declares none either). Deleting an interaction
+  removes its reminders in the same transaction, and so does archival.
+- Looking up one id checks the primary-key index of every partition.
+
+PartitionMaintainer runs in the app, at most one at a time per database
+(advisory lock). Each pass:
+1. Creates partitions for the next PARTITION_MONTHS_AHEAD months.
+2. Gives every month with rows in the default partition its own partition.
+3. Moves months older than INTERACTIONS_HOT_MONTHS into the Parquet archive
+   (archive.py) and removes them from the database.
+
+SQLite (the local stand-in) keeps one table. Its (created_at, id) index
+already bounds hot range queries, and archival works the same way there.
+
+Usage (from backend/):
+    python partitions.py               # one maintenance pass
+    python partitions.py --convert     # Postgres: move an existing plain table into partitions
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Callable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, text
+
+from archive import COLUMNS, InteractionArchive, add_months, month_start
+from metrics import Counter, Gauge
+from models import FollowupReminder, Interaction
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_ROWS = Counter("crm_archived_interactions", "Interactions moved to the Parquet archive")
+HOT_PARTITIONS = Gauge("crm_interaction_partitions", "Monthly interaction partitions in the database")
+
+# Any constant: one maintenance pass at a time across workers
+ADVISORY_LOCK = 7_305_001
+# Archived rows handed to on_archived per call
+ON_ARCHIVED_SLICE = 5_000
+
+# Columns and indexes mirror models.Interaction; the primary key has to include the partition key
+POSTGRES_DDL = [
+    """
+    CREATE TABLE interactions (
+        id SERIAL,
+        hcp_id INTEGER REFERENCES hcps(id) ON DELETE CASCADE,
+        interaction_type VARCHAR,
+        notes TEXT,
+        products_discussed VARCHAR,
+        follow_up_required BOOLEAN DEFAULT FALSE,
+        followup_date TIMESTAMP WITHOUT TIME ZONE,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (now() AT TIME ZONE 'utc'),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    "CREATE TABLE interactions_default PARTITION OF interactions DEFAULT",
+    "CREATE INDEX IF NOT EXISTS idx_interactions_created_at_id ON interactions (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_interactions_hcp_id ON interactions (hcp_id)",
+    "CREATE INDEX IF NOT EXISTS idx_interactions_followup_due ON interactions (followup_date, id) "
+    "WHERE follow_up_required",
+    # Without the foreign key to interactions(id), which a partitioned table can't offer
+    """
+    CREATE TABLE IF NOT EXISTS followup_reminders (
+        interaction_id INTEGER,
+        followup_date TIMESTAMP WITHOUT TIME ZONE,
+        sent_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (interaction_id, followup_date)
+    )
+    """,
+]
+
+def partition_name(month: datetime) -> str:
+    return f"interactions_p{month:%Y%m}"
+
+def _literal(value: datetime) -> str:
+    # Partition bounds are DDL, which takes no bind parameters; the value is always a datetime
+    return f"'{value:%Y-%m-%d %H:%M:%S}'"
+
+def table_kind(connection) -> Optional[str]:
+    """'p' for a partitioned interactions table, 'r' for a plain one, None if there is none"""
+    return connection.execute(text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('interactions')"
+    )).scalar()
+
+def partitions(connection) -> Set[datetime]:
+    """Months that have their own partition"""
+    names = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'interactions'::regclass"
+    )).scalars()
+    return {datetime.strptime(name, "interactions_p%Y%m") for name in names if name != "interactions_default"}
+
+def create_partition(connection, month: datetime):
+    """Adds a month's partition, moving in whatever rows of that month sit in the default partition"""
+    name, start, end = partition_name(month), _literal(month), _literal(add_months(month, 1))
+    # Held to commit: a row inserted into the default partition between the move and the ATTACH would
+    # fail the ATTACH's check that the default holds nothing of the new month
+    connection.execute(text("LOCK TABLE interactions IN SHARE ROW EXCLUSIVE MODE"))
+    connection.execute(text(f"CREATE TABLE {name} (LIKE interactions INCLUDING DEFAULTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM interactions_default WHERE created_at >= {start} AND created_at < {end} "
+        f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+    ))
+    connection.execute(text(f"ALTER TABLE interactions ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})"))
+
+def ensure_partitions(connection, now: datetime, months_ahead: int, hot_months: int = 0) -> List[datetime]:
+    """Creates this month's and the next `months_ahead` partitions, and one for every hot month found in the
+    default partition; returns the months created"""
+    existing = partitions(connection)
+    wanted = {add_months(month_start(now), i) for i in range(months_ahead + 1)}
+    stray = connection.execute(text(
+        "SELECT DISTINCT date_trunc('month', created_at) FROM interactions_default"
+    )).scalars()
+    # Cold months stay in the default partition until archival takes them
+    cutoff = add_months(month_start(now), -hot_months) if hot_months else None
+    wanted.update(month for month in stray if cutoff is None or month >= cutoff)
+    created = sorted(wanted - existing)
+    for month in created:
+        create_partition(connection, month)
+    HOT_PARTITIONS.set(len(existing) + len(created))
+    return created
+
+def install_postgres_partitions(connection, now: Optional[datetime] = None, months_ahead: int = 3):
+    """Creates the partitioned interactions table if there is none yet (run by migrate.py before create_all)"""
+    kind = table_kind(connection)
+    if kind == "r":
+        logger.warning("interactions is a plain table; run `python partitions.py --convert` to partition it")
+        return
+    if kind is None:
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+    ensure_partitions(connection, now or datetime.utcnow(), months_ahead)
+
+def convert_to_partitions(connection, now: Optional[datetime] = None, months_ahead: int = 3) -> int:
+    """Copies a plain interactions table into the partitioned layout, in one transaction; returns the rows"""
+    if table_kind(connection) != "r":
+        return 0
+    connection.execute(text("ALTER TABLE followup_reminders DROP CONSTRAINT IF EXISTS "
+                            "followup_reminders_interaction_id_fkey"))
+    connection.execute(text("ALTER TABLE interactions RENAME TO interactions_unpartitioned"))
+    for index in ("idx_interactions_created_at_id", "idx_interactions_created_at", "idx_interactions_hcp_id",
+                  "idx_interactions_followup_due", "ix_interactions_id"):
+        connection.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    for statement in POSTGRES_DDL:
+        connection.execute(text(statement))
+    now = now or datetime.utcnow()
+    oldest = connection.execute(text("SELECT min(created_at) FROM interactions_unpartitioned")).scalar()
+    month = month_start(oldest or now)
+    while month <= add_months(month_start(now), months_ahead):
+        create_partition(connection, month)
+        month = add_months(month, 1)
+    # created_at is now NOT NULL; rows without one take their updated_at, or the conversion time
+    rows = connection.execute(text(
+        f"INSERT INTO interactions ({', '.join(COLUMNS)}) SELECT id, hcp_id, interaction_type, notes, "
+        f"products_discussed, follow_up_required, followup_date, "
+        f"coalesce(created_at, updated_at, now() AT TIME ZONE 'utc'), updated_at FROM interactions_unpartitioned"
+    )).rowcount
+    connection.execute(text(
+        "SELECT setval(pg_get_serial_sequence('interactions', 'id'), "
+        "coalesce((SELECT max(id) FROM interactions), 0) + 1, false)"
+    ))
+    connection.execute(text("DROP TABLE interactions_unpartitioned"))
+    return rows
+
+def archive_month(connection, archive: InteractionArchive, month: datetime, partitioned: bool,
+                  archived: Optional[List[Tuple[int, Optional[int]]]] = None) -> int:
+    """Writes one month's rows to the archive and removes them from the database; returns the rows moved.
+
+    With `archived`, the (id, hcp_id) of every row moved are appended to it.
+
+    The file is written before the delete commits: a failure in between
+    leaves rows in both places, and the next run archives them again over
+    the same ids instead of losing them.
+    """
+    start, end = month, add_months(month, 1)
+    in_month = (Interaction.created_at >= start) & (Interaction.created_at < end)
+    name = partition_name(month)
+    has_partition = partitioned and month in partitions(connection)
+    if partitioned:
+        # Writes to the month wait until it is gone; reads carry on
+        tables = [name, "interactions_default"] if has_partition else ["interactions_default"]
+        connection.execute(text(f"LOCK TABLE {', '.join(tables)} IN SHARE MODE"))
+    result = connection.execution_options(stream_results=True, yield_per=50_000).execute(
+        select(*[getattr(Interaction, c) for c in COLUMNS]).where(in_month)
+        .order_by(Interaction.created_at.desc(), Interaction.id.desc())
+    )
+    newest_id = None
+    moved: List[Tuple[int, Optional[int]]] = []
+
+    def batches():
+        nonlocal newest_id
+        for partition in result.partitions():
+            newest_id = max(newest_id or 0, max(row[0] for row in partition))
+            moved.extend((row[0], row[1]) for row in partition)
+            yield [tuple(row) for row in partition]
+    rows = archive.write(month, batches())
+    if not rows:
+        return 0
+    if has_partition:
+        connection.execute(text(f"DROP TABLE {name}"))
+    # Only what was exported: on SQLite a row written to the month since the read stays for the next run
+    exported = in_month & (Interaction.id <= newest_id)
+    connection.execute(FollowupReminder.__table__.delete().where(
+        FollowupReminder.interaction_id.in_(select(Interaction.id).where(exported))))
+    connection.execute(Interaction.__table__.delete().where(exported))
+    if archived is not None:
+        archived.extend(moved)
+    return rows
+
+def archive_cold_months(connection, archive: InteractionArchive, now: datetime, hot_months: int,
+                        archived: Optional[List[Tuple[int, Optional[int]]]] = None) -> int:
+    """Archives every month older than the hot window, oldest first; returns the rows moved (see archive_month)"""
+    cutoff = add_months(month_start(now), -hot_months)
+    partitioned = connection.dialect.name == "postgresql" and table_kind(connection) == "p"
+    moved = 0
+    while True:
+        oldest = connection.execute(select(Interaction.created_at).where(Interaction.created_at < cutoff)
+                                    .order_by(Interaction.created_at).limit(1)).scalar()
+        if oldest is None:
+            break
+        month: List[Tuple[int, Optional[int]]] = []
+        rows = archive_month(connection, archive, month_start(oldest), partitioned, month)
+        connection.commit()
+        # Reported only once the delete has committed
+        if archived is not None:
+            archived.extend(month)
+        if not rows:
+            break
+        logger.info("Archived %d interactions from %s", rows, f"{oldest:%Y-%m}")
+        ARCHIVED_ROWS.inc(rows)
+        moved += rows
+    return moved
+
+class PartitionMaintainer:
+    """Periodic partition creation and archival, off the event loop on the sync engine"""
+
+    def __init__(self, engine, archive: InteractionArchive, hot_months: int = 0, months_ahead: int = 3,
+                 interval: float = 86400.0,
+                 on_archived: Optional[Callable[[List[Tuple[int, Optional[int]]]], None]] = None):
+        self.engine = engine
+        self.archive = archive
+        # 0 keeps every month in the database
+        self.hot_months = hot_months
+        self.months_ahead = months_ahead
+        self.interval = interval
+        # Gets the (id, hcp_id) of archived rows on the event loop, in slices, to update in-memory state
+        self.on_archived = on_archived
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, engine, archive: InteractionArchive,
+                 on_archived: Optional[Callable[[List[Tuple[int, Optional[int]]]], None]] = None,
+                 ) -> "PartitionMaintainer":
+        return cls(
+            engine,
+            archive,
+            hot_months=int(os.getenv("INTERACTIONS_HOT_MONTHS", "0")),
+            months_ahead=int(os.getenv("PARTITION_MONTHS_AHEAD", "3")),
+            interval=float(os.getenv("PARTITION_CHECK_HOURS", "24")) * 3600,
+            on_archived=on_archived,
+        )
+
+    def run_once(self, now: Optional[datetime] = None,
+                 archived: Optional[List[Tuple[int, Optional[int]]]] = None) -> int:
+        """One maintenance pass; returns the rows archived (0 if another worker holds the lock)"""
+        now = now or datetime.utcnow()
+        with self.engine.connect() as connection:
+            postgres = connection.dialect.name == "postgresql"
+            if postgres:
+                if not connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK}).scalar():
+                    return 0
+            try:
+                if postgres and table_kind(connection) == "p":
+                    created = ensure_partitions(connection, now, self.months_ahead, self.hot_months)
+                    connection.commit()
+                    if created:
+                        logger.info("Created interaction partitions: %s",
+                                    ", ".join(partition_name(month) for month in created))
+                if not self.hot_months:
+                    return 0
+                return archive_cold_months(connection, self.archive, now, self.hot_months, archived)
+            finally:
+                if postgres:
+                    connection.rollback()
+                    connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK})
+                    connection.commit()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            archived: List[Tuple[int, Optional[int]]] = []
+            try:
+                await asyncio.to_thread(self.run_once, None, archived)
+            except Exception:
+                logger.exception("Interaction partition maintenance failed")
+            # Months committed before a failure have left the database all the same
+            if self.on_archived is not None:
+                for start in range(0, len(archived), ON_ARCHIVED_SLICE):
+                    try:
+                        self.on_archived(archived[start:start + ON_ARCHIVED_SLICE])
+                    except Exception:
+                        logger.exception("Handling %d archived interactions failed", len(archived))
+                        break
+                    # A month can be a lot of rows; let requests run in between
+                    await asyncio.sleep(0)
+            await asyncio.sleep(self.interval)
+
+def main(args):
+    from database import engine
+    maintainer = PartitionMaintainer.from_env(engine, InteractionArchive.from_env())
+    if args.hot_months is not None:
+        maintainer.hot_months = args.hot_months
+    if args.convert:
+        if engine.dialect.name != "postgresql":
+            raise SystemExit("--convert is for Postgres; SQLite keeps a single interactions table")
+        with engine.begin() as connection:
+            rows = convert_to_partitions(connection, months_ahead=maintainer.months_ahead)
+        print(f"Moved {rows:,} interactions into monthly partitions")
+    moved = maintainer.run_once()
+    print(f"Archived {moved:,} interactions older than {maintainer.hot_months} months to {maintainer.archive.directory}"
+          if maintainer.hot_months else "Partitions up to date (INTERACTIONS_HOT_MONTHS=0: nothing is archived)")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--convert", action="store_true", help="Partition an existing plain interactions table")
+    parser.add_argument("--hot-months", type=int, help="Override INTERACTIONS_HOT_MONTHS for this run")
+    main(parser.parse_args())
@@ -0,0 +1,95 @@
+# prompts.py - Prompt registry: templates compiled once, static instructions first
+
+from string import Formatter
+from typing import Dict, List, Tuple
+
+from metrics import Histogram
+from tokens import MESSAGE_OVERHEAD, count_tokens
+
+PROMPT_TOKENS = Histogram(
+    "crm_prompt_tokens", "Prompt tokens per rendered template", ("prompt",),
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000),
+)
+
+class PromptTemplate:
+    """A prompt as a static system message followed by a per-call user message.
+
+    The system part never changes between calls, so the provider can reuse
+    its cached prefix; everything that varies goes in the user part, after
+    it. The user template is parsed once here rather than on every call.
+    """
+
+    def __init__(self, name: str, system: str, user: str):
+        self.name = name
+        self.system = system
+        self._system_tokens = None
+        self._parts: List[Tuple[str, str]] = [
+            (literal, field or "") for literal, field, _, _ in Formatter().parse(user)
+        ]
+        self.fields = {field for _, field in self._parts if field}
+
+    def render(self, **values) -> List[Dict[str, str]]:
+        user = "".join(literal + (str(values[field]) if field else "") for literal, field in self._parts)
+        if self._system_tokens is None:
+            # Counted on first use so importing this module never loads the tokenizer
+            self._system_tokens = MESSAGE_OVERHEAD + count_tokens(self.system)
+        PROMPT_TOKENS.labels(prompt=self.name).observe(self._system_tokens + MESSAGE_OVERHEAD + count_tokens(user))
+        return [{"role": "system", "content": self.system}, {"role": "user", "content": user}]
+
+PROMPTS: Dict[str, PromptTemplate] = {}
+
+def register(name: str, system: str, user: str = "{input}") -> PromptTemplate:
+    PROMPTS[name] = PromptTemplate(name, system, user)
+    return PROMPTS[name]
+
+def render(name: str, **values) -> List[Dict[str, str]]:
+    return PROMPTS[name].render(**values)
+
+# ==================== PROMPTS ====================
+
+register("agent_system", """You are an AI assistant for a CRM system helping sales reps manage HCP interactions.
+
+When the user describes an interaction, extract details and call log_interaction.
+For questions about what HCPs said, asked or raised in past interactions, call search_notes and answer from its results.
+Call several tools at once when the request needs more than one.
+Be conversational and helpful. Ask clarifying questions if needed.""")
+
+register(
+    "interaction_summary",
+    "Summarize the HCP interaction the user sends and extract key entities.\n"
+    "Provide a concise summary (max 2 sentences) and list key points.",
+    "Interaction Type: {interaction_type}\nNotes: {notes}\nProducts: {products}",
+)
+
+register(
+    "interaction_summary_packed",
+    "Summarize each of the numbered HCP interactions the user sends in at most 2 sentences.\n"
+    'Answer with a JSON object {"summaries": [...]} holding exactly one string per interaction, in the same order.',
+    "{count} interactions:\n\n{interactions}",
+)
+
+register(
+    "hcp_insights",
+    """Analyze the HCP engagement statistics and recent interactions the user sends and provide insights:
+1. Engagement level (High/Medium/Low)
+2. Key interests and concerns
+3. Recommended next steps
+4. Products to focus on""",
+    "{stats}\n\nLatest interactions in the last {days} days (newest first):\n{interactions}",
+)
+
+register(
+    "territory_review",
+    """You review one HCP for a pharma sales rep's nightly territory report.
+The HCP was flagged for overdue follow-ups or for going quiet after earlier engagement.
+In at most 3 sentences: say why it matters and recommend one concrete next action.""",
+    "{stats}",
+)
+
+register(
+    "conversation_summary",
+    """Update the running summary of a conversation between a pharma sales rep and a CRM assistant.
+Keep HCP names and IDs, interaction IDs, dates, products, decisions and open questions. Max 150 words.
+Reply with the updated summary only.""",
+    "Current summary:\n{summary}\n\nNew turns:\n{transcript}",
+)
@@ -0,0 +1,75 @@
+# conftest.py - Shared fixtures: the app on a throwaway SQLite database with the offline fake LLM
+"""
+Settings are environment variables read when the application modules are
+imported, so they are pinned here before anything imports main. One app
+(and one lifespan) serves the whole session; tests keep apart by creating
+their own HCPs and filtering on them.
+"""
+
+import atexit
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+TMP = tempfile.mkdtemp(prefix="crm-tests-")
+atexit.register(shutil.rmtree, TMP, True)
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(TMP, 'crm.db')}",
+    "LLM_BACKEND": "fake",
+    "NOTE_INDEX_DIR": os.path.join(TMP, "note_index"),
+    "ARCHIVE_DIR": os.path.join(TMP, "archive"),
+    "CHANGE_FEED_NOTIFY_CHANNEL": "",
+    "CHAT_STORE_PATH": "",
+    "LLM_CACHE_PATH": "",
+    "INTERACTIONS_HOT_MONTHS": "0",
+})
+
+_names = itertools.count(1)
+
+def wait_for(predicate, timeout: float = 5.0):
+    """Polls until a background task has caught up; fails the test after `timeout` seconds"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for background work")
+        time.sleep(0.01)
+
+@pytest.fixture(scope="session")
+def app_module():
+    import main
+    return main
+
+@pytest.fixture(scope="session")
+def client(app_module):
+    from fastapi.testclient import TestClient
+    with TestClient(app_module.app) as client:
+        yield client
+
+@pytest.fixture
+def hcp(client):
+    """A new HCP for this test only"""
+    n = next(_names)
+    response = client.post("/api/hcps", json={
+        "name": f"Dr Test{n} Person", "specialty": "Cardiology", "hospital": f"Hospital {n}",
+        "email": f"test{n}@example.com", "phone": "555-0100",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def add_interactions(client, hcp_id: int, count: int, **fields):
+    """Creates `count` interactions for an HCP through the API; returns their ids, oldest first"""
+    ids = []
+    for i in range(count):
+        body = {"hcp_id": hcp_id, "interaction_type": "visit", "notes": f"Visit {i}", **fields}
+        response = client.post("/api/interactions", json=body)
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    return ids
@@ -0,0 +1,91 @@
+"""Engagement analytics: built from GROUP BY rows, counted in place on insert, recomputed after edits"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from analytics import DAY, RECENT_DAYS, EngagementAnalytics, HCPEngagement, parse_products
+from conftest import add_interactions, wait_for
+
+def settled(app_module):
+    analytics = app_module.analytics
+    return lambda: not analytics._stale and not analytics._refreshing
+
+def cold_load():
+    from database import db_session
+
+    async def run():
+        analytics = EngagementAnalytics()
+        async with db_session() as db:
+            await analytics.load(db)
+        return analytics
+    return asyncio.run(run())
+
+def test_parse_products_splits_free_text():
+    assert parse_products("CardioMax, NeuroCalm and  X /Y") == ("CardioMax", "NeuroCalm", "X", "Y")
+    assert parse_products(None) == ()
+
+def test_windows_count_only_recent_contacts():
+    now = time.time()
+    engagement = HCPEngagement(1)
+    for days_ago in (1, 10, 40, RECENT_DAYS + 30):
+        engagement.add("visit", now - days_ago * DAY, ())
+    assert engagement.total == 4
+    assert [engagement.window(days, now) for days in (7, 30, 90)] == [1, 2, 3]
+    # Contacts past the longest window are counted, not kept
+    assert len(engagement.recent) == 3
+
+def test_inserts_are_counted_without_a_recompute(client, app_module, hcp):
+    add_interactions(client, hcp["id"], 2, products_discussed="CardioMax and NeuroCalm")
+    add_interactions(client, hcp["id"], 1, interaction_type="call")
+    assert hcp["id"] not in app_module.analytics._stale
+    stats = client.get(f"/api/analytics/hcps/{hcp['id']}").json()
+    assert stats["total"] == 3
+    assert stats["by_type"] == {"visit": 2, "call": 1}
+    assert stats["products"] == {"CardioMax": 2, "NeuroCalm": 2}
+    assert stats["windows"] == {"7d": 3, "30d": 3, "90d": 3}
+
+def test_edits_and_deletes_are_recomputed_from_the_table(client, app_module, hcp):
+    ids = add_interactions(client, hcp["id"], 3, products_discussed="CardioMax")
+    client.put(f"/api/interactions/{ids[0]}", json={"interaction_type": "email", "products_discussed": "OncoShield"})
+    client.delete(f"/api/interactions/{ids[1]}")
+    wait_for(settled(app_module))
+    stats = client.get(f"/api/analytics/hcps/{hcp['id']}").json()
+    assert stats["total"] == 2
+    assert stats["by_type"] == {"email": 1, "visit": 1}
+    assert stats["products"] == {"CardioMax": 1, "OncoShield": 1}
+
+def test_running_aggregates_match_a_cold_load(client, app_module, hcp):
+    ids = add_interactions(client, hcp["id"], 2)
+    client.post("/api/interactions/bulk", json=[
+        {"hcp_id": hcp["id"], "interaction_type": "webinar", "notes": "old",
+         "created_at": (datetime.utcnow() - timedelta(days=200)).isoformat()},
+    ])
+    client.delete(f"/api/interactions/{ids[0]}")
+    wait_for(settled(app_module))
+    running, cold = app_module.analytics, cold_load()
+    now = time.time()
+    assert {h: e.to_dict(now) for h, e in running._hcps.items()} == {h: e.to_dict(now) for h, e in cold._hcps.items()}
+    assert running.overview() == cold.overview()
+
+def test_under_engaged_lists_the_longest_silent_first():
+    now = datetime.utcnow()
+    analytics = EngagementAnalytics()
+    analytics.build(
+        [1, 2, 3, 4],
+        [(1, "visit", 1, now - timedelta(days=2)), (2, "visit", 2, now - timedelta(days=45)),
+         (3, "call", 1, now - timedelta(days=60))],
+        [],
+        [(3, now - timedelta(days=60)), (2, now - timedelta(days=50)), (2, now - timedelta(days=45)),
+         (1, now - timedelta(days=2))],
+    )
+    assert [row["hcp_id"] for row in analytics.under_engaged(days=30)] == [4, 3, 2]
+    assert [row["hcp_id"] for row in analytics.under_engaged(days=90, below=2)] == [4, 3, 1]
+    assert analytics.overview()["total"] == 4
+
+def test_an_insert_during_a_recompute_queues_another():
+    analytics = EngagementAnalytics()
+    analytics.add_hcp(1)
+    analytics._refreshing = {1}
+    analytics.add(1, "visit", datetime.utcnow(), None)
+    assert analytics.hcp(1).total == 0 and analytics._stale == {1}
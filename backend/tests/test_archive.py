@@ -0,0 +1,82 @@
+"""Parquet archive: merged re-archives, filtered keyset reads, archive_month and the include_archived listing"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive as archive_module
+from archive import COLUMNS, InteractionArchive
+from partitions import archive_month
+
+MONTH = datetime(2019, 5, 1)
+JUNE = datetime(2019, 6, 1)
+
+def row(id, hcp_id=1, created_at=MONTH, notes="", interaction_type="visit"):
+    return (id, hcp_id, interaction_type, notes, None, False, None, created_at, created_at)
+
+def newest_first(rows):
+    return sorted(rows, key=lambda r: (r[7], r[0]), reverse=True)
+
+@pytest.fixture
+def small_groups(monkeypatch):
+    monkeypatch.setattr(archive_module, "ROW_GROUP_ROWS", 4)
+
+def test_rearchived_ids_are_replaced_not_duplicated(tmp_path, small_groups):
+    archive = InteractionArchive(str(tmp_path))
+    first = [row(i, created_at=MONTH + timedelta(hours=i), notes="old") for i in range(10)]
+    assert archive.write(MONTH, [newest_first(first)]) == 10
+    again = [row(i, created_at=MONTH + timedelta(hours=i), notes="new") for i in range(5, 15)]
+    archive.write(MONTH, [newest_first(again)[:6], newest_first(again)[6:]])
+    rows = archive.read(100)
+    assert [r["id"] for r in rows] == list(range(14, -1, -1))
+    assert {r["id"] for r in rows if r["notes"] == "new"} == set(range(5, 15))
+    # Nothing to archive writes no file
+    assert archive.write(JUNE, []) == 0 and archive.months() == [MONTH]
+
+def test_reads_match_a_brute_force_filter(tmp_path, small_groups):
+    rng = random.Random(7)
+    archive = InteractionArchive(str(tmp_path))
+    everything = []
+    for month in (MONTH, JUNE):
+        rows = [row(len(everything) + i, hcp_id=rng.randint(1, 3), interaction_type=rng.choice(["visit", "call"]),
+                    created_at=month + timedelta(hours=rng.randint(0, 20))) for i in range(30)]
+        everything += rows
+        archive.write(month, [newest_first(rows)])
+    everything = [dict(zip(COLUMNS, r)) for r in newest_first(everything)]
+    for _ in range(50):
+        pick = rng.choice(everything)
+        before = (pick["created_at"], pick["id"]) if rng.random() < 0.7 else None
+        filters = {"hcp_id": rng.choice([None, 1, 2]), "interaction_type": rng.choice([None, "call"])}
+        expected = [r for r in everything
+                    if (before is None or (r["created_at"], r["id"]) < before)
+                    and all(value is None or r[key] == value for key, value in filters.items())]
+        assert archive.read(5, before=before, **filters) == expected[:5]
+
+def test_listing_pages_through_the_database_into_the_archive(client, app_module, hcp):
+    from database import engine
+
+    old = [{"hcp_id": hcp["id"], "interaction_type": "visit", "notes": f"old {i}",
+            "created_at": (MONTH + timedelta(days=i)).isoformat()} for i in range(3)]
+    new = [{"hcp_id": hcp["id"], "interaction_type": "call", "notes": f"new {i}"} for i in range(2)]
+    created = client.post("/api/interactions/bulk", json=old + new).json()["results"]
+    old_ids, new_ids = [r["id"] for r in created[:3]], [r["id"] for r in created[3:]]
+
+    archived = []
+    with engine.begin() as connection:
+        assert archive_month(connection, app_module.archive, MONTH, partitioned=False, archived=archived) == 3
+    client.portal.call(app_module.interactions_deleted, archived)
+    assert sorted(i for i, _ in archived) == old_ids
+
+    params = {"hcp_id": hcp["id"], "limit": 2}
+    listed = client.get("/api/interactions", params=params).json()
+    assert [r["id"] for r in listed["items"]] == new_ids[::-1] and listed["next_cursor"] is None
+
+    seen, cursor = [], None
+    while True:
+        page = client.get("/api/interactions", params={**params, "include_archived": "true",
+                                                       **({"cursor": cursor} if cursor else {})}).json()
+        seen += [r["id"] for r in page["items"]]
+        if not (cursor := page["next_cursor"]):
+            break
+    assert seen == new_ids[::-1] + old_ids[::-1]
@@ -0,0 +1,68 @@
+"""POST /api/interactions/bulk: per-row results, chunking, NDJSON, summaries"""
+
+import json
+
+import pytest
+
+from ingest import packed_summary_messages, summary_messages
+
+def ingest(client, body, **kwargs):
+    response = client.post("/api/interactions/bulk", **kwargs, **({"json": body} if body is not None else {}))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+@pytest.fixture
+def small_chunks(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.bulk_ingestor, "chunk_size", 2)
+
+def test_bad_rows_fail_alone_and_results_keep_input_order(client, hcp, small_chunks):
+    body = [
+        {"hcp_id": hcp["id"], "interaction_type": "visit", "notes": "ok 0"},
+        {"hcp_id": hcp["id"], "interaction_type": "visit"},
+        "not an object",
+        {"hcp_id": 987_654, "interaction_type": "call", "notes": "no such HCP"},
+        {"hcp_id": hcp["id"], "interaction_type": "email", "notes": "ok 4", "created_at": "2024-03-01T10:00:00"},
+    ]
+    result = ingest(client, body)
+    assert (result["created"], result["failed"]) == (2, 3)
+    assert [r["index"] for r in result["results"]] == [0, 1, 2, 3, 4]
+    assert [r["status"] for r in result["results"]] == ["created", "error", "error", "error", "created"]
+    assert "notes" in result["results"][1]["error"]
+    assert result["results"][3]["error"] == "HCP 987654 not found"
+
+    listed = client.get("/api/interactions", params={"hcp_id": hcp["id"]}).json()["items"]
+    assert [row["id"] for row in listed] == [result["results"][0]["id"], result["results"][4]["id"]]
+    # Backdated rows keep the time they were sent with
+    assert listed[1]["created_at"].startswith("2024-03-01T10:00:00")
+
+def test_ndjson_reports_malformed_lines_per_row(client, hcp):
+    lines = [
+        json.dumps({"hcp_id": hcp["id"], "interaction_type": "visit", "notes": "first"}),
+        "{broken json",
+        "",
+        json.dumps({"hcp_id": hcp["id"], "interaction_type": "call", "notes": "second"}),
+    ]
+    result = ingest(client, None, content="\n".join(lines) + "\n",
+                    headers={"Content-Type": "application/x-ndjson"})
+    assert result["created"] == 2 and result["failed"] == 1
+    assert [r["status"] for r in result["results"]] == ["created", "error", "created"]
+
+def test_malformed_json_array_is_a_400(client):
+    response = client.post("/api/interactions/bulk", content="[{", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    response = client.post("/api/interactions/bulk", json={"not": "a list"})
+    assert response.status_code == 400
+
+def test_summaries_are_appended_to_notes(client, hcp):
+    result = ingest(client, [{"hcp_id": hcp["id"], "interaction_type": "visit", "notes": "Discussed dosing"}] * 3,
+                    params={"summarize": "true"})
+    assert result["created"] == 3
+    assert all(r["summarized"] for r in result["results"])
+    notes = [row["notes"] for row in client.get("/api/interactions", params={"hcp_id": hcp["id"]}).json()["items"]]
+    assert all("\n\nAI Summary: " in note for note in notes)
+
+def test_missing_products_render_as_an_empty_line():
+    [*_, single] = summary_messages("visit", "notes", None)
+    assert single["content"].endswith("Products: ")
+    [*_, packed] = packed_summary_messages([{"interaction_type": "visit", "notes": "n", "products_discussed": None}])
+    assert "None" not in packed["content"]
@@ -0,0 +1,89 @@
+"""Change feed: cursor replay, resets, events for writes, and events from other workers"""
+
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from changes import ChangeFeed, Reset, encode
+from conftest import add_interactions
+
+def published(feed, *ids):
+    feed.publish(*({"op": "delete", "id": i, "hcp_id": 1} for i in ids))
+
+def test_a_cursor_replays_only_what_came_after_it():
+    feed = ChangeFeed(backlog=10)
+    published(feed, 1, 2)
+    cursor = feed.head
+    published(feed, 3, 4, 5)
+    replayed = feed.since(cursor)
+    assert [json.loads(data)["id"] for _, data in replayed] == [3, 4, 5]
+    assert replayed[-1][0] == feed.head
+    assert [json.loads(data)["id"] for _, data in feed.since(cursor, limit=2)] == [3, 4]
+    assert feed.since(feed.head) == [] and feed.since(None) == []
+
+def test_cursors_the_buffer_no_longer_covers_reset():
+    feed = ChangeFeed(backlog=3)
+    cursor = feed.head
+    published(feed, 1, 2, 3, 4)
+    with pytest.raises(Reset) as reset:
+        feed.since(cursor)
+    assert str(reset.value) == "expired" and reset.value.head == feed.head
+    for foreign in (ChangeFeed().head, f"{feed.id}-99", "garbage"):
+        with pytest.raises(Reset, match="unknown cursor"):
+            feed.since(foreign)
+
+def test_subscribers_get_each_event_and_slow_ones_are_cut_off():
+    feed = ChangeFeed(queue_size=2)
+    subscription = feed.subscribe()
+    published(feed, 1)
+    cursor, data = subscription.queue.get_nowait()
+    assert cursor == feed.head and json.loads(data)["id"] == 1
+    published(feed, 2, 3, 4)
+    assert subscription.overflowed
+    feed.unsubscribe(subscription)
+
+def test_notifications_from_other_workers_reach_the_listeners():
+    feed = ChangeFeed(channel="changes")
+
+    async def listener(events):
+        pass
+    feed.listeners.append(listener)
+    event = {"op": "delete", "id": 7, "hcp_id": 1}
+    for origin in (feed.origin, "elsewhere"):
+        feed._on_notify(None, 0, "changes", json.dumps({"origin": origin, "events": [event]}))
+    # Both are streamed; only the other worker's write is applied to this worker's state
+    assert [data for _, data in feed.since(f"{feed.id}-0")] == [encode(event)] * 2
+    assert feed._inbox.qsize() == 1 and feed._inbox.get_nowait() == [event]
+
+def test_writes_are_replayed_through_the_api(client, hcp):
+    start = client.get("/api/changes").json()
+    assert start["events"] == [] and start["reset"] is False
+    [interaction_id] = add_interactions(client, hcp["id"], 1)
+    client.delete(f"/api/interactions/{interaction_id}")
+    body = client.get("/api/changes", params={"since": start["cursor"]}).json()
+    upsert, delete = [e for e in body["events"] if e.get("id") == interaction_id]
+    assert (upsert["op"], upsert["created"], upsert["row"]["hcp_id"]) == ("upsert", True, hcp["id"])
+    assert delete == {"op": "delete", "id": interaction_id, "hcp_id": hcp["id"]}
+    assert client.get("/api/changes", params={"since": body["cursor"]}).json()["events"] == []
+
+def test_unknown_cursors_are_told_to_reload(client, app_module):
+    body = client.get("/api/changes", params={"since": "nope-1"}).json()
+    assert body == {"events": [], "cursor": app_module.changes.head, "reset": True}
+
+def test_rows_another_worker_wrote_are_applied_here(client, app_module, hcp):
+    from database import engine
+    from models import Interaction
+
+    with engine.begin() as connection:
+        interaction_id = connection.execute(insert(Interaction).values(
+            hcp_id=hcp["id"], interaction_type="call", notes="from another worker",
+            created_at=datetime.utcnow())).inserted_primary_key[0]
+    head = app_module.changes.head
+    # Too big for a NOTIFY: no row, so it is read back from the database
+    client.portal.call(app_module.changes_from_workers,
+                       [{"op": "upsert", "id": interaction_id, "hcp_id": hcp["id"], "created": True}])
+    assert app_module.analytics.hcp(hcp["id"]).by_type == {"call": 1}
+    # Applied, not published again
+    assert app_module.changes.head == head
@@ -0,0 +1,107 @@
+"""ConversationStore: server-issued ids, budgeted context, compaction and its version check"""
+
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+from conversations import ConversationStore
+
+LONG = "word " * 30
+
+class SummaryLLM:
+    """Answers every compaction with "SUMMARY", optionally holding the answer until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.hold = None
+
+    async def chat(self, **kwargs):
+        self.calls += 1
+        if self.hold is not None:
+            await self.hold.wait()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="SUMMARY"))])
+
+def exchange(text=LONG):
+    return {"role": "user", "content": text}, {"role": "assistant", "content": text}
+
+async def compacted(store):
+    await asyncio.gather(*store._compacting.values())
+
+def test_unknown_client_ids_get_a_server_issued_id():
+    async def run():
+        store = ConversationStore(SummaryLLM(), "m")
+        conversation = await store.get_or_create("chosen-by-client",
+                                                 seed=[{"role": "user", "content": "hi"}, {"role": "system"}])
+        assert conversation.id != "chosen-by-client"
+        assert await store.get("chosen-by-client") is None
+        assert conversation.turns == [{"role": "user", "content": "hi"}]
+        assert await store.get_or_create(conversation.id) is conversation
+    asyncio.run(run())
+
+def test_context_keeps_the_newest_turns_within_budget():
+    async def run():
+        store = ConversationStore(SummaryLLM(), "m", token_budget=10_000)
+        conversation = await store.get_or_create()
+        for i in range(5):
+            await store.append(conversation, *exchange(f"turn {i} " + LONG))
+        context = conversation.context(100)
+        assert context[-1] == conversation.turns[-1]
+        assert len(context) < len(conversation.turns)
+    asyncio.run(run())
+
+def test_history_over_budget_is_folded_into_the_summary(tmp_path):
+    async def run():
+        llm = SummaryLLM()
+        store = ConversationStore(llm, "m", token_budget=50, path=str(tmp_path / "chat.db"))
+        conversation = await store.get_or_create()
+        await store.append(conversation, *exchange(), *exchange("latest"))
+        await compacted(store)
+        assert llm.calls == 1 and conversation.summary == "SUMMARY"
+        assert conversation.turns[-1]["content"] == "latest"
+        reopened = await ConversationStore(llm, "m", path=str(tmp_path / "chat.db")).get(conversation.id)
+        assert (reopened.summary, reopened.turns) == (conversation.summary, conversation.turns)
+    asyncio.run(run())
+
+def test_turns_appended_during_compaction_are_kept():
+    async def run():
+        llm = SummaryLLM()
+        llm.hold = asyncio.Event()
+        store = ConversationStore(llm, "m", token_budget=50)
+        conversation = await store.get_or_create()
+        await store.append(conversation, *exchange())
+        await asyncio.sleep(0)
+        await store.append(conversation, {"role": "user", "content": "while compacting"})
+        llm.hold.set()
+        await compacted(store)
+        assert conversation.summary == "SUMMARY"
+        assert conversation.turns[-1]["content"] == "while compacting"
+    asyncio.run(run())
+
+def test_compaction_yields_to_a_write_from_another_worker(tmp_path):
+    path = str(tmp_path / "chat.db")
+
+    async def run():
+        llm = SummaryLLM()
+        llm.hold = asyncio.Event()
+        store = ConversationStore(llm, "m", token_budget=50, path=path)
+        conversation = await store.get_or_create()
+        await store.append(conversation, *exchange())
+        await asyncio.sleep(0)
+        # Another worker sharing the file saves the conversation meanwhile
+        other = sqlite3.connect(path)
+        other.execute("UPDATE chat_conversations SET summary = 'theirs', version = version + 1")
+        other.commit()
+        llm.hold.set()
+        await compacted(store)
+        assert conversation.summary == ""
+        reloaded = await store.get(conversation.id)
+        assert reloaded is not conversation and reloaded.summary == "theirs"
+    asyncio.run(run())
+
+def test_deleted_conversations_are_gone(tmp_path):
+    async def run():
+        store = ConversationStore(SummaryLLM(), "m", path=str(tmp_path / "chat.db"))
+        conversation = await store.get_or_create()
+        await store.delete(conversation.id)
+        assert await store.get(conversation.id) is None
+    asyncio.run(run())
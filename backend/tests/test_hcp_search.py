@@ -0,0 +1,49 @@
+"""In-process HCP search: trigram matching threshold, substring ranking, typeahead, the API"""
+
+import pytest
+
+from hcp_search import TrigramIndex
+
+@pytest.fixture
+def index():
+    index = TrigramIndex()
+    index.build([
+        (1, "Dr. John Smith", "Cardiology", "City General Hospital"),
+        (2, "Dr. Sarah Johnson", "Endocrinology", "Metro Medical Center"),
+        (3, "Dr. Michael Chen", "Oncology", "University Hospital"),
+        (4, "Dr. Emily Williams", "Neurology", "City General Hospital"),
+        (5, "Dr. Anna Oncologist", "Pediatrics", "Children's Hospital"),
+    ])
+    return index
+
+def test_specialty_match_excludes_records_sharing_only_a_suffix(index):
+    found = [hit.id for hit in index.search("Oncology")]
+    assert found[0] == 3
+    assert 1 not in found and 4 not in found
+
+def test_typos_still_match(index):
+    assert [hit.id for hit in index.search("Cardiolgy")][:1] == [1]
+    assert [hit.id for hit in index.search("Jonson")][:1] == [2]
+
+def test_substring_hits_rank_above_fuzzy_ones(index):
+    hits = index.search("onco")
+    assert {hit.id for hit in hits[:2]} == {3, 5}
+    # Name outranks specialty for the same substring
+    assert hits[0].id == 5
+
+def test_short_queries_fall_back_to_typeahead(index):
+    assert [hit.id for hit in index.search("ch")] == [3, 5]
+
+def test_typeahead_matches_word_prefixes(index):
+    assert {hit.id for hit in index.typeahead("neur")} == {4}
+    assert {hit.id for hit in index.typeahead("city gen")} == {1, 4}
+
+def test_removed_records_are_not_returned(index):
+    index.remove(3)
+    assert 3 not in {hit.id for hit in index.search("Oncology")}
+    assert len(index) == 4
+
+def test_search_endpoint_finds_new_hcps(client, hcp):
+    response = client.get("/api/hcps/search", params={"q": hcp["name"].split()[1]})
+    assert response.status_code == 200
+    assert hcp["id"] in [result["id"] for result in response.json()["results"]]
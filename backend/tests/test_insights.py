@@ -0,0 +1,58 @@
+"""POST /api/tools/generate-insights: served from snapshots, stale after writes, unknown HCPs"""
+
+import pytest
+from sqlalchemy import func, select
+
+from conftest import add_interactions
+
+@pytest.fixture
+def llm_calls(app_module, monkeypatch):
+    """Counts completions that reach the LLM backend (cache hits never do)"""
+    calls = []
+    create = app_module.llm.backend.create
+
+    async def counted(model, messages, **kwargs):
+        calls.append(model)
+        return await create(model, messages, **kwargs)
+    monkeypatch.setattr(app_module.llm.backend, "create", counted)
+    return calls
+
+def insights(client, hcp_id, **params):
+    response = client.post("/api/tools/generate-insights", json={"hcp_id": hcp_id}, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_snapshot_is_reused_until_the_hcp_changes(client, hcp, llm_calls):
+    add_interactions(client, hcp["id"], 2, products_discussed="CardioMax")
+    first = insights(client, hcp["id"])
+    assert first["stale"] is False and len(llm_calls) == 1
+    again = insights(client, hcp["id"])
+    assert again["generated_at"] == first["generated_at"] and len(llm_calls) == 1
+    add_interactions(client, hcp["id"], 1)
+    assert insights(client, hcp["id"])["stale"] is True
+
+def test_refresh_asks_the_llm_again(client, hcp, llm_calls):
+    add_interactions(client, hcp["id"], 1)
+    insights(client, hcp["id"])
+    insights(client, hcp["id"], refresh="true")
+    insights(client, hcp["id"], refresh="true")
+    assert len(llm_calls) == 3
+
+def test_unknown_hcp_gets_the_empty_answer_and_no_snapshot(client, llm_calls):
+    from database import engine
+    from models import HCPInsightSnapshot
+
+    body = insights(client, 987_654)
+    assert body["insights"] == "No interactions found for HCP ID 987654"
+    assert llm_calls == []
+    with engine.connect() as connection:
+        stored = connection.execute(select(func.count()).select_from(HCPInsightSnapshot)
+                                    .where(HCPInsightSnapshot.hcp_id == 987_654)).scalar()
+    assert stored == 0
+
+def test_non_numeric_hcp_id_is_a_422(client):
+    response = client.post("/api/tools/generate-insights", json={"hcp_id": "abc"})
+    assert response.status_code == 422
+
+def test_missing_hcp_id_is_a_400(client):
+    assert client.post("/api/tools/generate-insights", json={}).status_code == 400
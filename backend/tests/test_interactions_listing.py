@@ -0,0 +1,53 @@
+"""GET /api/interactions: keyset pages, filters, projections and NDJSON"""
+
+import json
+
+from conftest import add_interactions
+
+def pages(client, **params):
+    """Every page of a listing, following next_cursor"""
+    result = []
+    cursor = None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        page = client.get("/api/interactions", params=query).json()
+        result.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return result
+
+def test_cursor_pages_cover_every_row_once_newest_first(client, hcp):
+    ids = add_interactions(client, hcp["id"], 7)
+    found = pages(client, hcp_id=hcp["id"], limit=3)
+    assert [len(page["items"]) for page in found] == [3, 3, 1]
+    assert [item["id"] for page in found for item in page["items"]] == ids[::-1]
+
+def test_rows_written_between_pages_do_not_shift_later_pages(client, hcp):
+    ids = add_interactions(client, hcp["id"], 4)
+    first = client.get("/api/interactions", params={"hcp_id": hcp["id"], "limit": 2}).json()
+    add_interactions(client, hcp["id"], 2)
+    second = client.get("/api/interactions", params={
+        "hcp_id": hcp["id"], "limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [item["id"] for item in first["items"] + second["items"]] == ids[::-1]
+
+def test_filters_and_field_projection(client, hcp):
+    add_interactions(client, hcp["id"], 2)
+    [call] = add_interactions(client, hcp["id"], 1, interaction_type="call")
+    page = client.get("/api/interactions", params={
+        "hcp_id": hcp["id"], "interaction_type": "call", "fields": "notes"}).json()
+    assert page["next_cursor"] is None
+    assert [item["id"] for item in page["items"]] == [call]
+    assert set(page["items"][0]) == {"id", "created_at", "notes"}
+
+def test_garbage_cursor_is_a_400(client):
+    assert client.get("/api/interactions", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_unknown_field_is_a_400(client):
+    assert client.get("/api/interactions", params={"fields": "notes,password"}).status_code == 400
+
+def test_ndjson_streams_the_whole_filtered_result(client, hcp):
+    ids = add_interactions(client, hcp["id"], 5)
+    response = client.get("/api/interactions", params={"hcp_id": hcp["id"], "format": "ndjson", "limit": 2})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == ids[::-1]
@@ -0,0 +1,87 @@
+"""LLMResponseCache: LRU/TTL, tag invalidation in both tiers, the disk purge"""
+
+import asyncio
+
+from conftest import add_interactions
+from llm_cache import LLMResponseCache, cache_key
+
+def test_key_covers_model_prompt_and_params():
+    messages = [{"role": "user", "content": "hi"}]
+    key = cache_key("m", messages, {"temperature": 0.2})
+    assert key == cache_key("m", [dict(messages[0])], {"temperature": 0.2})
+    assert key != cache_key("m", messages, {"temperature": 0.3})
+    assert key != cache_key("other", messages, {"temperature": 0.2})
+
+def test_lru_evicts_least_recently_used():
+    async def run():
+        cache = LLMResponseCache(max_entries=2)
+        await cache.set("a", "A")
+        await cache.set("b", "B")
+        await cache.get("a")
+        await cache.set("c", "C")
+        return [await cache.get(key) for key in "abc"]
+    a, b, c = asyncio.run(run())
+    assert a.content == "A" and b is None and c.content == "C"
+
+def test_entries_expire_after_their_ttl():
+    async def run():
+        cache = LLMResponseCache()
+        await cache.set("k", "v", ttl=0.05)
+        assert (await cache.get("k")).content == "v"
+        await asyncio.sleep(0.1)
+        return await cache.get("k")
+    assert asyncio.run(run()) is None
+
+def test_invalidate_drops_only_entries_with_the_tag():
+    async def run():
+        cache = LLMResponseCache()
+        await cache.set("one", "1", tags=["hcp:1"])
+        await cache.set("both", "12", tags=["hcp:1", "hcp:2"])
+        await cache.set("two", "2", tags=["hcp:2"])
+        cache.invalidate("hcp:1")
+        return {key: await cache.get(key) for key in ("one", "both", "two")}
+    entries = asyncio.run(run())
+    assert entries["one"] is None and entries["both"] is None
+    assert entries["two"].content == "2"
+
+def test_invalidate_reaches_the_disk_tier(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+
+    async def fill_and_invalidate():
+        cache = LLMResponseCache(path=path)
+        await cache.set("one", "1", tags=["hcp:1"])
+        await cache.set("two", "2", tags=["hcp:2"])
+        cache.invalidate("hcp:1")
+        # A disk hit for the tag is a miss even before the worker thread has deleted it
+        cache._entries.clear()
+        assert await cache.get("one") is None
+        await cache.stop()
+
+    async def reopen():
+        cache = LLMResponseCache(path=path)
+        return await cache.get("one"), await cache.get("two")
+    asyncio.run(fill_and_invalidate())
+    one, two = asyncio.run(reopen())
+    assert one is None and two.content == "2"
+
+def test_purge_drops_expired_then_trims_to_the_cap(tmp_path):
+    async def run():
+        cache = LLMResponseCache(path=str(tmp_path / "llm_cache.db"), max_disk_entries=2)
+        await cache.set("expired", "x", ttl=0.01)
+        for i, ttl in enumerate((10, 30, 20)):
+            await cache.set(f"k{i}", str(i), ttl=ttl, tags=[f"t{i}"])
+        await asyncio.sleep(0.02)
+        cache._disk_purge()
+        return ({row[0] for row in cache._disk.execute("SELECT key FROM llm_cache")},
+                {row[0] for row in cache._disk.execute("SELECT key FROM llm_cache_tags")})
+    keys, tagged = asyncio.run(run())
+    # The entry closest to expiry goes first, with its tag rows
+    assert keys == {"k1", "k2"} and tagged == {"k1", "k2"}
+
+def test_interaction_write_invalidates_that_hcps_cached_answers(client, app_module, hcp):
+    cache = app_module.llm.cache
+    asyncio.run(cache.set("insight", "stale", tags=[f"hcp:{hcp['id']}"]))
+    asyncio.run(cache.set("other", "kept", tags=[f"hcp:{hcp['id'] + 10_000}"]))
+    add_interactions(client, hcp["id"], 1)
+    assert cache._memory_get("insight") is None
+    assert cache._memory_get("other").content == "kept"
@@ -0,0 +1,73 @@
+"""ResponseCache: ETag revalidation, invalidation by writes, TTL expiry, shared builds"""
+
+import asyncio
+import json
+import time
+
+from starlette.requests import Request
+
+from conftest import add_interactions
+from http_cache import ResponseCache
+
+def request(query: str = "", if_none_match: str = "") -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": query.encode(), "headers": headers})
+
+def test_an_unchanged_listing_revalidates_with_a_304(client, hcp):
+    add_interactions(client, hcp["id"], 1)
+    first = client.get("/api/interactions", params={"hcp_id": hcp["id"]})
+    etag = first.headers["etag"]
+    again = client.get("/api/interactions", params={"hcp_id": hcp["id"]}, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["etag"] == etag and again.content == b""
+
+def test_a_write_invalidates_the_etag(client, hcp):
+    add_interactions(client, hcp["id"], 1)
+    etag = client.get("/api/interactions", params={"hcp_id": hcp["id"]}).headers["etag"]
+    hcps_etag = client.get("/api/hcps").headers["etag"]
+    add_interactions(client, hcp["id"], 1)
+    fresh = client.get("/api/interactions", params={"hcp_id": hcp["id"]}, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["etag"] != etag
+    assert len(fresh.json()["items"]) == 2
+    # Another resource keeps its version
+    assert client.get("/api/hcps", headers={"If-None-Match": hcps_etag}).status_code == 304
+
+def test_bodies_are_built_once_per_version_and_key():
+    async def run():
+        cache, builds = ResponseCache(), []
+
+        async def build():
+            builds.append(1)
+            await asyncio.sleep(0.01)
+            return {"n": len(builds)}
+        responses = await asyncio.gather(*(cache.respond(request("a=1"), "r", build) for _ in range(3)))
+        assert len(builds) == 1 and {r.body for r in responses} == {b'{"n":1}'}
+        await cache.respond(request("a=2"), "r", build)
+        assert len(builds) == 2
+        cache.bump("r")
+        assert json.loads((await cache.respond(request("a=1"), "r", build)).body) == {"n": 3}
+    asyncio.run(run())
+
+def test_a_write_during_the_build_is_not_cached_or_tagged():
+    async def run():
+        cache = ResponseCache()
+
+        async def build():
+            cache.bump("r")
+            return []
+        response = await cache.respond(request(), "r", build)
+        assert "etag" not in response.headers
+        assert cache._entries.get("r", {}) == {}
+    asyncio.run(run())
+
+def test_versions_expire_after_the_ttl():
+    async def run():
+        cache = ResponseCache(ttl=5)
+
+        async def build():
+            return []
+        etag = (await cache.respond(request(), "r", build)).headers["etag"]
+        cache._since["r"] = time.monotonic() - 4
+        assert (await cache.respond(request(if_none_match=etag), "r", build)).status_code == 304
+        cache._since["r"] = time.monotonic() - 6
+        assert (await cache.respond(request(if_none_match=etag), "r", build)).status_code == 200
+    asyncio.run(run())
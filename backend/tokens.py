@@ -0,0 +1,54 @@
+# tokens.py - Token counting and trimming for prompt budgets
+
+import logging
+import os
+import re
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# One piece per punctuation mark and per started 4 characters of a word
+_PIECES = re.compile(r"\w{1,4}|[^\w\s]")
+# Role markers and separators the chat format wraps around every message
+MESSAGE_OVERHEAD = 4
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken BPE encoding when available; TOKENIZER_ENCODING= (empty) forces the heuristic"""
+    name = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+    if not name:
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as exc:  # not installed, or the BPE file can't be fetched (offline)
+        logger.info("Using the heuristic token counter (%s)", exc)
+        return None
+
+def count_tokens(text: str) -> int:
+    """BPE token count; without tiktoken, one per punctuation mark and one per ~4 characters of each word"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_PIECES.findall(text))
+
+def truncate_tokens(text: str, max_tokens: int, suffix: str = "…") -> str:
+    """`text` cut to at most `max_tokens` tokens at a token boundary, with `suffix` marking a cut"""
+    if len(text) <= max_tokens:
+        # Every token covers at least one character
+        return text
+    encoding = _encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens]).rstrip() + suffix
+    first_cut = next(islice(_PIECES.finditer(text), max_tokens, None), None)
+    return text if first_cut is None else text[:first_cut.start()].rstrip() + suffix
+
+def count_message_tokens(messages: Iterable[Dict[str, Any]]) -> int:
+    return sum(MESSAGE_OVERHEAD + count_tokens(str(m.get("content") or "")) for m in messages)
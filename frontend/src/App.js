@@ -7,18 +7,34 @@ const interactionSlice = createSlice({
   name: 'interactions',
   initialState: {
     interactions: [],
+    // Keyset cursor of the next listing page; null once everything is loaded
+    nextCursor: null,
     loading: false,
     error: null,
     chatMode: false,
     currentChat: [],
+    conversationId: null,
     hcps: []
   },
   reducers: {
+    // One page of GET /api/interactions: the first replaces the list, later ones append
     setInteractions: (state, action) => {
-      state.interactions = action.payload;
+      state.interactions = action.payload.items;
+      state.nextCursor = action.payload.next_cursor;
+    },
+    appendInteractions: (state, action) => {
+      const loaded = new Set(state.interactions.map(i => i.id));
+      state.interactions.push(...action.payload.items.filter(i => !loaded.has(i.id)));
+      state.nextCursor = action.payload.next_cursor;
     },
     addInteraction: (state, action) => {
-      state.interactions.unshift(action.payload);
+      // The change stream may have delivered this row before the POST answered
+      const index = state.interactions.findIndex(i => i.id === action.payload.id);
+      if (index !== -1) {
+        state.interactions[index] = action.payload;
+      } else {
+        state.interactions.unshift(action.payload);
+      }
     },
     updateInteraction: (state, action) => {
       const index = state.interactions.findIndex(i => i.id === action.payload.id);
@@ -27,6 +43,27 @@ const interactionSlice = createSlice({
     deleteInteraction: (state, action) => {
       state.interactions = state.interactions.filter(i => i.id !== action.payload);
     },
+    // One event from /api/changes/stream; applying the same event twice is harmless
+    applyChange: (state, action) => {
+      const change = action.payload;
+      if (change.op === 'delete') {
+        state.interactions = state.interactions.filter(i => i.id !== change.id);
+      } else if (change.op === 'upsert') {
+        const index = state.interactions.findIndex(i => i.id === change.id);
+        if (index !== -1) {
+          state.interactions[index] = change.row;
+          return;
+        }
+        // Newest first, like the listing; rows older than the loaded pages are left to "Load more"
+        const position = state.interactions.findIndex(i =>
+          i.created_at < change.row.created_at || (i.created_at === change.row.created_at && i.id < change.row.id));
+        if (position !== -1) {
+          state.interactions.splice(position, 0, change.row);
+        } else if (!state.nextCursor) {
+          state.interactions.push(change.row);
+        }
+      }
+    },
     setLoading: (state, action) => {
       state.loading = action.payload;
     },
@@ -39,8 +76,18 @@ const interactionSlice = createSlice({
     addChatMessage: (state, action) => {
       state.currentChat.push(action.payload);
     },
+    appendToLastChatMessage: (state, action) => {
+      state.currentChat[state.currentChat.length - 1].content += action.payload;
+    },
+    setLastChatMessage: (state, action) => {
+      state.currentChat[state.currentChat.length - 1].content = action.payload;
+    },
+    setConversationId: (state, action) => {
+      state.conversationId = action.payload;
+    },
     clearChat: (state) => {
       state.currentChat = [];
+      state.conversationId = null;
     },
     setHCPs: (state, action) => {
       state.hcps = action.payload;
@@ -48,8 +95,9 @@ const interactionSlice = createSlice({
   }
 });
 
-const { setInteractions, addInteraction, updateInteraction, deleteInteraction, 
-        setLoading, setError, toggleChatMode, addChatMessage, clearChat, setHCPs } = interactionSlice.actions;
+const { setInteractions, appendInteractions, addInteraction, updateInteraction, deleteInteraction, applyChange,
+        setLoading, setError, toggleChatMode, addChatMessage, appendToLastChatMessage, setLastChatMessage,
+        setConversationId, clearChat, setHCPs } = interactionSlice.actions;
 
 const store = configureStore({
   reducer: {
@@ -63,7 +111,7 @@ const API_BASE = 'http://localhost:8000';
 // Main App Component
 function CRMApp() {
   const dispatch = useDispatch();
-  const { interactions, loading, error, chatMode, currentChat, hcps } = useSelector(state => state.interactions);
+  const { interactions, nextCursor, loading, error, chatMode, currentChat, conversationId, hcps } = useSelector(state => state.interactions);
   const [showForm, setShowForm] = useState(false);
   const [editingId, setEditingId] = useState(null);
   const [formData, setFormData] = useState({
@@ -76,8 +124,34 @@ function CRMApp() {
   const [chatInput, setChatInput] = useState('');
 
   useEffect(() => {
-    fetchInteractions();
     fetchHCPs();
+    // Load the list once, then apply change events instead of refetching it after every write
+    let source = null;
+    let closed = false;
+    const followChanges = async () => {
+      try {
+        const res = await fetch(`${API_BASE}/api/changes`);
+        const { cursor } = await res.json();
+        await fetchInteractions();
+        if (closed) return;
+        source = new EventSource(`${API_BASE}/api/changes/stream?since=${encodeURIComponent(cursor)}`);
+        source.addEventListener('change', (e) => {
+          const change = JSON.parse(e.data);
+          // Rows too big to relay between workers arrive without `row`; reload to pick them up
+          if (change.op === 'upsert' && !change.row) fetchInteractions();
+          else dispatch(applyChange(change));
+        });
+        // The server could not replay what we missed (restart, other worker, too far behind)
+        source.addEventListener('reset', () => fetchInteractions());
+      } catch (err) {
+        dispatch(setError(err.message));
+      }
+    };
+    followChanges();
+    return () => {
+      closed = true;
+      if (source) source.close();
+    };
   }, []);
 
   const fetchInteractions = async () => {
@@ -93,6 +167,20 @@ function CRMApp() {
     }
   };
 
+  // Next keyset page, after the oldest interaction loaded so far
+  const fetchMoreInteractions = async () => {
+    try {
+      dispatch(setLoading(true));
+      const res = await fetch(`${API_BASE}/api/interactions?cursor=${encodeURIComponent(nextCursor)}`);
+      const data = await res.json();
+      dispatch(appendInteractions(data));
+    } catch (err) {
+      dispatch(setError(err.message));
+    } finally {
+      dispatch(setLoading(false));
+    }
+  };
+
   const fetchHCPs = async () => {
     try {
       const res = await fetch(`${API_BASE}/api/hcps`);
@@ -145,20 +233,44 @@ function CRMApp() {
 
     try {
       dispatch(setLoading(true));
-      const res = await fetch(`${API_BASE}/api/chat/interact`, {
+      // Server-sent events: tokens are shown as they arrive instead of after the whole turn
+      const res = await fetch(`${API_BASE}/api/chat/stream`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
+        // History is kept server-side; only the conversation ID travels
         body: JSON.stringify({ 
           message: currentInput,
-          history: currentChat 
+          conversation_id: conversationId
         })
       });
-      
-      const data = await res.json();
-      dispatch(addChatMessage({ role: 'assistant', content: data.response }));
-      
-      if (data.interaction_logged) {
-        fetchInteractions();
+      if (!res.ok || !res.body) throw new Error(`Chat failed (${res.status})`);
+
+      dispatch(addChatMessage({ role: 'assistant', content: '' }));
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finished = false;
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+        for (const frame of frames) {
+          const event = (frame.match(/^event: (.*)$/m) || [])[1];
+          const data = JSON.parse((frame.match(/^data: (.*)$/m) || [])[1] || '{}');
+          if (event === 'token') {
+            dispatch(appendToLastChatMessage(data.text));
+          } else if (event === 'escalate') {
+            dispatch(setLastChatMessage(''));
+          } else if (event === 'done') {
+            dispatch(setLastChatMessage(data.response));
+            dispatch(setConversationId(data.conversation_id));
+            finished = true;
+          } else if (event === 'error') {
+            throw new Error(data.detail);
+          }
+        }
       }
     } catch (err) {
       dispatch(setError(err.message));
@@ -252,7 +364,6 @@ function CRMApp() {
       });
       const data = await res.json();
       alert(data.message);
-      fetchInteractions();
     } catch (err) {
       dispatch(setError(err.message));
     } finally {
@@ -504,6 +615,15 @@ function CRMApp() {
                     </div>
                   ))
                 )}
+                {nextCursor && (
+                  <button
+                    onClick={fetchMoreInteractions}
+                    disabled={loading}
+                    className="w-full text-sm py-2 text-blue-700 bg-blue-50 rounded-lg hover:bg-blue-100 disabled:opacity-50"
+                  >
+                    {loading ? 'Loading...' : 'Load more'}
+                  </button>
+                )}
               </div>
             </div>
           </div>
@@ -12,24 +12,73 @@ CREATE TABLE IF NOT EXISTS hcps (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create Interactions table
+-- Create Interactions table, range-partitioned by month of created_at (see backend/partitions.py).
+-- The partition key has to be part of the primary key.
 CREATE TABLE IF NOT EXISTS interactions (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     hcp_id INTEGER REFERENCES hcps(id) ON DELETE CASCADE,
     interaction_type VARCHAR(50) NOT NULL,
     notes TEXT NOT NULL,
     products_discussed VARCHAR(500),
     follow_up_required BOOLEAN DEFAULT FALSE,
     followup_date TIMESTAMP,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Rows of months without a partition land here until the backend's partition maintenance gives them one
+CREATE TABLE IF NOT EXISTS interactions_default PARTITION OF interactions DEFAULT;
+
+-- Last month through three months ahead; the backend creates later ones as time goes on
+DO $$
+DECLARE
+    month DATE;
+BEGIN
+    FOR i IN -1..3 LOOP
+        month := (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::date;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF interactions FOR VALUES FROM (%L) TO (%L)',
+            'interactions_p' || to_char(month, 'YYYYMM'), month, (month + INTERVAL '1 month')::date
+        );
+    END LOOP;
+END $$;
+
+-- Create precomputed insight snapshots table (one row per HCP)
+CREATE TABLE IF NOT EXISTS hcp_insight_snapshots (
+    hcp_id INTEGER PRIMARY KEY REFERENCES hcps(id) ON DELETE CASCADE,
+    insights TEXT,
+    fingerprint VARCHAR(255),
+    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create follow-up reminders table (one row per reminder sent by the follow-up scheduler).
+-- No foreign key: a partitioned interactions table has no unique constraint on id alone.
+CREATE TABLE IF NOT EXISTS followup_reminders (
+    interaction_id INTEGER,
+    followup_date TIMESTAMP,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (interaction_id, followup_date)
 );
 
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_hcps_name ON hcps(name);
 CREATE INDEX IF NOT EXISTS idx_hcps_specialty ON hcps(specialty);
+
+-- HCP search: trigram indexes serve fuzzy/substring matches, tsvector serves ranked and prefix (typeahead) matches
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_hcps_name_trgm ON hcps USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_hcps_specialty_trgm ON hcps USING gin (specialty gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_hcps_hospital_trgm ON hcps USING gin (hospital gin_trgm_ops);
+ALTER TABLE hcps ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(specialty, '') || ' ' || coalesce(hospital, ''))
+) STORED;
+CREATE INDEX IF NOT EXISTS idx_hcps_search_vector ON hcps USING gin (search_vector);
 CREATE INDEX IF NOT EXISTS idx_interactions_hcp_id ON interactions(hcp_id);
 CREATE INDEX IF NOT EXISTS idx_interactions_created_at ON interactions(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_interactions_created_at_id ON interactions(created_at DESC, id DESC);
+-- Partial index: only open follow-ups, so it stays small however many interactions there are
+CREATE INDEX IF NOT EXISTS idx_interactions_followup_due ON interactions(followup_date, id) WHERE follow_up_required;
 
 -- Insert sample HCPs (only if table is empty)
 INSERT INTO hcps (name, specialty, hospital, email, phone) 